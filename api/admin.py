@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import ReportExercise, User, Exercise, UserExercise, ExerciseCategory, Report, InjuryType
+from .models import ReportExercise, User, Exercise, UserExercise, ExerciseCategory, Report, InjuryType, ChatMessage, ResetRun, PainWindow, PendingRecommendation, ProgressionJob, SyncEvent, DailyUserStats
 
 class UserExerciseInline(admin.TabularInline):  # Use StackedInline for a different layout
     model = UserExercise
@@ -13,7 +13,7 @@ class CustomUserAdmin(UserAdmin):
 
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
-        ('Personal info', {'fields': ('first_name', 'last_name', 'email', 'full_name', 'date_of_birth', 'injury_type', 'last_reset')}),  # Add 'exercises' field
+        ('Personal info', {'fields': ('first_name', 'last_name', 'email', 'full_name', 'date_of_birth', 'injury_type', 'last_reset', 'timezone')}),  # Add 'exercises' field
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
@@ -37,4 +37,10 @@ admin.site.register(ExerciseCategory)
 admin.site.register(Report)
 admin.site.register(InjuryType)
 admin.site.register(ReportExercise)
-
+admin.site.register(ChatMessage)
+admin.site.register(ResetRun)
+admin.site.register(PainWindow)
+admin.site.register(PendingRecommendation)
+admin.site.register(ProgressionJob)
+admin.site.register(SyncEvent)
+admin.site.register(DailyUserStats)
@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Cache backends whose entries only exist in the process that wrote them
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+def check_shared_cache():
+    """
+    Cached chatbot contexts are invalidated, and the exercise ladder's version is stamped,
+    through the default cache, so with several worker processes it must be shared between them.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.WEB_CONCURRENCY > 1 and backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f"WEB_CONCURRENCY is {settings.WEB_CONCURRENCY} but the default cache ({backend}) is local to each "
+            "process, so invalidations would not reach the other workers. Set CACHE_BACKEND and "
+            "CACHE_LOCATION to a shared cache such as Redis."
+        )
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        check_shared_cache()
+
+        # Register signal receivers
+        from . import signals
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+# Opt-in cache of chatbot answers for repeated questions.
+# Answers are keyed on the normalized user message plus a hash of the slice of the
+# patient context that the answer depends on (injury type, exercise set and pain band),
+# so patients in the same situation asking the same question skip the model call.
+# Chat history is not part of the key, so this is meant for standalone questions.
+
+class ChatResponseCache:
+    """
+    In-process LRU cache with a per-entry TTL and hit/miss counters.
+    """
+    def __init__(self, max_entries=1000, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, answer = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def set(self, key, answer):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            # Evict the least recently used entries once over the size limit
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+            }
+
+_response_cache = None
+
+def get_response_cache():
+    """
+    Get the process-wide response cache, configured from CHATBOT_RESPONSE_CACHE.
+    """
+    global _response_cache
+    if _response_cache is None:
+        config = settings.CHATBOT_RESPONSE_CACHE
+        _response_cache = ChatResponseCache(
+            max_entries=config.get('MAX_ENTRIES', 1000),
+            ttl=config.get('TTL', 3600)
+        )
+    return _response_cache
+
+def response_cache_enabled():
+    return settings.CHATBOT_RESPONSE_CACHE.get('ENABLED', False)
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    # Rebuild the cache with the new limits when the settings change (e.g. in tests)
+    global _response_cache
+    if setting == 'CHATBOT_RESPONSE_CACHE':
+        _response_cache = None
+
+def normalize_message(message):
+    """
+    Normalize a user message so trivially different phrasings share a key.
+    Lowercases, drops punctuation and collapses whitespace.
+    """
+    message = re.sub(r"[^\w\s]", " ", message.lower())
+    return " ".join(message.split())
+
+def pain_band(patient_context):
+    """
+    Bucket the patient's current pain into 'none', 'low' or 'high'.
+    Uses the same high pain threshold (4) as the exercise progression rules.
+    """
+    pain_levels = [exercise['pain_level'] for exercise in patient_context['exercises']]
+    pain_levels += [report['pain_level'] for report in patient_context['reports'][:1]]
+    highest = max(pain_levels, default=0)
+    if highest >= 4:
+        return 'high'
+    if highest > 0:
+        return 'low'
+    return 'none'
+
+def response_cache_key(user_message, patient_context, exercise_context):
+    """
+    Build the cache key for a question from the normalized message and a context hash.
+    """
+    context_slice = {
+        'injury': patient_context['injury'],
+        'exercises': sorted(
+            (exercise['name'], exercise['difficulty']) for exercise in patient_context['exercises']
+        ),
+        'pain_band': pain_band(patient_context),
+        'exercise_context': exercise_context,
+    }
+    context_hash = hashlib.sha256(
+        json.dumps(context_slice, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{normalize_message(user_message)}:{context_hash}"
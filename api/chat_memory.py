@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.db import transaction
+from .models import ChatMessage
+
+
+# Chat memory for the chatbot.
+# Each user keeps a rolling window of recent turns bounded by an estimated token count.
+# When the window overflows, the oldest turns are folded into a single condensed summary
+# message, so both the stored rows and the prompt sent to the model stay a flat size.
+
+SUMMARY_PREFIX = "Summary of the earlier conversation with this patient:"
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a piece of text (roughly 4 characters per token).
+    """
+    return max(1, (len(text) + 3) // 4)
+
+def load_history(user):
+    """
+    Load the chat history for a user as a list of model messages.
+    The condensed summary (if any) comes first, followed by the recent turns.
+    """
+    rows = ChatMessage.objects.filter(user=user).order_by('id').values_list('role', 'content')
+
+    summary = []
+    turns = []
+    for role, content in rows:
+        if role == ChatMessage.SUMMARY:
+            summary = [{"role": "system", "content": f"{SUMMARY_PREFIX}\n{content}"}]
+        else:
+            turns.append({"role": role, "content": content})
+    return summary + turns
+
+def append_turn(user, user_message, ai_message):
+    """
+    Store a user message and the assistant's reply, then compact the window if needed.
+    """
+    ChatMessage.objects.bulk_create([
+        ChatMessage(user=user, role=ChatMessage.USER, content=user_message,
+                    token_count=estimate_tokens(user_message)),
+        ChatMessage(user=user, role=ChatMessage.ASSISTANT, content=ai_message,
+                    token_count=estimate_tokens(ai_message)),
+    ])
+    compact_history(user)
+
+def clear_history(user):
+    """
+    Delete all stored chat turns and the summary for a user.
+    """
+    ChatMessage.objects.filter(user=user).delete()
+
+def condense_turn(role, content, max_chars=160):
+    """
+    Condense a single turn to one short line for the summary.
+    Keeps the first sentence, truncated to max_chars.
+    """
+    text = " ".join(content.split())
+    first_sentence = text.split(". ")[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars - 3].rstrip() + "..."
+    speaker = "Patient" if role == ChatMessage.USER else "Assistant"
+    return f"- {speaker}: {first_sentence}"
+
+def compact_history(user):
+    """
+    Fold the oldest turns into the summary once the window exceeds its token budget.
+    Turns are folded in user/assistant pairs so the window never starts with a reply.
+    """
+    window_tokens = settings.CHAT_MEMORY_WINDOW_TOKENS
+    summary_tokens = settings.CHAT_MEMORY_SUMMARY_TOKENS
+
+    turns = list(
+        ChatMessage.objects.filter(user=user)
+        .exclude(role=ChatMessage.SUMMARY)
+        .order_by('id')
+        .values_list('id', 'role', 'content', 'token_count')
+    )
+    total = sum(turn[3] for turn in turns)
+    if total <= window_tokens:
+        return
+
+    # Fold pairs from the oldest end until the remaining turns fit the budget,
+    # always keeping the latest exchange
+    split = 0
+    while total > window_tokens and split < len(turns) - 2:
+        total -= sum(turn[3] for turn in turns[split:split + 2])
+        split += 2
+    folded = turns[:split]
+    if not folded:
+        return
+
+    with transaction.atomic():
+        summary = ChatMessage.objects.select_for_update().filter(
+            user=user,
+            role=ChatMessage.SUMMARY
+        ).first()
+
+        lines = summary.content.splitlines() if summary else []
+        lines += [condense_turn(role, content) for _, role, content, _ in folded]
+
+        # Drop the oldest summary lines once the summary itself is over budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > summary_tokens:
+            lines.pop(0)
+        content = "\n".join(lines)
+
+        if summary:
+            summary.content = content
+            summary.token_count = estimate_tokens(content)
+            summary.save(update_fields=['content', 'token_count'])
+        else:
+            ChatMessage.objects.create(
+                user=user,
+                role=ChatMessage.SUMMARY,
+                content=content,
+                token_count=estimate_tokens(content)
+            )
+
+        ChatMessage.objects.filter(id__in=[turn[0] for turn in folded]).delete()
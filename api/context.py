@@ -0,0 +1,77 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import UserExercise, Report
+
+
+# Patient context snapshot used by the chatbot system prompt.
+# The snapshot is built once, serialized, and kept in the cache until one of the
+# writes it depends on (see signals.py) invalidates it, so a chatbot message only
+# costs a single cache read instead of rebuilding the exercise and report lists.
+
+def patient_context_key(user_id):
+    return f"chatbot:patient-context:{user_id}"
+
+def build_patient_context(user):
+    """
+    Build the patient context snapshot for a user from the database.
+    Includes the injury type, active exercises and the last 5 reports, with the
+    exercise and report lists already serialized for the prompt.
+    """
+    user_exercises = UserExercise.objects.filter(
+        user=user,
+        is_active=True
+    ).select_related('exercise__category')
+    recent_reports = Report.objects.filter(user=user).order_by('-date')[:5]
+
+    exercises_info = [
+        {
+            'name': ue.exercise.name,
+            'category': ue.exercise.category.name,
+            'difficulty': ue.exercise.difficulty_level,
+            'sets': ue.sets,
+            'reps': ue.reps,
+            'pain_level': ue.pain_level,
+            'completed': ue.completed
+        }
+        for ue in user_exercises
+    ]
+
+    reports_info = [
+        {
+            'date': report.date.strftime('%Y-%m-%d'),
+            'pain_level': report.pain_level,
+            'notes': report.notes
+        }
+        for report in recent_reports
+    ]
+
+    return {
+        'injury': user.injury_type.name if user.injury_type else None,
+        'exercises': exercises_info,
+        'reports': reports_info,
+        'exercises_json': json.dumps(exercises_info),
+        'reports_json': json.dumps(reports_info),
+        # The exercises' completed and pain_level flags only hold for this day
+        'date': timezone.localdate(),
+    }
+
+def get_patient_context(user):
+    """
+    Get the cached patient context snapshot for a user, building it on a cache miss
+    or once the patient's day has rolled over.
+    """
+    key = patient_context_key(user.pk)
+    with timezone.override(user.tzinfo):
+        context = cache.get(key)
+        if context is None or context['date'] != timezone.localdate():
+            context = build_patient_context(user)
+            cache.set(key, context, settings.CHATBOT_CONTEXT_TIMEOUT)
+    return context
+
+def invalidate_patient_context(*user_ids):
+    """
+    Drop the cached patient context for the given users so it is rebuilt on next use.
+    """
+    cache.delete_many([patient_context_key(user_id) for user_id in user_ids])
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from .models import DailyUserStats, ReportExercise, UserExercise
+
+
+# Per-user daily adherence and pain rollup.
+# Each user has a DailyUserStats row for every day with reported exercises and every day
+# one of their exercises was activated or deactivated. The write paths refresh the rows of
+# the days they touch once their transaction commits, so they don't pay for the rollup:
+# report writes their report's day, exercise activation changes every day from the earliest
+# changed date on. A refresh recomputes the rows in its range from the user's exercise
+# intervals and one aggregate over the range's reports, so the analytics endpoints read at
+# most one row per day instead of the raw report history.
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+GRANULARITIES = (DAY, WEEK, MONTH)
+
+# Chart label of a period: its weekday, its week's first day or its month
+PERIOD_LABEL_FORMATS = {DAY: '%a', WEEK: '%b %d', MONTH: '%b %Y'}
+
+# Longest date range the analytics endpoints accept, in days
+MAX_RANGE_DAYS = 731
+
+def active_counts(intervals, days):
+    """
+    Count the exercises active on each of the ascending `days` with a sweep over the
+    (date activated, date deactivated) intervals: an exercise is active from its activation
+    up to the day before its deactivation, so the count on a day is the activations up to
+    it minus the deactivations up to it. O(exercises log exercises + days).
+    """
+    starts = sorted(date_activated for date_activated, _ in intervals)
+    # An exercise deactivated before it was activated was never active
+    ends = sorted(max(date_activated, date_deactivated) for date_activated, date_deactivated in intervals if date_deactivated)
+    counts = []
+    started = ended = 0
+    for day in days:
+        while started < len(starts) and starts[started] <= day:
+            started += 1
+        while ended < len(ends) and ends[ended] <= day:
+            ended += 1
+        counts.append(started - ended)
+    return counts
+
+def active_exercise_filter(date_field):
+    """
+    Q filter for report exercises whose exercise was active on the date in `date_field`.
+    """
+    return Q(user_exercise__date_activated__lte=F(date_field)) & (
+        Q(user_exercise__date_deactivated__isnull=True) | Q(user_exercise__date_deactivated__gt=F(date_field))
+    )
+
+def refresh_daily_stats(user_id, since=None, until=None, create=True):
+    """
+    Recompute a user's rows for the days from `since` to `until` (either open-ended if None)
+    with a fixed number of queries, dropping rows the range no longer needs.
+    With create=False existing rows are only updated or removed (for deletes, which may be
+    part of deleting the user).
+    """
+    in_range = {}
+    if since is not None:
+        in_range['date__gte'] = since
+    if until is not None:
+        in_range['date__lte'] = until
+
+    intervals = list(UserExercise.objects.filter(user_id=user_id).values_list('date_activated', 'date_deactivated'))
+    reported = {
+        row['report__date']: row
+        for row in ReportExercise.objects.filter(
+            report__user_id=user_id, **{f'report__{lookup}': value for lookup, value in in_range.items()}
+        ).values('report__date').annotate(
+            completed_count=Count('id', filter=active_exercise_filter('report__date')),
+            pain_sum=Sum('pain_level'),
+            pain_count=Count('id')
+        )
+    }
+    changed = {
+        day for interval in intervals for day in interval
+        if day is not None and (since is None or day >= since) and (until is None or day <= until)
+    }
+
+    days = sorted(changed | reported.keys())
+    rows = []
+    for day, active_count in zip(days, active_counts(intervals, days)):
+        totals = reported.get(day, {})
+        rows.append(DailyUserStats(
+            user_id=user_id,
+            date=day,
+            active_count=active_count,
+            completed_count=totals.get('completed_count', 0),
+            pain_sum=totals.get('pain_sum', 0),
+            pain_count=totals.get('pain_count', 0)
+        ))
+
+    fields = ['active_count', 'completed_count', 'pain_sum', 'pain_count']
+    with transaction.atomic():
+        DailyUserStats.objects.filter(user_id=user_id, **in_range).exclude(date__in=[row.date for row in rows]).delete()
+        if create:
+            DailyUserStats.objects.bulk_create(rows, update_conflicts=True, unique_fields=['user', 'date'], update_fields=fields)
+        else:
+            existing = dict(
+                DailyUserStats.objects.filter(user_id=user_id, date__in=[row.date for row in rows]).values_list('date', 'pk')
+            )
+            for row in rows:
+                row.pk = existing.get(row.date)
+            DailyUserStats.objects.bulk_update([row for row in rows if row.pk], fields)
+    return rows
+
+def refresh_daily_stats_on_commit(user_id, since=None, until=None, create=True):
+    """
+    Run refresh_daily_stats() once the current transaction commits (right away outside one).
+    """
+    transaction.on_commit(lambda: refresh_daily_stats(user_id, since, until, create=create))
+
+def daily_stats(user, start_date, end_date):
+    """
+    Get a user's {date: DailyUserStats} for every day from `start_date` to `end_date`.
+    Days without a row get an unsaved one with the active count carried over from the
+    latest earlier row and nothing completed. Two queries, however long the range.
+    """
+    rows = {row.date: row for row in DailyUserStats.objects.filter(user=user, date__gte=start_date, date__lte=end_date)}
+    previous = DailyUserStats.objects.filter(user=user, date__lt=start_date).order_by('-date').first()
+    active_count = previous.active_count if previous else 0
+
+    days = {}
+    day = start_date
+    while day <= end_date:
+        row = rows.get(day)
+        if row is None:
+            row = DailyUserStats(user=user, date=day, active_count=active_count)
+        active_count = row.active_count
+        days[day] = row
+        day += timedelta(days=1)
+    return days
+
+def adherence_percentage(completed, total):
+    """
+    Percentage of `total` exercises completed, capped at 100 (0 if there were none).
+    """
+    if total <= 0:
+        return 0
+    return min(completed / total * 100, 100)
+
+def period_start(day, granularity):
+    """
+    First day of the day, week (starting Monday) or month `day` falls in.
+    """
+    if granularity == WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == MONTH:
+        return day.replace(day=1)
+    return day
+
+def group_by_period(days, granularity):
+    """
+    Group the ascending {date: DailyUserStats} of daily_stats() into {period start: [rows]}.
+    """
+    periods = {}
+    for day, row in days.items():
+        periods.setdefault(period_start(day, granularity), []).append(row)
+    return periods
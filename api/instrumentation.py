@@ -0,0 +1,115 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Per-phase latency instrumentation for the chatbot.
+# Each request records timing spans (context building, prompt serialization, chat memory
+# load/save, the upstream call...) plus token counts in a ChatTrace. Finished traces are
+# aggregated per phase into latency histograms so each phase can be given its own SLO.
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+class ChatTrace:
+    """
+    Timing spans and token counts for a single chatbot request.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @contextmanager
+    def span(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[phase] = self.spans.get(phase, 0) + (time.perf_counter() - started) * 1000
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            'phases_ms': {phase: round(duration, 2) for phase, duration in self.spans.items()},
+            'total_ms': round(self.total_ms(), 2),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+        }
+
+    def server_timing(self):
+        """
+        Format the spans as a Server-Timing header value.
+        """
+        entries = [f"{phase};dur={duration:.1f}" for phase, duration in self.spans.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+class PhaseHistogram:
+    """
+    Latency histogram for one phase.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, duration_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in LATENCY_BUCKETS_MS] + ['+Inf']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0,
+            'max_ms': round(self.max_ms, 2),
+            'buckets_ms': dict(zip(bounds, self.buckets)),
+        }
+
+class ChatMetrics:
+    """
+    Process-wide aggregate of finished chatbot traces.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.outcomes = {}
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def record(self, trace, outcome):
+        with self._lock:
+            for phase, duration in trace.spans.items():
+                self.phases.setdefault(phase, PhaseHistogram()).observe(duration)
+            self.phases.setdefault('total', PhaseHistogram()).observe(trace.total_ms())
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.prompt_tokens += trace.prompt_tokens
+            self.completion_tokens += trace.completion_tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'phases': {phase: histogram.as_dict() for phase, histogram in self.phases.items()},
+                'outcomes': dict(self.outcomes),
+                'tokens': {
+                    'prompt': self.prompt_tokens,
+                    'completion': self.completion_tokens,
+                },
+            }
+
+chat_metrics = ChatMetrics()
@@ -0,0 +1,97 @@
+import threading
+import time
+import uuid
+from django.core.cache import cache
+from .models import Exercise
+
+
+# In-process difficulty ladder for exercise progression.
+# The exercise catalog rarely changes, so each process keeps an index of the exercise at
+# every (category, difficulty) step and reuses it until the catalog version stamp in the
+# shared cache changes. Saving or deleting an exercise or category bumps the stamp
+# (see signals.py): the process that made the change rebuilds its index on its next
+# lookup, the others once they next check the stamp, at most LADDER_CHECK_INTERVAL later.
+# The stamp must live in a cache shared by the workers (see api.apps.check_shared_cache).
+
+LADDER_VERSION_KEY = "exercises:ladder-version"
+
+# How long a process uses its ladder before checking the version stamp again (seconds)
+LADDER_CHECK_INTERVAL = 5
+
+DIFFICULTY_ORDER = [Exercise.BEGINNER, Exercise.INTERMEDIATE, Exercise.ADVANCED]
+
+class ExerciseLadder:
+    """
+    Index of the exercise catalog by category and difficulty.
+    """
+    def __init__(self, exercises):
+        self.steps = {}
+        self.positions = {}
+        # Same pick as Exercise.objects.filter(...).first(): the first exercise by name
+        for exercise in sorted(exercises, key=lambda exercise: (exercise.name, exercise.pk)):
+            self.steps.setdefault((exercise.category_id, exercise.difficulty_level), exercise)
+            self.positions[exercise.pk] = (exercise.category_id, exercise.difficulty_level)
+
+    def variant(self, category_id, difficulty_level):
+        """
+        Get the exercise at a difficulty level of a category, or None if there is none.
+        """
+        return self.steps.get((category_id, difficulty_level))
+
+    def neighbour(self, exercise_id, step):
+        """
+        Get the exercise `step` difficulty levels above (positive) or below (negative) an exercise.
+        Returns None at either end of the ladder or for unknown exercises.
+        """
+        if exercise_id not in self.positions:
+            return None
+        category_id, difficulty_level = self.positions[exercise_id]
+        index = DIFFICULTY_ORDER.index(difficulty_level) + step
+        if not 0 <= index < len(DIFFICULTY_ORDER):
+            return None
+        return self.variant(category_id, DIFFICULTY_ORDER[index])
+
+    def easier(self, exercise_id):
+        return self.neighbour(exercise_id, -1)
+
+    def harder(self, exercise_id):
+        return self.neighbour(exercise_id, 1)
+
+_ladder = None
+_ladder_version = None
+_ladder_checked_at = None
+_ladder_lock = threading.Lock()
+
+def get_ladder():
+    """
+    Get the process-wide exercise ladder, rebuilding it if the catalog changed.
+    The version stamp is read from the cache at most once per LADDER_CHECK_INTERVAL.
+    """
+    global _ladder, _ladder_version, _ladder_checked_at
+    with _ladder_lock:
+        if _ladder is not None and _ladder_checked_at is not None and time.monotonic() - _ladder_checked_at < LADDER_CHECK_INTERVAL:
+            return _ladder
+
+    version = cache.get(LADDER_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another process may have stamped a version first
+        if not cache.add(LADDER_VERSION_KEY, version, None):
+            version = cache.get(LADDER_VERSION_KEY)
+
+    with _ladder_lock:
+        if _ladder is None or _ladder_version != version:
+            _ladder = ExerciseLadder(Exercise.objects.all())
+            _ladder_version = version
+        _ladder_checked_at = time.monotonic()
+        return _ladder
+
+def invalidate_ladder():
+    """
+    Stamp a new catalog version so every process rebuilds its ladder (this one on its
+    next lookup).
+    """
+    global _ladder_checked_at
+    cache.set(LADDER_VERSION_KEY, uuid.uuid4().hex, None)
+    with _ladder_lock:
+        _ladder_checked_at = None
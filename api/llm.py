@@ -0,0 +1,450 @@
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from .chat_memory import estimate_tokens
+
+
+# Shared LLM client for the chatbot.
+# One client object per process reuses upstream connections, bounds every request by a
+# deadline, caps the number of in-flight completions with a semaphore and fails fast
+# through a circuit breaker when the upstream is degraded, so slow upstream calls
+# cannot pile up every worker.
+# The model itself is a pluggable backend selected with the LLM_BACKEND setting:
+# OpenAIBackend for real calls or FakeLLMBackend as a deterministic local stand-in
+# for load testing and profiling without paying for completions.
+
+# Reply text of a full completion with its prompt and completion token counts
+LLMResult = namedtuple('LLMResult', ['content', 'prompt_tokens', 'completion_tokens'])
+
+def estimate_prompt_tokens(messages):
+    """
+    Estimate the prompt tokens for the messages when the backend does not report usage.
+    """
+    return sum(estimate_tokens(message['content']) for message in messages)
+
+class LLMUnavailable(Exception):
+    """
+    Raised when a completion is rejected without calling the upstream,
+    either because the circuit breaker is open or too many completions are in flight.
+    """
+    friendly_message = "The assistant is busy right now. Please try again in a few moments."
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def is_upstream_failure(exc):
+    """
+    Whether an error says the upstream is unhealthy and should count towards the breaker.
+    Client errors such as bad requests or auth failures do not.
+    """
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code >= 500 or exc.status_code == 429
+    return True
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the upstream model.
+    Opens after `failure_threshold` consecutive failures, rejects calls while open and
+    lets a single trial call through once `reset_timeout` seconds have passed.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        # A trial call that never reached the upstream says nothing about its health
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._trial_in_flight = False
+
+class LLMBackend:
+    """
+    Interface for chat completion backends.
+    Backends only talk to the model; limits and the circuit breaker live in LLMClient.
+    """
+    def is_configured(self):
+        return True
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        """
+        Return an LLMResult with the full reply text and token counts for the messages.
+        """
+        raise NotImplementedError
+
+    async def stream(self, messages, max_tokens=500, temperature=0.7):
+        """
+        Yield the reply text for the messages in deltas.
+        """
+        raise NotImplementedError
+        yield
+
+class OpenAIBackend(LLMBackend):
+    """
+    Backend that calls OpenAI's chat completions API.
+    """
+    def __init__(self, api_key=None, model='gpt-4', timeout=30, max_retries=1):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+        self._async_client = None
+
+    def is_configured(self):
+        return self.api_key is not None
+
+    @property
+    def client(self):
+        # Created once and shared so upstream connections are reused
+        if self._client is None:
+            self._client = openai.OpenAI(
+                api_key=self.api_key,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._async_client
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        content = response.choices[0].message.content
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return LLMResult(content, estimate_prompt_tokens(messages), estimate_tokens(content))
+        return LLMResult(content, usage.prompt_tokens, usage.completion_tokens)
+
+    async def stream(self, messages, max_tokens=500, temperature=0.7):
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class FakeUpstreamError(Exception):
+    """
+    Injected upstream failure raised by FakeLLMBackend.
+    """
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic local stand-in for the model, for load testing and profiling offline.
+    Options:
+    - latency: 'constant', 'uniform' or 'lognormal' distribution of time to first token
+    - latency_ms: mean (or constant) time to first token in milliseconds
+    - latency_spread_ms: half-width for 'uniform', standard deviation for 'lognormal'
+    - tokens_per_second: generation rate after the first token (0 for instant)
+    - reply_tokens: number of tokens in each reply
+    - failure_rate: share of calls that raise FakeUpstreamError
+    - timeout_rate: share of calls that hang until the deadline and raise TimeoutError
+    - seed: seed for the latency and failure draws so runs are repeatable
+    """
+    def __init__(self, latency='constant', latency_ms=0, latency_spread_ms=0, tokens_per_second=0,
+                 reply_tokens=60, failure_rate=0.0, timeout_rate=0.0, seed=None, timeout=30, **kwargs):
+        # Other options shared with OpenAIBackend (api_key, model, max_retries) are ignored
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_spread_ms = latency_spread_ms
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        """
+        Draw the outcome and time to first token (seconds) for one call.
+        """
+        with self._lock:
+            roll = self._random.random()
+            if self.latency == 'uniform':
+                latency_ms = self._random.uniform(
+                    self.latency_ms - self.latency_spread_ms,
+                    self.latency_ms + self.latency_spread_ms
+                )
+            elif self.latency == 'lognormal' and self.latency_ms > 0:
+                # Parameterised by the mean and standard deviation of the latency itself
+                variance = self.latency_spread_ms ** 2
+                sigma = math.sqrt(math.log(1 + variance / self.latency_ms ** 2))
+                mu = math.log(self.latency_ms) - sigma ** 2 / 2
+                latency_ms = self._random.lognormvariate(mu, sigma)
+            else:
+                latency_ms = self.latency_ms
+
+        if roll < self.timeout_rate:
+            outcome = 'timeout'
+        elif roll < self.timeout_rate + self.failure_rate:
+            outcome = 'failure'
+        else:
+            outcome = 'success'
+        return outcome, max(0.0, latency_ms) / 1000
+
+    def reply_for(self, messages):
+        """
+        Build the deterministic reply for the messages.
+        The same last user message always gets the same reply.
+        """
+        last_message = messages[-1]['content'] if messages else ''
+        digest = hashlib.sha256(last_message.encode()).hexdigest()[:8]
+        words = ["Stand-in", "reply", f"{digest}."]
+        words += ["keep"] * max(0, self.reply_tokens - len(words))
+        return words[:self.reply_tokens]
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        outcome, latency = self._draw()
+        if outcome == 'timeout':
+            time.sleep(self.timeout)
+            raise TimeoutError("Fake completion exceeded its deadline.")
+        time.sleep(latency)
+        if outcome == 'failure':
+            raise FakeUpstreamError("Injected upstream failure.")
+
+        words = self.reply_for(messages)[:max_tokens]
+        if self.tokens_per_second:
+            time.sleep(len(words) / self.tokens_per_second)
+        return LLMResult(" ".join(words), estimate_prompt_tokens(messages), len(words))
+
+    async def stream(self, messages, max_tokens=500, temperature=0.7):
+        outcome, latency = self._draw()
+        if outcome == 'timeout':
+            await asyncio.sleep(self.timeout)
+            raise TimeoutError("Fake completion exceeded its deadline.")
+        await asyncio.sleep(latency)
+        if outcome == 'failure':
+            raise FakeUpstreamError("Injected upstream failure.")
+
+        for i, word in enumerate(self.reply_for(messages)[:max_tokens]):
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield word if i == 0 else f" {word}"
+
+class LLMClient:
+    """
+    Pooled, deadline-bounded client for chat completions on top of a backend.
+    """
+    def __init__(self, backend, timeout=30, max_in_flight=8, queue_timeout=5, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected_busy = 0
+        self.rejected_open = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def is_configured(self):
+        return self.backend.is_configured()
+
+    def _acquire(self):
+        """
+        Take an in-flight slot, waiting at most queue_timeout seconds.
+        Raises LLMUnavailable if the breaker is open or no slot frees up in time.
+        """
+        if not self.breaker.allow_request():
+            with self._lock:
+                self.rejected_open += 1
+            raise LLMUnavailable('circuit_open')
+
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+            if not acquired:
+                self.rejected_busy += 1
+            else:
+                self.in_flight += 1
+        if not acquired:
+            self.breaker.cancel_trial()
+            raise LLMUnavailable('busy')
+
+    def _release(self, succeeded, upstream_failure=True):
+        if succeeded:
+            self.breaker.record_success()
+        elif upstream_failure:
+            self.breaker.record_failure()
+        else:
+            self.breaker.cancel_trial()
+        with self._lock:
+            self.in_flight -= 1
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        """
+        Get a full completion for the messages and return it as an LLMResult.
+        """
+        self._acquire()
+        try:
+            result = self.backend.complete(messages, max_tokens=max_tokens, temperature=temperature)
+        except Exception as e:
+            self._release(False, is_upstream_failure(e))
+            raise
+        self._release(True)
+        return result
+
+    async def stream(self, messages, max_tokens=500, temperature=0.7):
+        """
+        Stream a completion for the messages, yielding text deltas.
+        The whole stream is bounded by the client's deadline.
+        """
+        # Waiting for a slot blocks, so do it off the event loop
+        await sync_to_async(self._acquire, thread_sensitive=False)()
+        succeeded = False
+        # Stays False if the consumer stops reading early (e.g. the client disconnects)
+        upstream_failure = False
+        try:
+            deadline = time.monotonic() + self.timeout
+            async for delta in self.backend.stream(messages, max_tokens=max_tokens, temperature=temperature):
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Chat completion stream exceeded its deadline.")
+                yield delta
+            succeeded = True
+        except Exception as e:
+            upstream_failure = is_upstream_failure(e)
+            raise
+        finally:
+            self._release(succeeded, upstream_failure)
+
+    def metrics(self):
+        with self._lock:
+            waits = self.completed + self.failed + self.rejected_busy
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected_busy': self.rejected_busy,
+                'rejected_circuit_open': self.rejected_open,
+                'queue_wait_avg': round(self.queue_wait_total / waits, 4) if waits else 0,
+                'queue_wait_max': round(self.queue_wait_max, 4),
+                'breaker_state': self.breaker.state,
+                'breaker_times_opened': self.breaker.times_opened,
+            }
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def build_llm_backend():
+    """
+    Build the backend selected by LLM_BACKEND with its OPTIONS.
+    """
+    config = settings.LLM_CLIENT
+    backend_class = import_string(settings.LLM_BACKEND['BACKEND'])
+    options = {
+        'api_key': settings.OPENAI_API_KEY,
+        'model': config.get('MODEL', 'gpt-4'),
+        'timeout': config.get('TIMEOUT', 30),
+        'max_retries': config.get('MAX_RETRIES', 1),
+    }
+    options.update(settings.LLM_BACKEND.get('OPTIONS', {}))
+    return backend_class(**options)
+
+def get_llm_client():
+    """
+    Get the process-wide LLM client, configured from LLM_CLIENT and LLM_BACKEND.
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            config = settings.LLM_CLIENT
+            _llm_client = LLMClient(
+                build_llm_backend(),
+                timeout=config.get('TIMEOUT', 30),
+                max_in_flight=config.get('MAX_IN_FLIGHT', 8),
+                queue_timeout=config.get('QUEUE_TIMEOUT', 5),
+                breaker=CircuitBreaker(
+                    failure_threshold=config.get('BREAKER_FAILURE_THRESHOLD', 5),
+                    reset_timeout=config.get('BREAKER_RESET_TIMEOUT', 30)
+                )
+            )
+        return _llm_client
+
+@receiver(setting_changed)
+def reset_llm_client(setting, **kwargs):
+    # Rebuild the client with the new configuration when the settings change (e.g. in tests)
+    global _llm_client
+    if setting in ('LLM_CLIENT', 'LLM_BACKEND', 'OPENAI_API_KEY'):
+        _llm_client = None
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.daily_stats import refresh_daily_stats
+from api.models import User
+
+class Command(BaseCommand):
+    help = "Rebuilds every user's daily adherence and pain stats from their reports and exercises (run once after migrating)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help="Only rebuild this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+            missing = set(options['user_ids']) - set(users.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown user ids: {', '.join(map(str, sorted(missing)))}.")
+
+        started = time.perf_counter()
+        user_count = row_count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            row_count += len(refresh_daily_stats(user_id))
+            user_count += 1
+            if user_count % 1000 == 0:
+                self.stdout.write(f"Rebuilt {user_count} users, {row_count} rows (up to user id {user_id})")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {row_count} daily stats rows for {user_count} users in {elapsed:.2f}s."))
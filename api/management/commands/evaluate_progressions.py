@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from api.models import User
+from api.recommendations import evaluate_user_range
+
+def user_id_ranges(chunk_size):
+    """
+    Split the user ids into consecutive (first id, last id) ranges of `chunk_size` ids.
+    """
+    bounds = User.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    return [
+        (first_id, min(first_id + chunk_size - 1, bounds['last']))
+        for first_id in range(bounds['first'], bounds['last'] + 1, chunk_size)
+    ]
+
+class Command(BaseCommand):
+    help = "Re-runs the progression rules for every active exercise and stores the pending recommendations (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Number of user ids evaluated per transaction")
+        parser.add_argument('--workers', type=int, default=1, help="Number of worker processes to evaluate ranges in")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError("--workers needs a database with concurrent writers, SQLite only supports one.")
+
+        # One timestamp for the whole run
+        now = timezone.now()
+        ranges = user_id_ranges(chunk_size)
+        started = time.perf_counter()
+        evaluated = written = 0
+
+        if workers > 1:
+            # Forked workers open their own connections instead of sharing this one
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [(last_id, pool.submit(evaluate_user_range, first_id, last_id, now)) for first_id, last_id in ranges]
+                for last_id, future in futures:
+                    exercises, recommendations = future.result()
+                    evaluated += exercises
+                    written += recommendations
+                    self.report_progress(evaluated, written, last_id)
+        else:
+            for first_id, last_id in ranges:
+                exercises, recommendations = evaluate_user_range(first_id, last_id, now)
+                evaluated += exercises
+                written += recommendations
+                self.report_progress(evaluated, written, last_id)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} pending recommendations for {evaluated} exercises in {elapsed:.2f}s."
+        ))
+
+    def report_progress(self, evaluated, written, last_id):
+        self.stdout.write(f"Evaluated {evaluated} exercises, {written} recommendations (up to user id {last_id})")
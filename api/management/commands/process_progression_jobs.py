@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.progression_queue import process_progression_jobs, queue_lag
+
+class Command(BaseCommand):
+    help = "Runs the queued progression checks of submitted reports in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of jobs claimed per transaction")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty instead of waiting for jobs")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        started = time.perf_counter()
+        processed = failed = 0
+        try:
+            while True:
+                batch_started = time.perf_counter()
+                batch_processed, batch_failed, lags = process_progression_jobs(options['batch_size'])
+                if not lags:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                processed += batch_processed
+                failed += batch_failed
+                elapsed = time.perf_counter() - batch_started
+                pending, oldest = queue_lag()
+                self.stdout.write(
+                    f"Processed {len(lags)} jobs in {elapsed:.2f}s ({len(lags) / elapsed:.1f} jobs/s), "
+                    f"{batch_failed} failed; lag avg={sum(lags) / len(lags):.1f}s max={max(lags):.1f}s; "
+                    f"{pending} pending (oldest {oldest:.1f}s)"
+                )
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} progression jobs ({failed} failed) in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from api.chat_memory import clear_history
+from api.instrumentation import chat_metrics
+from api.models import User
+from api.views import chatbot
+
+SAMPLE_MESSAGES = [
+    "Is this pain normal?",
+    "How many reps should I do today?",
+    "My knee feels stiff after the squats, what should I do?",
+    "Can I skip today's exercises?",
+    "When will I move on to harder exercises?",
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Command(BaseCommand):
+    help = "Profiles the chatbot endpoint end-to-end against the local fake LLM backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="Existing user to chat as")
+        parser.add_argument('--requests', type=int, default=50, help="Number of chatbot requests to send")
+        parser.add_argument('--concurrency', type=int, default=1, help="Number of requests in flight at once")
+        parser.add_argument('--latency', choices=['constant', 'uniform', 'lognormal'], default='lognormal')
+        parser.add_argument('--latency-ms', type=float, default=800, help="Mean time to first token")
+        parser.add_argument('--latency-spread-ms', type=float, default=300)
+        parser.add_argument('--tokens-per-second', type=float, default=0)
+        parser.add_argument('--reply-tokens', type=int, default=60)
+        parser.add_argument('--failure-rate', type=float, default=0.0)
+        parser.add_argument('--timeout-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep-history', action='store_true',
+                            help="Keep the chat messages written during the run")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        backend = {
+            'BACKEND': 'api.llm.FakeLLMBackend',
+            'OPTIONS': {
+                'latency': options['latency'],
+                'latency_ms': options['latency_ms'],
+                'latency_spread_ms': options['latency_spread_ms'],
+                'tokens_per_second': options['tokens_per_second'],
+                'reply_tokens': options['reply_tokens'],
+                'failure_rate': options['failure_rate'],
+                'timeout_rate': options['timeout_rate'],
+                'seed': options['seed'],
+            },
+        }
+        factory = APIRequestFactory()
+
+        def send(i):
+            request = factory.post(
+                '/api/chatbot/',
+                {'message': SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)], 'exerciseContext': '{}'},
+                format='json'
+            )
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    response = chatbot(request)
+            finally:
+                # Worker threads open their own connections
+                if options['concurrency'] > 1:
+                    connection.close()
+            return time.perf_counter() - started, response.status_code, len(queries)
+
+        chat_metrics.reset()
+        with override_settings(LLM_BACKEND=backend):
+            started = time.perf_counter()
+            if options['concurrency'] > 1:
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                    results = list(pool.map(send, range(options['requests'])))
+            else:
+                results = [send(i) for i in range(options['requests'])]
+            elapsed = time.perf_counter() - started
+
+        if not options['keep_history']:
+            clear_history(user)
+
+        latencies = [latency * 1000 for latency, _, _ in results]
+        statuses = {}
+        for _, status_code, _ in results:
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+        queries = [count for _, _, count in results]
+
+        self.stdout.write(f"Requests: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)")
+        self.stdout.write(f"Status codes: {dict(sorted(statuses.items()))}")
+        self.stdout.write(
+            f"Latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+            f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}"
+        )
+        self.stdout.write(f"Queries per request: avg={sum(queries) / len(queries):.1f} max={max(queries)}")
+        for phase, histogram in chat_metrics.snapshot()['phases'].items():
+            self.stdout.write(f"Phase {phase}: avg={histogram['avg_ms']:.1f}ms max={histogram['max_ms']:.1f}ms")
+        self.stdout.write(self.style.SUCCESS("Chatbot profile complete."))
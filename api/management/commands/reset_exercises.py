@@ -1,25 +1,139 @@
-from django.core.management.base import BaseCommand
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
-from api.models import User, UserExercise 
+from api.context import invalidate_patient_context
+from api.models import User, UserExercise, get_zone
+
+RESET_INTERVAL = timedelta(hours=24)
+
+def due_for_reset(now):
+    """Filter for users whose exercises have not been reset in the last 24 hours."""
+    return Q(last_reset__isnull=True) | Q(last_reset__lte=now - RESET_INTERVAL)
+
+def stale_flags(now, zone_name):
+    """
+    Filter for exercises whose completed or pain_level flags were recorded before the
+    current local day in the time zone `zone_name`.
+    """
+    local_date = now.astimezone(get_zone(zone_name)).date()
+    return (Q(completed=True) | ~Q(pain_level=0)) & (Q(last_completed_on__isnull=True) | Q(last_completed_on__lt=local_date))
+
+def reset_users(user_ids, now, due=None):
+    """
+    Resets exercises for a chunk of users with set-based updates.
+    Only users still due for a reset (by default, not reset in the last 24 hours) are
+    touched, and their last_reset is stamped in one transaction, so reruns and
+    overlapping runs are no-ops. Only flags recorded before each user's local day are
+    cleared (one UPDATE per time zone in the chunk), so completions made since the
+    patient's local midnight are kept.
+    Returns the number of users reset and of exercises whose flags were cleared.
+    """
+    due = due if due is not None else due_for_reset(now)
+    with transaction.atomic():
+        zones = {}
+        for user_id, zone_name in (
+            User.objects.select_for_update()
+            .filter(due, id__in=user_ids)
+            .values_list('id', 'timezone')
+        ):
+            zones.setdefault(zone_name, []).append(user_id)
+        if not zones:
+            return 0, 0
+        due_ids = [user_id for ids in zones.values() for user_id in ids]
+        exercises = 0
+        for zone_name, ids in zones.items():
+            exercises += UserExercise.objects.filter(stale_flags(now, zone_name), user_id__in=ids).update(
+                completed=False, pain_level=0
+            )
+        User.objects.filter(id__in=due_ids).update(last_reset=now)
+    invalidate_patient_context(*due_ids)
+    return len(due_ids), exercises
 
 def reset_user_exercises(user):
     """Resets exercises for a single user."""
     now = timezone.now()
-    if user.last_reset is None or (now - user.last_reset) >= timedelta(hours=24):
-        UserExercise.objects.filter(user=user, is_active=True).update(
-            completed=False, 
-            pain_level=0
-        )
+    if user.last_reset is None or (now - user.last_reset) >= RESET_INTERVAL:
+        reset_users([user.pk], now)
         user.last_reset = now
-        user.save()
         print(f"Reset exercises for {user.username} at {now}")
 
+def due_user_chunks(now, chunk_size, start_after=0, due=None):
+    """
+    Yield the ids of users due for a reset in chunks, in id order.
+    Pages by id rather than offset so chunks stay stable while earlier ones are reset.
+    """
+    due = due if due is not None else due_for_reset(now)
+    last_id = start_after
+    while True:
+        chunk = list(
+            User.objects.filter(due, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
 class Command(BaseCommand):
-    help = "Resets all users' exercises daily"
+    help = "Clears the completed and pain flags users' exercises kept from earlier days (run daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Number of users reset per transaction")
+        parser.add_argument('--workers', type=int, default=1, help="Number of worker processes to reset chunks in")
+        parser.add_argument('--start-after', type=int, default=0,
+                            help="Only reset users with an id above this (to resume from a reported chunk)")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be reset without writing")
 
     def handle(self, *args, **options):
-        users = User.objects.all()
-        for user in users:
-            reset_user_exercises(user)
-        self.stdout.write(self.style.SUCCESS(f"Reset exercises for {users.count()} users."))
\ No newline at end of file
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError("--workers needs a database with concurrent writers, SQLite only supports one.")
+
+        # One reference time for the whole run, so every chunk agrees on who is due
+        now = timezone.now()
+        due_users = User.objects.filter(due_for_reset(now), id__gt=options['start_after'])
+        total = due_users.count()
+
+        if options['dry_run']:
+            exercises = sum(
+                UserExercise.objects.filter(stale_flags(now, zone_name), user__in=due_users.filter(timezone=zone_name)).count()
+                for zone_name in due_users.order_by('timezone').values_list('timezone', flat=True).distinct()
+            )
+            self.stdout.write(f"Dry run: would reset {exercises} exercises for {total} users.")
+            return
+
+        chunks = due_user_chunks(now, chunk_size, options['start_after'])
+        started = time.perf_counter()
+        reset = 0
+
+        if workers > 1:
+            # Page through the ids up front, then close the connection so forked
+            # workers open their own instead of sharing it
+            chunks = list(chunks)
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [(chunk[-1], pool.submit(reset_users, chunk, now)) for chunk in chunks]
+                for last_id, future in futures:
+                    reset += future.result()[0]
+                    self.report_progress(reset, total, last_id)
+        else:
+            for chunk in chunks:
+                reset += reset_users(chunk, now)[0]
+                self.report_progress(reset, total, chunk[-1])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Reset exercises for {reset} users in {elapsed:.2f}s."))
+
+    def report_progress(self, reset, total, last_id):
+        self.stdout.write(f"Reset {reset}/{total} users (up to user id {last_id})")
@@ -0,0 +1,63 @@
+import time
+from datetime import datetime, time as dt_time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from api.models import User, ResetRun, get_zone
+from .reset_exercises import due_user_chunks, reset_users
+
+def due_buckets(now):
+    """
+    Yield (time zone name, local_date, local_midnight) for each time zone in use whose
+    local midnight has passed since it was last reset.
+    """
+    for name in User.objects.order_by('timezone').values_list('timezone', flat=True).distinct():
+        zone = get_zone(name)
+        local_date = now.astimezone(zone).date()
+        if ResetRun.objects.filter(bucket=name, local_date=local_date).exists():
+            continue
+        yield name, local_date, datetime.combine(local_date, dt_time.min, tzinfo=zone)
+
+class Command(BaseCommand):
+    help = "Resets exercises per time zone bucket once its local midnight has passed (run every few minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Number of users reset per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Report the buckets due without writing")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        now = timezone.now()
+        runs = 0
+        for bucket, local_date, local_midnight in due_buckets(now):
+            # Users in the time zone not reset since their local midnight
+            due = Q(timezone=bucket) & (Q(last_reset__isnull=True) | Q(last_reset__lt=local_midnight))
+
+            if options['dry_run']:
+                users = User.objects.filter(due).count()
+                self.stdout.write(f"Dry run: {bucket} ({local_date}) would reset {users} users.")
+                continue
+
+            started = time.perf_counter()
+            users_reset = exercises_reset = 0
+            for chunk in due_user_chunks(now, options['chunk_size'], due=due):
+                users, exercises = reset_users(chunk, now, due=due)
+                users_reset += users
+                exercises_reset += exercises
+
+            run, created = ResetRun.objects.get_or_create(
+                bucket=bucket,
+                local_date=local_date,
+                defaults={
+                    'duration': time.perf_counter() - started,
+                    'users_reset': users_reset,
+                    'exercises_reset': exercises_reset,
+                }
+            )
+            if created:
+                runs += 1
+                self.stdout.write(f"Reset {bucket} ({local_date}): {run}")
+
+        self.stdout.write(self.style.SUCCESS(f"Reset {runs} time zone buckets."))
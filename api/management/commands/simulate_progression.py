@@ -0,0 +1,160 @@
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from api.ladder import DIFFICULTY_ORDER, invalidate_ladder
+from api.models import User, Exercise, ExerciseCategory, UserExercise, Report, ReportExercise, PendingRecommendation
+from api.progression import increase_user_exercise, decrease_user_exercise
+from api.recommendations import pending_action
+from .profile_chatbot import percentile
+
+class SimulatedPatient:
+    """
+    A synthetic patient whose pain eases by `recovery` a day from `baseline`, rises by the
+    difficulty penalty for each level above beginner and varies by Gaussian noise.
+    """
+    def __init__(self, user, user_exercise, report, baseline, recovery):
+        self.user = user
+        self.user_exercise = user_exercise
+        self.report = report
+        self.baseline = baseline
+        self.recovery = recovery
+        self.first_increase = None
+        self.reached_advanced = None
+        self.decreases = 0
+        self.removed = None
+
+    def pain_level(self, day, rng, noise, difficulty_penalty):
+        level = DIFFICULTY_ORDER.index(self.user_exercise.exercise.difficulty_level)
+        pain = self.baseline - self.recovery * day + difficulty_penalty * level + rng.gauss(0, noise)
+        return min(10, max(0, round(pain)))
+
+def decide(patient, pain_level):
+    """
+    Run one day of a patient through the progression engine the way the completion PUT
+    does: save the exercise, write the report (which refreshes the recommendation), read
+    the pending action and confirm it. Returns the action, or None.
+    """
+    user_exercise = patient.user_exercise
+    user_exercise.completed = True
+    user_exercise.pain_level = pain_level
+    user_exercise.save()
+    ReportExercise.objects.create(
+        report=patient.report,
+        user_exercise=user_exercise,
+        completed_sets=user_exercise.sets,
+        completed_reps=user_exercise.reps,
+        pain_level=pain_level
+    )
+
+    action = pending_action(user_exercise)
+    if action == PendingRecommendation.INCREASE:
+        patient.user_exercise = increase_user_exercise(patient.user, user_exercise.pk) or user_exercise
+    elif action == PendingRecommendation.DECREASE:
+        patient.user_exercise = decrease_user_exercise(patient.user, user_exercise.pk) or user_exercise
+    return action
+
+class Command(BaseCommand):
+    help = "Replays synthetic patients' pain over several weeks through the progression engine (nothing is kept)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200, help="Number of synthetic patients")
+        parser.add_argument('--days', type=int, default=42, help="Number of days to simulate")
+        parser.add_argument('--noise', type=float, default=1.0, help="Standard deviation of daily pain noise")
+        parser.add_argument('--difficulty-penalty', type=float, default=1.5,
+                            help="Extra pain for each difficulty level above beginner")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['patients'] < 1 or options['days'] < 1:
+            raise CommandError("--patients and --days must be at least 1.")
+
+        rng = random.Random(options['seed'])
+        try:
+            # Everything the run writes is rolled back at the end
+            with transaction.atomic():
+                patients = self.create_patients(options['patients'], rng)
+                decisions, elapsed, queries = self.run(patients, options, rng)
+                transaction.set_rollback(True)
+        finally:
+            # The ladder was built with the synthetic exercises
+            invalidate_ladder()
+
+        self.report(patients, options, decisions, elapsed, queries)
+
+    def create_patients(self, count, rng):
+        token = uuid.uuid4().hex[:8]
+        category = ExerciseCategory.objects.create(name=f"Simulated {token}")
+        beginner = None
+        for difficulty_level in DIFFICULTY_ORDER:
+            exercise = Exercise.objects.create(
+                category=category,
+                name=f"Simulated {token} {difficulty_level}",
+                difficulty_level=difficulty_level,
+                sets=3,
+                reps=10
+            )
+            beginner = beginner or exercise
+
+        users = User.objects.bulk_create([User(username=f"simulated-{token}-{i}") for i in range(count)])
+        user_exercises = UserExercise.objects.bulk_create([
+            UserExercise(user=user, exercise=beginner, sets=3, reps=10) for user in users
+        ])
+        reports = Report.objects.bulk_create([Report(user=user) for user in users])
+        return [
+            SimulatedPatient(user, user_exercise, report, baseline=rng.uniform(0, 6), recovery=rng.uniform(0, 0.3))
+            for user, user_exercise, report in zip(users, user_exercises, reports)
+        ]
+
+    def run(self, patients, options, rng):
+        decisions = 0
+        queries = []
+        started = time.perf_counter()
+        for day in range(1, options['days'] + 1):
+            for patient in patients:
+                if patient.removed:
+                    continue
+                pain_level = patient.pain_level(day, rng, options['noise'], options['difficulty_penalty'])
+                # Keep the query log from filling up over a long run
+                reset_queries()
+                with CaptureQueriesContext(connection) as captured:
+                    action = decide(patient, pain_level)
+                decisions += 1
+                queries.append(len(captured))
+
+                if action == PendingRecommendation.REMOVE:
+                    patient.removed = day
+                elif action == PendingRecommendation.DECREASE:
+                    patient.decreases += 1
+                elif action == PendingRecommendation.INCREASE:
+                    patient.first_increase = patient.first_increase or day
+                    if patient.reached_advanced is None and patient.user_exercise.exercise.difficulty_level == Exercise.ADVANCED:
+                        patient.reached_advanced = day
+        return decisions, time.perf_counter() - started, queries
+
+    def report(self, patients, options, decisions, elapsed, queries):
+        total = len(patients)
+
+        def share(days):
+            return f"{100 * len(days) / total:.1f}%"
+
+        def spread(days):
+            if not days:
+                return "n/a"
+            return f"p50={percentile(days, 50)} p90={percentile(days, 90)}"
+
+        advanced = [patient.first_increase for patient in patients if patient.first_increase]
+        reached = [patient.reached_advanced for patient in patients if patient.reached_advanced]
+        removed = [patient.removed for patient in patients if patient.removed]
+        decreased = [patient.decreases for patient in patients if patient.decreases]
+
+        self.stdout.write(f"Patients: {total} over {options['days']} days (seed {options['seed']})")
+        self.stdout.write(f"Advanced a level: {share(advanced)} (days to first increase {spread(advanced)})")
+        self.stdout.write(f"Reached Advanced: {share(reached)} (days {spread(reached)})")
+        self.stdout.write(f"Decreased at least once: {share(decreased)}")
+        self.stdout.write(f"Removed: {share(removed)} (day {spread(removed)})")
+        self.stdout.write(f"Decisions: {decisions} in {elapsed:.2f}s ({decisions / elapsed:.0f} decisions/s)")
+        self.stdout.write(f"Queries per decision: avg={sum(queries) / len(queries):.1f} max={max(queries)}")
+        self.stdout.write(self.style.SUCCESS("Progression simulation complete."))
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:04
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def date_current_flags(apps, schema_editor):
+    # Flags of users already reset today belong to today, older ones are stale
+    UserExercise = apps.get_model('api', 'UserExercise')
+    today = timezone.localdate()
+    UserExercise.objects.filter(user__last_reset__date=today).update(last_completed_on=today)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_chatmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userexercise',
+            name='last_completed_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(date_current_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:06
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_userexercise_last_completed_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64, validators=[api.models.validate_timezone]),
+        ),
+        migrations.CreateModel(
+            name='ResetRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(max_length=9)),
+                ('local_date', models.DateField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('duration', models.FloatField(default=0)),
+                ('users_reset', models.PositiveIntegerField(default=0)),
+                ('exercises_reset', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'unique_together': {('bucket', 'local_date')},
+            },
+        ),
+    ]
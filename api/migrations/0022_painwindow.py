@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_pain_windows(apps, schema_editor):
+    # Seed a window for every exercise that already has reports
+    ReportExercise = apps.get_model('api', 'ReportExercise')
+    PainWindow = apps.get_model('api', 'PainWindow')
+    entries = {}
+    counts = {}
+    for pk, user_exercise_id, pain_level in ReportExercise.objects.order_by('id').values_list('id', 'user_exercise_id', 'pain_level'):
+        recent = entries.setdefault(user_exercise_id, [])
+        recent.append([pk, pain_level])
+        if len(recent) > settings.PAIN_WINDOW_SIZE:
+            del recent[0]
+        counts[user_exercise_id] = counts.get(user_exercise_id, 0) + 1
+
+    windows = []
+    for user_exercise_id, recent in entries.items():
+        levels = [pain_level for _, pain_level in recent]
+        windows.append(PainWindow(
+            user_exercise_id=user_exercise_id,
+            recent=recent,
+            count=counts[user_exercise_id],
+            max_pain=max(levels),
+            mean_pain=sum(levels) / len(levels),
+        ))
+    PainWindow.objects.bulk_create(windows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_user_timezone_resetrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PainWindow',
+            fields=[
+                ('user_exercise', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pain_window', serialize=False, to='api.userexercise')),
+                ('recent', models.JSONField(blank=True, default=list)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('max_pain', models.IntegerField(default=0)),
+                ('mean_pain', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_pain_windows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_painwindow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRecommendation',
+            fields=[
+                ('user_exercise', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_recommendation', serialize=False, to='api.userexercise')),
+                ('action', models.CharField(choices=[('increase', 'Increase difficulty'), ('decrease', 'Decrease difficulty'), ('remove', 'Consider removal')], max_length=10)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
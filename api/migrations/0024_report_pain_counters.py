@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_report_pain(apps, schema_editor):
+    # Seed the counters from the exercises already on each report
+    Report = apps.get_model('api', 'Report')
+    ReportExercise = apps.get_model('api', 'ReportExercise')
+    rows = ReportExercise.objects.filter(report=OuterRef('pk')).order_by().values('report')
+    Report.objects.update(
+        pain_sum=Coalesce(Subquery(rows.annotate(total=Sum('pain_level')).values('total')), 0),
+        pain_count=Coalesce(Subquery(rows.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_pendingrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='pain_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='pain_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_report_pain, migrations.RunPython.noop),
+    ]
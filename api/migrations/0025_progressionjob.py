@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_report_pain_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pain_level', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.TextField(blank=True, default='')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progression_jobs', to='api.report')),
+                ('user_exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.userexercise')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_dailyuserstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resetrun',
+            name='bucket',
+            field=models.CharField(max_length=64),
+        ),
+    ]
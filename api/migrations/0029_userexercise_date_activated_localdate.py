@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_resetrun_bucket_timezone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userexercise',
+            name='date_activated',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+    ]
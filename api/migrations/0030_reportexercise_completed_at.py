@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_userexercise_date_activated_localdate'),
+    ]
+
+    operations = [
+        # Existing rows stay null (time unknown); new rows default to now
+        migrations.AddField(
+            model_name='reportexercise',
+            name='completed_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reportexercise',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, null=True),
+        ),
+    ]
@@ -1,10 +1,56 @@
+import zoneinfo
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Min, Value, When
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.utils.text import slugify
 
 
+class TrackedFieldsMixin:
+    """
+    Snapshot the values of `tracked_fields` when an instance is loaded or saved,
+    so save() can tell which of them changed without re-fetching the row.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def snapshot_tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field: getattr(self, field) for field in self.tracked_fields if field not in deferred
+        }
+
+    def has_changed(self, field):
+        # New instances and fields that were never loaded count as changed
+        loaded_values = getattr(self, '_loaded_values', {})
+        if self._state.adding or field not in loaded_values:
+            return True
+        return getattr(self, field) != loaded_values[field]
+
+    def loaded_value(self, field):
+        """
+        Value of a tracked field as it was last loaded or saved.
+        Falls back to reading the row for instances that were not loaded from the database.
+        """
+        loaded_values = getattr(self, '_loaded_values', {})
+        if field not in loaded_values:
+            if self._state.adding:
+                return None
+            loaded_values[field] = type(self)._base_manager.filter(pk=self.pk).values_list(field, flat=True).first()
+            self._loaded_values = loaded_values
+        return loaded_values[field]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.snapshot_tracked_fields()
+
+
 # ExerciseCategory model
 # GET: get a list of all exercise categories
 # POST: add a new exercise category
@@ -104,7 +150,83 @@ class Exercise(models.Model):
 # POST: users can add exercises to their list
 # PUT: users can edit or update the amount of exercises they have
 # DELETE: users can remove assigned exercises from themselves.
-class UserExercise(models.Model):
+class UserExerciseQuerySet(models.QuerySet):
+    """
+    Bulk writes that keep the rules from UserExercise.save: rows going from
+    active to inactive get today's date_deactivated, and the daily stats of
+    users whose exercises were added or changed activity are refreshed.
+    """
+    def update(self, **kwargs):
+        today = timezone.localdate()
+        if kwargs.get('is_active') is False and 'date_deactivated' not in kwargs:
+            # SET expressions read the old row, so only rows that were active get dated
+            kwargs['date_deactivated'] = Case(
+                When(is_active=True, then=Value(today)),
+                default=F('date_deactivated'),
+                output_field=models.DateField(),
+            )
+        interval_fields = [field for field in ('date_activated', 'date_deactivated') if field in kwargs]
+        if not interval_fields:
+            return super().update(**kwargs)
+
+        # Each user's stats change from the earliest old or new date of the rows
+        new_days = []
+        for field in interval_fields:
+            value = kwargs[field]
+            if isinstance(value, Case):
+                new_days.append(today)
+            elif value is not None:
+                new_days.append(value)
+        since = {}
+        for row in self.order_by().values('user_id').annotate(**{f'first_{field}': Min(field) for field in interval_fields}):
+            days = [day for day in [row[f'first_{field}'] for field in interval_fields] + new_days if day is not None]
+            if days:
+                since[row['user_id']] = min(days)
+        rows = super().update(**kwargs)
+        refresh_users_daily_stats(since)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        fields = list(fields)
+        if 'is_active' in fields:
+            for obj in objs:
+                obj.mark_deactivation()
+            if 'date_deactivated' not in fields:
+                fields.append('date_deactivated')
+        since = {}
+        if {'date_activated', 'date_deactivated'} & set(fields):
+            for obj in objs:
+                day = obj.activity_change_date()
+                if day is not None:
+                    since[obj.user_id] = min(day, since.get(obj.user_id, day))
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        for obj in objs:
+            obj.snapshot_tracked_fields()
+        refresh_users_daily_stats(since)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        since = {}
+        for obj in objs:
+            since[obj.user_id] = min(obj.date_activated, since.get(obj.user_id, obj.date_activated))
+        refresh_users_daily_stats(since)
+        return objs
+
+def refresh_users_daily_stats(since):
+    """
+    Refresh the daily stats of several users, each from its {user id: date}, once the
+    current transaction commits.
+    """
+    from .daily_stats import refresh_daily_stats_on_commit
+
+    for user_id, day in since.items():
+        refresh_daily_stats_on_commit(user_id, day)
+
+class UserExercise(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('is_active', 'date_activated', 'date_deactivated')
+
     user = models.ForeignKey('User', on_delete=models.CASCADE)
     exercise = models.ForeignKey('Exercise', on_delete=models.CASCADE)
     sets = models.IntegerField(default=0)
@@ -113,9 +235,12 @@ class UserExercise(models.Model):
     pain_level = models.IntegerField(default=0)
     completed = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)  
-    date_activated = models.DateField(auto_now_add=True)
+    date_activated = models.DateField(default=timezone.localdate, editable=False)
     date_deactivated = models.DateField(null=True, blank=True)  
+    # Day the completed and pain_level flags were recorded on
+    last_completed_on = models.DateField(null=True, blank=True)
 
+    objects = UserExerciseQuerySet.as_manager()
 
     class Meta:
         unique_together = ('user', 'exercise')
@@ -137,17 +262,76 @@ class UserExercise(models.Model):
             'is_active': self.is_active,
         }
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.clear_stale_flags()
+        return instance
+
+    def clear_stale_flags(self):
+        """
+        completed and pain_level only hold for the day they were recorded on.
+        Flags from an earlier day read as not completed with no pain, so the daily
+        reset happens at read time instead of rewriting the rows every day.
+        """
+        if {'completed', 'pain_level', 'last_completed_on'} & self.get_deferred_fields():
+            return
+        if self.last_completed_on != timezone.localdate():
+            self.completed = False
+            self.pain_level = 0
+
     def clean(self):
         if self.sets < 0 or self.reps < 0:
             raise ValidationError("Sets and reps must be non-negative.")
         
+    def mark_deactivation(self):
+        """
+        Set date_deactivated if is_active changed from True to False since the row was loaded.
+        """
+        if not self._state.adding and not self.is_active and self.loaded_value('is_active'):
+            self.date_deactivated = timezone.localdate()
+
+    def activity_change_date(self):
+        """
+        Earliest day on which the exercise's active days change with this write (the old or
+        new date_activated or date_deactivated, whichever changed), or None.
+        """
+        if self._state.adding:
+            return None
+        days = []
+        for field in ('date_activated', 'date_deactivated'):
+            if self.has_changed(field):
+                days += [self.loaded_value(field), getattr(self, field)]
+        days = [day for day in days if day is not None]
+        return min(days) if days else None
+
     def save(self, *args, **kwargs):
+        from .daily_stats import refresh_daily_stats_on_commit
+
         # If is_active is changing from True to False, set date_deactivated
-        if self.pk:  # Only for existing instances
-            old_instance = UserExercise.objects.get(pk=self.pk)
-            if old_instance.is_active and not self.is_active:
-                self.date_deactivated = timezone.now().date()
+        self.mark_deactivation()
+        adding = self._state.adding
+        since = self.activity_change_date()
+
+        # Saved flags are today's flags
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.last_completed_on = timezone.localdate()
+        else:
+            update_fields = set(update_fields)
+            if {'completed', 'pain_level'} & update_fields:
+                self.last_completed_on = timezone.localdate()
+                update_fields.add('last_completed_on')
+            if 'is_active' in update_fields:
+                update_fields.add('date_deactivated')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
+
+        # Keep the user's daily stats in step with the days the exercise was active on
+        if adding:
+            since = self.date_activated
+        if since is not None:
+            refresh_daily_stats_on_commit(self.user_id, since)
     
 
 # InjuryType model
@@ -171,21 +355,40 @@ class InjuryType(models.Model):
             'treatment': list(self.treatment.values('id', 'name', 'category', 'difficulty_level')),
         }
 
+def validate_timezone(value):
+    if value not in zoneinfo.available_timezones():
+        raise ValidationError(f"'{value}' is not a valid IANA time zone.")
+
+def get_zone(name):
+    # Unknown names fall back to UTC rather than failing the request
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return zoneinfo.ZoneInfo('UTC')
+
 # Custom user model
 # GET: get patient user's details (viewing their profile etc)
 # POST: signup - no access via views should be available
 # PUT: edit or update details about the user - name, dob, exercise list, username, password
 # DELETE: delete user in profile (only for current user)
-class User(AbstractUser):
+class User(TrackedFieldsMixin, AbstractUser):
+    tracked_fields = ('injury_type_id',)
+
     full_name = models.CharField(max_length=100)
     injury_type = models.ForeignKey(InjuryType, on_delete=models.CASCADE, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     exercises = models.ManyToManyField(Exercise, through="UserExercise")
     last_reset = models.DateTimeField(null=True, blank=True)
+    # IANA time zone the patient's day (and daily reset) follows
+    timezone = models.CharField(max_length=64, default='UTC', validators=[validate_timezone])
 
     def __str__(self):
         return f"{self.full_name}, {self.email}"
 
+    @property
+    def tzinfo(self):
+        return get_zone(self.timezone)
+
     def as_dict(self):
         return {
             'id': self.id,
@@ -197,6 +400,7 @@ class User(AbstractUser):
             'injury_type': self.injury_type.as_dict() if self.injury_type else None,
             'exercises': list(self.exercises.values('id', 'name', 'category', 'difficulty_level')),
             'last_reset': self.last_reset,
+            'timezone': self.timezone,
         }
 
     def priv_as_dict(self):
@@ -212,12 +416,46 @@ class User(AbstractUser):
         # Update full_name with first_name and last_name from Abstract User
         self.full_name = f"{self.first_name} {self.last_name}"
 
-        # Assign exercises based on injury type
-        if self.injury_type:
-            for exercise in self.injury_type.treatment.all():
-                UserExercise.objects.get_or_create(user=self, exercise=exercise, defaults={'sets': exercise.sets, 'reps': exercise.reps, 'hold': exercise.hold, 'pain_level': 0, 'completed': False, 'is_active': True})
-
+        # Only (re)assign treatment exercises when the injury type changes
+        sync_exercises = self.injury_type_id is not None and self.has_changed('injury_type_id')
         super().save(*args, **kwargs)
+        if sync_exercises:
+            self.sync_treatment_exercises()
+
+    def sync_treatment_exercises(self):
+        """
+        Assign the injury type's treatment exercises in one insert.
+        Exercises the user already has are left as they are.
+        """
+        from .context import invalidate_patient_context
+
+        UserExercise.objects.bulk_create([
+            UserExercise(user=self, exercise=exercise, sets=exercise.sets, reps=exercise.reps, hold=exercise.hold,
+                         pain_level=0, completed=False, is_active=True)
+            for exercise in self.injury_type.treatment.all()
+        ], ignore_conflicts=True)
+        invalidate_patient_context(self.pk)
+
+    def set_exercises(self, exercises):
+        """
+        Make the given exercises the user's active exercises with a diff against the current ones.
+        Removed exercises are deactivated rather than deleted so their report history is kept,
+        previously removed ones are reactivated and new ones are inserted in one statement.
+        """
+        from .context import invalidate_patient_context
+
+        wanted = {exercise.pk for exercise in exercises}
+        existing = set(UserExercise.objects.filter(user=self).values_list('exercise_id', flat=True))
+
+        UserExercise.objects.filter(user=self, is_active=True).exclude(exercise_id__in=wanted).update(is_active=False)
+        UserExercise.objects.filter(user=self, is_active=False, exercise_id__in=wanted & existing).update(
+            is_active=True,
+            date_deactivated=None
+        )
+        UserExercise.objects.bulk_create([
+            UserExercise(user=self, exercise_id=exercise_id) for exercise_id in wanted - existing
+        ])
+        invalidate_patient_context(self.pk)
 
 
 # ReportExercise model for tracking exercises in reports
@@ -225,15 +463,42 @@ class User(AbstractUser):
 # POST: add a new exercise to a report
 # PUT: edit or update an exercise in a report
 # DELETE: delete an exercise from a report
-class ReportExercise(models.Model):
+class ReportExercise(TrackedFieldsMixin, models.Model):
     report = models.ForeignKey('Report', on_delete=models.CASCADE, related_name='report_exercises')
     user_exercise = models.ForeignKey('UserExercise', on_delete=models.CASCADE)
     completed_reps = models.IntegerField(default=0)  # Track completed reps
     completed_sets = models.IntegerField(default=0)  # Track completed sets
     pain_level = models.IntegerField(default=0)  # Pain level during exercise
+    # When the completion happened (the client's time for offline syncs), so an older synced
+    # completion can't replace a later one; null for rows written before it was tracked
+    completed_at = models.DateTimeField(default=timezone.now, null=True)
+
+    tracked_fields = ('report_id', 'user_exercise_id', 'pain_level')
 
     def __str__(self):
         return f"{self.user_exercise.exercise} - {self.completed_reps} reps"
+
+    def save(self, *args, **kwargs):
+        # Keep the reports' running pain counters in step; deletes are counted in signals.py
+        # so that queryset deletes are covered too
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'report', 'report_id', 'pain_level'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        adding = self._state.adding
+        if not adding:
+            loaded_report_id = self.loaded_value('report_id')
+            loaded_pain_level = self.loaded_value('pain_level')
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Report.count_pain(self.report_id, self.pain_level, 1)
+            elif loaded_report_id != self.report_id:
+                Report.count_pain(loaded_report_id, -loaded_pain_level, -1)
+                Report.count_pain(self.report_id, self.pain_level, 1)
+            elif loaded_pain_level != self.pain_level:
+                Report.count_pain(self.report_id, self.pain_level - loaded_pain_level)
     
     def as_dict(self):
         return {
@@ -245,17 +510,59 @@ class ReportExercise(models.Model):
             'pain_level': self.pain_level,
         }
 
+# PainWindow model for the rolling pain statistics of a UserExercise
+# Kept up to date whenever a ReportExercise is written (see pain_window.py), so progression
+# checks read the recent pain levels of an exercise from one row instead of its report history.
+class PainWindow(models.Model):
+    user_exercise = models.OneToOneField(UserExercise, on_delete=models.CASCADE, primary_key=True, related_name='pain_window')
+    recent = models.JSONField(default=list, blank=True)  # [report exercise id, pain level] pairs, oldest first
+    count = models.PositiveIntegerField(default=0)  # Reports ever recorded for the exercise
+    max_pain = models.IntegerField(default=0)  # Highest pain level in the window
+    mean_pain = models.FloatField(default=0)  # Average pain level in the window
+
+    def __str__(self):
+        return f"Pain window for {self.user_exercise}: {self.pain_levels()}"
+
+    def pain_levels(self, num_reports=None):
+        """
+        Get the pain levels in the window, oldest first, optionally only the latest `num_reports`.
+        """
+        entries = self.recent if num_reports is None else self.recent[max(len(self.recent) - num_reports, 0):]
+        return [pain_level for _, pain_level in entries]
+
+# PendingRecommendation model for the progression rules' verdict on a UserExercise
+# Written by the evaluate_progressions batch job and refreshed on report writes (see
+# recommendations.py); exercises without a row need no change.
+class PendingRecommendation(models.Model):
+    INCREASE = 'increase'
+    DECREASE = 'decrease'
+    REMOVE = 'remove'
+    ACTION_CHOICES = [
+        (INCREASE, 'Increase difficulty'),
+        (DECREASE, 'Decrease difficulty'),
+        (REMOVE, 'Consider removal'),
+    ]
+
+    user_exercise = models.OneToOneField(UserExercise, on_delete=models.CASCADE, primary_key=True, related_name='pending_recommendation')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.get_action_display()} for {self.user_exercise}"
+
 # Report model for tracking user progress over time
 # GET: get a list of all reports for a user
 # POST: add a new report for a user
 # PUT: edit or update a report for a user
 # DELETE: delete a report for a user
-class Report(models.Model):
+class Report(TrackedFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="reports")
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate)  # Offline completions are filed under their own day
     pain_level = models.IntegerField(default=0)
     exercises_completed = models.ManyToManyField(UserExercise, through=ReportExercise) 
     notes = models.TextField(default="", blank=True)  
+    pain_sum = models.IntegerField(default=0)  # Sum of the report's exercise pain levels
+    pain_count = models.PositiveIntegerField(default=0)  # Number of exercises in the report
 
     def clean(self):
         if self.pain_level < 0 or self.pain_level > 10:
@@ -267,6 +574,59 @@ class Report(models.Model):
     def __str__(self):
         return f"Report for {self.user.full_name} on {self.date}"
 
+    tracked_fields = ('date',)
+
+    # Only ever changed in the database by count_pain()
+    counter_fields = ('pain_sum', 'pain_count')
+
+    def save(self, *args, **kwargs):
+        # Don't write back counters that may have moved since this instance was loaded
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def average_pain(self):
+        """
+        Average pain level of the report's exercises at full precision, or None if it has none.
+        """
+        if not self.pain_count:
+            return None
+        return self.pain_sum / self.pain_count
+
+    @classmethod
+    def count_pains(cls, deltas):
+        """
+        Adjust several reports' running pain counters in one UPDATE.
+        `deltas` maps report ids to (pain delta, count delta).
+        """
+        if not deltas:
+            return
+        cls.objects.filter(pk__in=deltas).update(
+            pain_sum=F('pain_sum') + Case(
+                *[When(pk=report_id, then=Value(pain_delta)) for report_id, (pain_delta, _) in deltas.items()],
+                default=Value(0)
+            ),
+            pain_count=F('pain_count') + Case(
+                *[When(pk=report_id, then=Value(count_delta)) for report_id, (_, count_delta) in deltas.items()],
+                default=Value(0)
+            )
+        )
+
+    @classmethod
+    def count_pain(cls, report_id, pain_delta, count_delta=0):
+        """
+        Adjust a report's running pain counters in the database.
+        A single UPDATE with F() expressions, so concurrent writers never lose a change.
+        """
+        cls.objects.filter(pk=report_id).update(
+            pain_sum=F('pain_sum') + pain_delta,
+            pain_count=F('pain_count') + count_delta
+        )
+
     def as_dict(self):
         return {
             'id': self.id,
@@ -275,4 +635,111 @@ class Report(models.Model):
             'pain_level': self.pain_level,
             'exercises_completed': list(self.exercises_completed.values('id', 'exercise_name', 'sets', 'reps')),
             'notes': self.notes,
-        }
\ No newline at end of file
+            'average_pain': self.average_pain,
+        }
+
+# ChatMessage model for the chatbot's conversation memory
+# Stores the recent turns of each user's chat plus at most one condensed summary
+# of older turns, so the stored history stays bounded however long a patient chats.
+class ChatMessage(models.Model):
+    USER = 'user'
+    ASSISTANT = 'assistant'
+    SUMMARY = 'summary'
+    ROLE_CHOICES = [
+        (USER, 'User'),
+        (ASSISTANT, 'Assistant'),
+        (SUMMARY, 'Summary'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['user', 'role'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.role} ({self.token_count} tokens)"
+
+# ResetRun model recording each run of the daily reset scheduler
+# Users are bucketed by their time zone, and each bucket is reset once per local day,
+# after its local midnight has passed. Keyed by zone name rather than UTC offset, so a
+# DST change does not make a zone due again on the same local day.
+class ResetRun(models.Model):
+    bucket = models.CharField(max_length=64)  # Time zone name, e.g. "Asia/Tokyo"
+    local_date = models.DateField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    duration = models.FloatField(default=0)  # Seconds
+    users_reset = models.PositiveIntegerField(default=0)
+    exercises_reset = models.PositiveIntegerField(default=0)  # Exercises whose stale flags were cleared
+
+    class Meta:
+        unique_together = ('bucket', 'local_date')
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.bucket} on {self.local_date} ({self.users_reset} users, {self.duration:.2f}s)"
+
+# ProgressionJob model for the deferred progression checks of submitted reports
+# Report updates queue one job per exercise once their transaction commits, and the
+# process_progression_jobs worker runs them in batches (see progression_queue.py).
+# Finished jobs are deleted; failed ones stay for inspection.
+class ProgressionJob(models.Model):
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+    ]
+
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='progression_jobs')
+    user_exercise = models.ForeignKey(UserExercise, on_delete=models.CASCADE)
+    pain_level = models.IntegerField(default=0)  # Pain level reported for the exercise
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    enqueued_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(default="", blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_status_display()} progression job for {self.user_exercise} ({self.enqueued_at})"
+
+# SyncEvent model, the idempotency key index of the offline sync endpoint
+# Every applied completion event keeps its client-chosen key here, so events sent again
+# (e.g. a batch retried after a token refresh) are recognised and skipped.
+class SyncEvent(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_events')
+    idempotency_key = models.CharField(max_length=64)
+    user_exercise = models.ForeignKey(UserExercise, on_delete=models.CASCADE)
+    completed_at = models.DateTimeField()  # Client time of the completion
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'idempotency_key')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.idempotency_key}"
+
+# DailyUserStats model, the per-user daily rollup read by the analytics endpoints
+# One row per user for each day that has reported exercises or on which one of the user's
+# exercises was activated or deactivated (see daily_stats.py). The number of active
+# exercises only changes on the latter days, so a day without a row has the active count
+# of the user's latest earlier row and nothing completed.
+class DailyUserStats(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    active_count = models.PositiveIntegerField(default=0)  # Exercises active on the day
+    completed_count = models.PositiveIntegerField(default=0)  # Reported exercises that were active on the day
+    pain_sum = models.IntegerField(default=0)  # Sum of the pain levels of all the day's reported exercises
+    pain_count = models.PositiveIntegerField(default=0)  # Number of the day's reported exercises
+
+    class Meta:
+        unique_together = ('user', 'date')
+        verbose_name_plural = 'daily user stats'
+
+    def __str__(self):
+        return f"Stats for {self.user.username} on {self.date}: {self.completed_count}/{self.active_count}"
@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from .models import PainWindow, ReportExercise
+
+
+# Rolling pain statistics per UserExercise.
+# Each exercise keeps its latest PAIN_WINDOW_SIZE report pain levels in a PainWindow row,
+# along with the number of reports ever recorded and the window's max and mean. Writes to
+# ReportExercise update the row under a row lock (see signals.py), so reads such as the
+# consistent-low-pain check never scan the report history. The number of reports and the
+# pain threshold a check uses are chosen at read time, so either can change freely.
+
+def window_stats(entries):
+    """
+    Get the (max, mean) pain level of a list of [report exercise id, pain level] entries.
+    """
+    if not entries:
+        return 0, 0
+    levels = [pain_level for _, pain_level in entries]
+    return max(levels), sum(levels) / len(levels)
+
+def set_entries(window, entries):
+    window.recent = entries[-settings.PAIN_WINDOW_SIZE:]
+    window.max_pain, window.mean_pain = window_stats(window.recent)
+
+def history_entries(user_exercise_id):
+    """
+    Read the latest PAIN_WINDOW_SIZE [report exercise id, pain level] entries from the report history.
+    """
+    rows = ReportExercise.objects.filter(user_exercise_id=user_exercise_id).order_by('-id').values_list('id', 'pain_level')
+    return [[pk, pain_level] for pk, pain_level in reversed(rows[:settings.PAIN_WINDOW_SIZE])]
+
+def history_windows(user_exercise_ids):
+    """
+    Build (unsaved) pain windows for several exercises from their report history in two
+    queries: one windowed query for each exercise's latest PAIN_WINDOW_SIZE reports and
+    one for the report counts. Returns {user exercise id: PainWindow}.
+    """
+    rows = (
+        ReportExercise.objects.filter(user_exercise_id__in=user_exercise_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=[F('user_exercise_id')], order_by=F('id').desc()))
+        .filter(rank__lte=settings.PAIN_WINDOW_SIZE)
+        .order_by('user_exercise_id', 'id')
+        .values_list('user_exercise_id', 'id', 'pain_level')
+    )
+    entries = {}
+    for user_exercise_id, pk, pain_level in rows:
+        entries.setdefault(user_exercise_id, []).append([pk, pain_level])
+    counts = dict(
+        ReportExercise.objects.filter(user_exercise_id__in=user_exercise_ids)
+        .values('user_exercise_id').annotate(count=Count('id')).values_list('user_exercise_id', 'count')
+    )
+
+    windows = {}
+    for user_exercise_id in user_exercise_ids:
+        window = PainWindow(user_exercise_id=user_exercise_id, count=counts.get(user_exercise_id, 0))
+        set_entries(window, entries.get(user_exercise_id, []))
+        windows[user_exercise_id] = window
+    return windows
+
+def rebuild_pain_window(user_exercise_id):
+    """
+    Recompute an exercise's pain window from its report history.
+    Only updates an existing window, so it is safe while the exercise itself is being deleted.
+    Returns the recomputed window.
+    """
+    window = PainWindow(user_exercise_id=user_exercise_id)
+    set_entries(window, history_entries(user_exercise_id))
+    window.count = ReportExercise.objects.filter(user_exercise_id=user_exercise_id).count()
+    PainWindow.objects.filter(pk=user_exercise_id).update(
+        recent=window.recent,
+        count=window.count,
+        max_pain=window.max_pain,
+        mean_pain=window.mean_pain,
+    )
+    return window
+
+def record_pain(report_exercise, created):
+    """
+    Fold a saved ReportExercise into its exercise's pain window.
+    A new report is appended (dropping the oldest beyond the window size), an edited one
+    replaces its entry if it is still in the window.
+    """
+    with transaction.atomic():
+        window, window_created = PainWindow.objects.select_for_update().get_or_create(
+            user_exercise_id=report_exercise.user_exercise_id
+        )
+        if window_created:
+            # First report seen for the exercise: start from whatever history it already has
+            set_entries(window, history_entries(report_exercise.user_exercise_id))
+            window.count = ReportExercise.objects.filter(user_exercise_id=report_exercise.user_exercise_id).count()
+            window.save()
+            return window
+
+        entry = [report_exercise.pk, report_exercise.pain_level]
+        entries = [existing for existing in window.recent if existing[0] != report_exercise.pk]
+        if created:
+            window.count += 1
+            entries.append(entry)
+        elif len(entries) < len(window.recent):
+            entries.append(entry)
+        else:
+            # An edit to a report that already left the window
+            return window
+
+        entries.sort()
+        set_entries(window, entries)
+        window.save()
+        return window
+
+def recent_pain_levels(user_exercise, num_reports):
+    """
+    Get the pain levels of an exercise's latest `num_reports` reports, oldest first.
+    Reads the pain window; only falls back to the report history when more reports are
+    asked for than the window holds.
+    """
+    window = PainWindow.objects.filter(user_exercise_id=user_exercise.pk).first()
+    if window is None:
+        return []
+
+    levels = window.pain_levels(num_reports)
+    if len(levels) < num_reports and window.count > len(levels):
+        rows = ReportExercise.objects.filter(user_exercise=user_exercise).order_by('-id').values_list('pain_level', flat=True)
+        levels = list(reversed(rows[:num_reports]))
+    return levels
+
+def has_consistent_low_pain(user_exercise, num_reports=3, max_pain_level=4):
+    """
+    Check if the user has consistent low pain levels in their recent reports.
+    Reads the exercise's pain window instead of its reports.
+    """
+    recent_levels = recent_pain_levels(user_exercise, num_reports)
+
+    # Ensure there are enough reports
+    if len(recent_levels) < num_reports:
+        print(f"Not enough reports. Expected {num_reports}, found {len(recent_levels)}")
+        return False
+    
+    # Check if all recent reports have pain levels below the threshold
+    return all(pain_level < max_pain_level for pain_level in recent_levels)
+
+def record_pains(created, edited=()):
+    """
+    Fold bulk-written ReportExercise rows into their exercises' pain windows with a fixed
+    number of queries. For bulk_create and bulk_update, which send no post_save signals.
+    New rows are appended; edited rows replace their entry if it is still in the window.
+    Returns the updated windows as {user exercise id: PainWindow}.
+    """
+    new_entries = {}
+    edited_entries = {}
+    for report_exercise in created:
+        new_entries.setdefault(report_exercise.user_exercise_id, []).append([report_exercise.pk, report_exercise.pain_level])
+    for report_exercise in edited:
+        edited_entries.setdefault(report_exercise.user_exercise_id, {})[report_exercise.pk] = report_exercise.pain_level
+    user_exercise_ids = list(new_entries.keys() | edited_entries.keys())
+    if not user_exercise_ids:
+        return {}
+
+    with transaction.atomic():
+        windows = PainWindow.objects.select_for_update().in_bulk(user_exercise_ids)
+        missing = [user_exercise_id for user_exercise_id in user_exercise_ids if user_exercise_id not in windows]
+        for user_exercise_id, window in windows.items():
+            edits = edited_entries.get(user_exercise_id, {})
+            entries = [[pk, edits.get(pk, pain_level)] for pk, pain_level in window.recent]
+            added = new_entries.get(user_exercise_id, [])
+            window.count += len(added)
+            set_entries(window, sorted(entries + added))
+        PainWindow.objects.bulk_update(windows.values(), ['recent', 'count', 'max_pain', 'mean_pain'])
+
+        if missing:
+            # First reports seen for these exercises: start from their whole history
+            seeded = history_windows(missing)
+            PainWindow.objects.bulk_create(seeded.values(), ignore_conflicts=True)
+            windows.update(seeded)
+    return windows
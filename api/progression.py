@@ -0,0 +1,108 @@
+from django.db import transaction
+from .ladder import get_ladder
+from .models import Exercise, UserExercise
+
+
+# Exercise progression service.
+# Moves a patient's UserExercise one step up or down its category's difficulty ladder,
+# addressed by the UserExercise primary key. The current row is read once with its
+# exercise, the variant comes from the in-process ladder, and the swap (activate the
+# variant, deactivate the current row) happens in one transaction with a fixed number
+# of queries.
+
+# Pain level (0-10) at or above which an exercise should be made easier
+HIGH_PAIN_LEVEL = 4
+
+# Returned by decrease_for_pain when a beginner exercise hurts: there is no easier
+# variant, so removing it is left for the patient to confirm
+CONSIDER_REMOVAL = 'consider_removal'
+
+def get_active_user_exercise(user, user_exercise_id, for_update=False):
+    """
+    Get one of the user's active exercises with its exercise and category, or None.
+    """
+    queryset = UserExercise.objects.select_related('exercise__category')
+    if for_update:
+        queryset = queryset.select_for_update(of=('self',))
+    return queryset.filter(pk=user_exercise_id, user=user, is_active=True).first()
+
+def activate_variant(user_exercise, exercise):
+    """
+    Make `exercise` an active exercise of the same user, starting fresh for the day.
+    Reuses the user's earlier row for that exercise if there is one, otherwise creates it
+    with the current exercise's sets and reps.
+    """
+    variant = UserExercise.objects.filter(user_id=user_exercise.user_id, exercise=exercise).first()
+    if variant is None:
+        return UserExercise.objects.create(
+            user_id=user_exercise.user_id,
+            exercise=exercise,
+            sets=user_exercise.sets,
+            reps=user_exercise.reps,
+            pain_level=0,
+            is_active=True,
+        )
+
+    variant.pain_level = 0
+    variant.completed = False
+    variant.is_active = True
+    variant.date_deactivated = None
+    variant.save()
+    return variant
+
+def swap_user_exercise(user_exercise, step):
+    """
+    Replace a UserExercise locked by get_active_user_exercise(for_update=True) with the
+    variant `step` levels harder (1) or easier (-1), in the transaction holding the lock.
+    Returns the newly active UserExercise, or None if there is no variant in that direction.
+    """
+    exercise = get_ladder().neighbour(user_exercise.exercise_id, step)
+    if exercise is None:
+        return None
+
+    variant = activate_variant(user_exercise, exercise)
+    user_exercise.is_active = False
+    user_exercise.save(update_fields=['is_active'])
+    return variant
+
+def swap_difficulty(user, user_exercise_id, step, min_pain_level=None):
+    """
+    Replace an active exercise with the variant `step` levels harder (1) or easier (-1).
+    Returns the newly active UserExercise, or None if the exercise is not one of the
+    user's active exercises, today's pain is below `min_pain_level` or there is no
+    variant in that direction.
+    """
+    with transaction.atomic():
+        user_exercise = get_active_user_exercise(user, user_exercise_id, for_update=True)
+        if user_exercise is None:
+            return None
+        if min_pain_level is not None and user_exercise.pain_level < min_pain_level:
+            return None
+        return swap_user_exercise(user_exercise, step)
+
+def increase_user_exercise(user, user_exercise_id):
+    """
+    Move an active exercise one difficulty level up.
+    """
+    return swap_difficulty(user, user_exercise_id, 1)
+
+def decrease_user_exercise(user, user_exercise_id):
+    """
+    Move an active exercise one difficulty level down, if today's pain level is high.
+    """
+    return swap_difficulty(user, user_exercise_id, -1, min_pain_level=HIGH_PAIN_LEVEL)
+
+def decrease_for_pain(user, user_exercise_id, pain_level):
+    """
+    Move an active exercise one difficulty level down if the reported `pain_level` is high.
+    Returns the newly active UserExercise, CONSIDER_REMOVAL for a beginner exercise, or None.
+    """
+    if pain_level < HIGH_PAIN_LEVEL:
+        return None
+    with transaction.atomic():
+        user_exercise = get_active_user_exercise(user, user_exercise_id, for_update=True)
+        if user_exercise is None:
+            return None
+        if user_exercise.exercise.difficulty_level == Exercise.BEGINNER:
+            return CONSIDER_REMOVAL
+        return swap_user_exercise(user_exercise, -1)
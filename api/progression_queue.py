@@ -0,0 +1,78 @@
+import traceback
+from django.db import transaction
+from django.utils import timezone
+from .models import ProgressionJob, ReportExercise, UserExercise
+from .pain_window import has_consistent_low_pain
+from .progression import decrease_for_pain, increase_user_exercise
+
+
+# Deferred progression checks for submitted reports.
+# A report update only records its exercises and queues a ProgressionJob per exercise once
+# its transaction commits; the process_progression_jobs worker claims pending jobs in
+# batches (skipping rows other workers hold) and runs the pain-based level checks for them.
+
+def enqueue_progression_jobs(jobs):
+    """
+    Queue unsaved ProgressionJobs once the current transaction commits (right away outside one).
+    """
+    if jobs:
+        transaction.on_commit(lambda: ProgressionJob.objects.bulk_create(jobs))
+
+def run_progression_job(job):
+    """
+    Run the progression checks for one reported exercise: move it down after high pain,
+    up after consistently low pain, and add the resulting exercise to the report.
+    """
+    user = job.report.user
+    # Run in the patient's time zone, as the request would have
+    with timezone.override(user.tzinfo):
+        updated_exercise = decrease_for_pain(user, job.user_exercise_id, job.pain_level)
+
+        if has_consistent_low_pain(job.user_exercise):
+            updated_exercise = increase_user_exercise(user, job.user_exercise_id) or updated_exercise
+
+        # CONSIDER_REMOVAL is left for the patient to confirm
+        if isinstance(updated_exercise, UserExercise):
+            ReportExercise.objects.get_or_create(report=job.report, user_exercise=updated_exercise)
+
+def process_progression_jobs(batch_size):
+    """
+    Claim up to `batch_size` pending jobs and run them, oldest first, in one transaction.
+    Each job runs in its own savepoint: finished jobs are deleted, failing ones are kept
+    as failed with their traceback.
+    Returns (processed, failed, lags) with the seconds each job waited in the queue.
+    """
+    processed = failed = 0
+    lags = []
+    with transaction.atomic():
+        jobs = list(
+            ProgressionJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status=ProgressionJob.PENDING)
+            .select_related('report__user', 'user_exercise__exercise')
+            .order_by('id')[:batch_size]
+        )
+        now = timezone.now()
+        done = []
+        for job in jobs:
+            lags.append((now - job.enqueued_at).total_seconds())
+            try:
+                with transaction.atomic():
+                    run_progression_job(job)
+            except Exception:
+                failed += 1
+                job.status = ProgressionJob.FAILED
+                job.error = traceback.format_exc()
+                job.save(update_fields=['status', 'error'])
+            else:
+                processed += 1
+                done.append(job.pk)
+        ProgressionJob.objects.filter(pk__in=done).delete()
+    return processed, failed, lags
+
+def queue_lag():
+    """
+    Get the number of pending jobs and the age in seconds of the oldest one (0 when empty).
+    """
+    pending = ProgressionJob.objects.filter(status=ProgressionJob.PENDING)
+    oldest = pending.order_by('id').values_list('enqueued_at', flat=True).first()
+    return pending.count(), (timezone.now() - oldest).total_seconds() if oldest else 0
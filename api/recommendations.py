@@ -0,0 +1,129 @@
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from .models import Exercise, PainWindow, PendingRecommendation, UserExercise
+from .progression import HIGH_PAIN_LEVEL
+
+
+# Progression rules, evaluated in bulk.
+# The rules look at each exercise's latest report pain levels (from its pain window) and
+# its difficulty level. They run as array operations over many exercises at once: the
+# evaluate_progressions command re-runs them for every active exercise by user id range,
+# and each report write re-runs them for its one exercise, so the PendingRecommendation
+# table is always what the rules say now.
+
+# Number of latest reports that must all be below HIGH_PAIN_LEVEL before suggesting a harder variant
+LOW_PAIN_REPORTS = 3
+
+# Marks the missing reports of an exercise with fewer than LOW_PAIN_REPORTS
+NO_REPORT = -1
+
+def pain_matrix(recents, num_reports=LOW_PAIN_REPORTS):
+    """
+    Stack the latest `num_reports` pain levels of each pain window's entries into an
+    (exercises x num_reports) array, latest report in the last column and NO_REPORT
+    where an exercise has fewer reports.
+    """
+    pain = np.full((len(recents), num_reports), NO_REPORT, dtype=np.int16)
+    for row, recent in enumerate(recents):
+        levels = [pain_level for _, pain_level in recent[-num_reports:]]
+        if levels:
+            pain[row, num_reports - len(levels):] = levels
+    return pain
+
+def evaluate(pain, difficulty_levels):
+    """
+    Apply the progression rules to a pain matrix and the matching exercise difficulty levels.
+    Returns an array with a PendingRecommendation action per exercise, '' if nothing should change:
+    - latest pain at or above HIGH_PAIN_LEVEL: consider removing a beginner exercise, otherwise decrease
+    - all of the latest LOW_PAIN_REPORTS below HIGH_PAIN_LEVEL: increase, unless already advanced
+    """
+    actions = np.full(len(pain), '', dtype=object)
+    if not len(pain):
+        return actions
+
+    difficulty_levels = np.asarray(difficulty_levels)
+    beginner = difficulty_levels == Exercise.BEGINNER
+    high = pain[:, -1] >= HIGH_PAIN_LEVEL
+    consistent_low = ((pain != NO_REPORT) & (pain < HIGH_PAIN_LEVEL)).all(axis=1)
+
+    actions[high & beginner] = PendingRecommendation.REMOVE
+    actions[high & ~beginner] = PendingRecommendation.DECREASE
+    actions[consistent_low & (difficulty_levels != Exercise.ADVANCED)] = PendingRecommendation.INCREASE
+    return actions
+
+def evaluate_user_range(first_id, last_id, now=None):
+    """
+    Recompute the pending recommendations for the active exercises of users with ids
+    from `first_id` to `last_id`, replacing the range's previous ones in one transaction.
+    Returns the number of exercises evaluated and recommendations written.
+    """
+    now = now or timezone.now()
+    in_range = {'user_exercise__user__gte': first_id, 'user_exercise__user__lte': last_id}
+    rows = list(
+        PainWindow.objects.filter(user_exercise__is_active=True, **in_range)
+        .values_list('user_exercise_id', 'recent', 'user_exercise__exercise__difficulty_level')
+    )
+    user_exercise_ids = [row[0] for row in rows]
+    actions = evaluate(pain_matrix([row[1] for row in rows]), [row[2] for row in rows])
+
+    recommendations = [
+        PendingRecommendation(user_exercise_id=user_exercise_id, action=action, computed_at=now)
+        for user_exercise_id, action in zip(user_exercise_ids, actions) if action
+    ]
+    with transaction.atomic():
+        PendingRecommendation.objects.filter(**in_range).delete()
+        PendingRecommendation.objects.bulk_create(recommendations)
+    return len(rows), len(recommendations)
+
+def refresh_recommendation(window, create=True):
+    """
+    Re-apply the rules to one exercise after its pain window changed.
+    With create=False an existing recommendation is only updated or removed (for deletes,
+    where the exercise itself may be on its way out).
+    """
+    difficulty_level = (
+        UserExercise.objects.filter(pk=window.user_exercise_id)
+        .values_list('exercise__difficulty_level', flat=True).first()
+    )
+    action = evaluate(pain_matrix([window.recent]), [difficulty_level])[0]
+
+    recommendations = PendingRecommendation.objects.filter(user_exercise_id=window.user_exercise_id)
+    if not action:
+        recommendations.delete()
+    elif not recommendations.update(action=action, computed_at=timezone.now()) and create:
+        PendingRecommendation.objects.create(user_exercise_id=window.user_exercise_id, action=action)
+    return action
+
+def refresh_recommendations(windows, difficulty_levels):
+    """
+    Re-apply the rules to several exercises after their pain windows changed, with a fixed
+    number of queries. For bulk writes, which send no signals. `windows` and
+    `difficulty_levels` are keyed by user exercise id.
+    """
+    user_exercise_ids = list(windows)
+    actions = evaluate(
+        pain_matrix([windows[user_exercise_id].recent for user_exercise_id in user_exercise_ids]),
+        [difficulty_levels[user_exercise_id] for user_exercise_id in user_exercise_ids]
+    )
+
+    now = timezone.now()
+    PendingRecommendation.objects.filter(
+        user_exercise_id__in=[user_exercise_id for user_exercise_id, action in zip(user_exercise_ids, actions) if not action]
+    ).delete()
+    PendingRecommendation.objects.bulk_create(
+        [
+            PendingRecommendation(user_exercise_id=user_exercise_id, action=action, computed_at=now)
+            for user_exercise_id, action in zip(user_exercise_ids, actions) if action
+        ],
+        update_conflicts=True,
+        unique_fields=['user_exercise'],
+        update_fields=['action', 'computed_at'],
+    )
+    return dict(zip(user_exercise_ids, actions))
+
+def pending_action(user_exercise):
+    """
+    Get the pending recommendation action for an exercise, or None.
+    """
+    return PendingRecommendation.objects.filter(user_exercise=user_exercise).values_list('action', flat=True).first()
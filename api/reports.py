@@ -0,0 +1,157 @@
+import ast
+import json
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .context import invalidate_patient_context
+from .daily_stats import refresh_daily_stats_on_commit
+from .models import Report, ReportExercise, UserExercise
+from .pain_window import record_pains
+from .recommendations import refresh_recommendations
+
+
+# Report ingestion.
+# A submitted report lists the UserExercise ids the patient completed. They are checked
+# against the patient's exercises in one query, the latest earlier report of each comes
+# from one windowed query and the report's rows are inserted with one bulk_create, so a
+# report costs the same number of queries however many exercises it lists. Updating a
+# report works the same way, rewriting the rows it already has with one bulk_update.
+
+def parse_exercise_ids(exercises_data):
+    """
+    Read the submitted exercises_completed as a list of integer ids.
+    Accepts a list of ids or {'id': ...} objects, or a JSON, Python literal or
+    comma-separated string of them; items that are not ids are skipped.
+    """
+    # Handle both string and list formats
+    if isinstance(exercises_data, str):
+        try:
+            # Try to parse as JSON if it's a string
+            exercises_ids = json.loads(exercises_data)
+        except json.JSONDecodeError:
+            # If not valid JSON, try to evaluate it as a Python literal (list)
+            try:
+                exercises_ids = ast.literal_eval(exercises_data)
+            except (ValueError, SyntaxError):
+                # If that fails too, try to split it if it's a comma-separated string
+                exercises_ids = [id.strip() for id in exercises_data.split(',')]
+    else:
+        exercises_ids = exercises_data
+
+    # Ensure we have a list of integers
+    if not isinstance(exercises_ids, list):
+        # Handle single integer case
+        try:
+            return [int(exercises_ids)]
+        except (ValueError, TypeError):
+            print(f"Could not process exercises_ids: {exercises_ids}")
+            return []
+
+    processed_ids = []
+    for id_item in exercises_ids:
+        if isinstance(id_item, dict) and 'id' in id_item:
+            id_item = id_item['id']
+        if isinstance(id_item, (int, str)):
+            try:
+                processed_ids.append(int(id_item))  # Convert to integer
+            except ValueError:
+                print(f"Could not convert {id_item} to integer")
+    return processed_ids
+
+def latest_report_exercises(user_exercise_ids):
+    """
+    Get the latest ReportExercise of each exercise in one windowed query.
+    Returns {user exercise id: ReportExercise}; exercises never reported are left out.
+    """
+    rows = (
+        ReportExercise.objects.filter(user_exercise_id__in=user_exercise_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=[F('user_exercise_id')], order_by=F('id').desc()))
+        .filter(rank=1)
+    )
+    return {report_exercise.user_exercise_id: report_exercise for report_exercise in rows}
+
+def add_report_exercises(report, user, exercise_ids):
+    """
+    Record the user's exercises `exercise_ids` on a new report, skipping ids that are not
+    the user's, and fold them into the pain windows and pending recommendations.
+    Returns the average pain level of the exercises, each taken from its latest earlier
+    report (or its current pain level if it was never reported), or None if none were added.
+    """
+    user_exercises = list(UserExercise.objects.filter(user=user, id__in=exercise_ids).select_related('exercise'))
+    if not user_exercises:
+        return None
+    latest = latest_report_exercises([user_exercise.pk for user_exercise in user_exercises])
+
+    with transaction.atomic():
+        report_exercises = ReportExercise.objects.bulk_create([
+            ReportExercise(
+                report=report,
+                user_exercise=user_exercise,
+                pain_level=user_exercise.pain_level,
+                completed_sets=user_exercise.sets,
+                completed_reps=user_exercise.reps
+            )
+            for user_exercise in user_exercises
+        ])
+        # bulk_create skips save() and sends no post_save, so update what they would have
+        Report.count_pain(report.pk, sum(row.pain_level for row in report_exercises), len(report_exercises))
+        refresh_daily_stats_on_commit(user.pk, report.date, report.date)
+        windows = record_pains(report_exercises)
+        refresh_recommendations(windows, {
+            user_exercise.pk: user_exercise.exercise.difficulty_level for user_exercise in user_exercises
+        })
+    invalidate_patient_context(user.pk)
+
+    pain_levels = [
+        latest[user_exercise.pk].pain_level if user_exercise.pk in latest else user_exercise.pain_level
+        for user_exercise in user_exercises
+    ]
+    return sum(pain_levels) / len(pain_levels)
+
+def update_report_exercises(report, user, exercise_ids):
+    """
+    Record the user's exercises `exercise_ids` on an existing report with their current pain
+    level, sets and reps, rewriting the rows the report already has for them and skipping ids
+    that are not the user's, with a fixed number of queries.
+    Returns the UserExercises written.
+    """
+    user_exercises = UserExercise.objects.filter(user=user).select_related('exercise').in_bulk(exercise_ids)
+    if not user_exercises:
+        return []
+    existing = {
+        report_exercise.user_exercise_id: report_exercise
+        for report_exercise in ReportExercise.objects.filter(report=report, user_exercise_id__in=user_exercises)
+    }
+
+    created = []
+    edited = []
+    pain_delta = count_delta = 0
+    completed_at = timezone.now()
+    for user_exercise_id, user_exercise in user_exercises.items():
+        report_exercise = existing.get(user_exercise_id)
+        if report_exercise is None:
+            report_exercise = ReportExercise(report=report, user_exercise=user_exercise)
+            pain_delta += user_exercise.pain_level
+            count_delta += 1
+            created.append(report_exercise)
+        else:
+            pain_delta += user_exercise.pain_level - report_exercise.pain_level
+            edited.append(report_exercise)
+        report_exercise.pain_level = user_exercise.pain_level
+        report_exercise.completed_sets = user_exercise.sets
+        report_exercise.completed_reps = user_exercise.reps
+        report_exercise.completed_at = completed_at
+
+    with transaction.atomic():
+        ReportExercise.objects.bulk_create(created)
+        ReportExercise.objects.bulk_update(edited, ['pain_level', 'completed_sets', 'completed_reps', 'completed_at'])
+        # Bulk writes skip save() and send no signals, so update what they would have
+        Report.count_pain(report.pk, pain_delta, count_delta)
+        refresh_daily_stats_on_commit(user.pk, report.date, report.date)
+        windows = record_pains(created, edited)
+        refresh_recommendations(windows, {
+            user_exercise_id: user_exercises[user_exercise_id].exercise.difficulty_level for user_exercise_id in windows
+        })
+    invalidate_patient_context(user.pk)
+    return list(user_exercises.values())
@@ -1,5 +1,8 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import ReportExercise, User, Exercise, ExerciseCategory, UserExercise, Report, InjuryType
+from .sync import MAX_CLOCK_SKEW, MAX_SYNC_EVENTS
 
 class ExerciseCategorySerializer(serializers.ModelSerializer):
     """
@@ -36,7 +39,8 @@ class UserExerciseSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = UserExercise
-        fields = ['id', 'user', 'exercise', 'sets', 'reps', 'hold', 'pain_level', 'completed', 'is_active', 'date_activated', 'date_deactivated']
+        fields = ['id', 'user', 'exercise', 'sets', 'reps', 'hold', 'pain_level', 'completed', 'is_active', 'date_activated', 'date_deactivated', 'last_completed_on']
+        read_only_fields = ['last_completed_on']
     
     def get_fields(self):
         fields = super().get_fields()
@@ -68,7 +72,7 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'first_name', 'last_name', 
-                 'date_of_birth', 'injury_type', 'last_reset', 'exercises')
+                 'date_of_birth', 'injury_type', 'last_reset', 'timezone', 'exercises')
     
     def create(self, validated_data):
         # Extract password to hash it properly
@@ -89,12 +93,11 @@ class UserSerializer(serializers.ModelSerializer):
         # Only handle exercises if they're in the validated data
         if 'exercises' in validated_data:
             exercises = validated_data.pop('exercises')
-            user = super().update(instance, validated_data)
-            
-            # Clear existing UserExercise instances and create new ones
-            UserExercise.objects.filter(user=user).delete()
-            for exercise in exercises:
-                UserExercise.objects.create(user=user, exercise=exercise)
+            with transaction.atomic():
+                user = super().update(instance, validated_data)
+                
+                # Sync the UserExercise instances with the new list, keeping their history
+                user.set_exercises(exercises)
         else:
             # Just update the user without touching exercises
             user = super().update(instance, validated_data)
@@ -112,6 +115,32 @@ class ReportExerciseSerializer(serializers.ModelSerializer):
         model = ReportExercise
         fields = '__all__'
 
+class BulkPrimaryKeysField(serializers.ManyRelatedField):
+    """
+    List of primary keys that looks all of them up in one query, instead of one query
+    per key as PrimaryKeyRelatedField(many=True) does.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool) or not isinstance(pk, (int, str)):
+                self.child_relation.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                pks.append(int(pk))
+            except ValueError:
+                self.child_relation.fail('incorrect_type', data_type=type(pk).__name__)
+
+        found = self.child_relation.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in found:
+                self.child_relation.fail('does_not_exist', pk_value=pk)
+        return [found[pk] for pk in pks]
+
 class ReportSerializer(serializers.ModelSerializer):
     date = serializers.DateField(format="%Y-%m-%d")
     
@@ -119,13 +148,16 @@ class ReportSerializer(serializers.ModelSerializer):
     Serializer for Report model.
     This serializer handles the serialization and deserialization of Report instances.
     """
-    exercises_completed = serializers.PrimaryKeyRelatedField(
-        queryset=UserExercise.objects.all(), many=True, required=False
+    exercises_completed = BulkPrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=UserExercise.objects.all()), required=False
     )
     
+    average_pain = serializers.FloatField(read_only=True)
+
     class Meta:
         model = Report
         fields = '__all__'
+        read_only_fields = ['pain_sum', 'pain_count']
     
     def get_fields(self):
         fields = super().get_fields()
@@ -137,4 +169,27 @@ class ReportSerializer(serializers.ModelSerializer):
             # Make 'user' and 'exercise' read-only during updates
             fields['user'].read_only = True
             fields['exercises_completed'].read_only = False
-        return fields
\ No newline at end of file
+        return fields
+
+class CompletionEventSerializer(serializers.Serializer):
+    """
+    Serializer for one offline exercise completion sent to the sync endpoint.
+    """
+    idempotency_key = serializers.CharField(max_length=64)
+    user_exercise = serializers.IntegerField()
+    completed_at = serializers.DateTimeField()
+    pain_level = serializers.IntegerField(min_value=0, max_value=10)
+    sets = serializers.IntegerField(min_value=0, required=False)
+    reps = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_completed_at(self, value):
+        # A completion can't be in the future; allow for some client clock drift
+        if value > timezone.now() + MAX_CLOCK_SKEW:
+            raise serializers.ValidationError("Completion time is in the future.")
+        return value
+
+class CompletionSyncSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of offline exercise completions.
+    """
+    events = CompletionEventSerializer(many=True, allow_empty=False, max_length=MAX_SYNC_EVENTS)
@@ -1,8 +1,86 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import User
-from .views import reset_user_exercises  # Assuming the function is in utils.py
+from .context import invalidate_patient_context
+from .daily_stats import refresh_daily_stats_on_commit
+from .ladder import invalidate_ladder
+from .models import User, UserExercise, Report, ReportExercise, Exercise, ExerciseCategory
+from .pain_window import record_pain, rebuild_pain_window
+from .recommendations import refresh_recommendation
+from .management.commands.reset_exercises import reset_user_exercises
 
 @receiver(user_logged_in)
 def reset_user_exercises_on_login(sender, request, user, **kwargs):
-    reset_user_exercises(user)
\ No newline at end of file
+    reset_user_exercises(user)
+
+# Keep the cached chatbot patient context in step with the rows it is built from.
+@receiver([post_save, post_delete], sender=UserExercise)
+@receiver([post_save, post_delete], sender=Report)
+def invalidate_context_for_user_rows(sender, instance, **kwargs):
+    invalidate_patient_context(instance.user_id)
+
+@receiver([post_save, post_delete], sender=ReportExercise)
+def invalidate_context_for_report_exercise(sender, instance, **kwargs):
+    invalidate_patient_context(instance.report.user_id)
+
+@receiver(post_save, sender=User)
+def invalidate_context_for_injury_type(sender, instance, update_fields=None, **kwargs):
+    # Only the injury type of the user is part of the context
+    if update_fields is None or 'injury_type' in update_fields:
+        invalidate_patient_context(instance.pk)
+
+# Keep each exercise's rolling pain window and pending recommendation in step with its reports.
+@receiver(post_save, sender=ReportExercise)
+def record_report_pain(sender, instance, created, **kwargs):
+    with transaction.atomic():
+        refresh_recommendation(record_pain(instance, created))
+
+@receiver(post_delete, sender=ReportExercise)
+def forget_report_pain(sender, instance, **kwargs):
+    with transaction.atomic():
+        refresh_recommendation(rebuild_pain_window(instance.user_exercise_id), create=False)
+
+# Saves count themselves in (see ReportExercise.save), but queryset deletes skip Model.delete().
+@receiver(post_delete, sender=ReportExercise)
+def uncount_report_pain(sender, instance, **kwargs):
+    Report.count_pain(instance.report_id, -instance.pain_level, -1)
+
+# Keep the users' daily adherence and pain stats in step with their reports and exercises,
+# once the write commits. Exercise saves and bulk writes refresh them themselves (see
+# UserExercise and its queryset).
+@receiver(post_save, sender=ReportExercise)
+def refresh_report_exercise_day(sender, instance, created, **kwargs):
+    changed = [field for field in ('report_id', 'user_exercise_id', 'pain_level') if created or instance.has_changed(field)]
+    if not changed:
+        return
+    report = instance.report
+    refresh_daily_stats_on_commit(report.user_id, report.date, report.date)
+    if 'report_id' in changed and not created:
+        # Moved from another report, whose day loses the exercise
+        previous = Report.objects.filter(pk=instance.loaded_value('report_id')).exclude(pk=report.pk)
+        for user_id, day in previous.values_list('user_id', 'date'):
+            refresh_daily_stats_on_commit(user_id, day, day)
+
+@receiver(post_delete, sender=ReportExercise)
+def refresh_deleted_report_exercise_day(sender, instance, **kwargs):
+    report = instance.report
+    refresh_daily_stats_on_commit(report.user_id, report.date, report.date, create=False)
+
+@receiver(post_save, sender=Report)
+def refresh_moved_report_days(sender, instance, created, **kwargs):
+    if created or not instance.has_changed('date'):
+        return
+    previous = instance.loaded_value('date')
+    for day in {previous, instance.date}:
+        refresh_daily_stats_on_commit(instance.user_id, day, day)
+
+@receiver(post_delete, sender=UserExercise)
+def refresh_deleted_user_exercise_days(sender, instance, **kwargs):
+    refresh_daily_stats_on_commit(instance.user_id, instance.date_activated, create=False)
+
+# Rebuild the exercise difficulty ladder in every process when the catalog changes.
+@receiver([post_save, post_delete], sender=Exercise)
+@receiver([post_save, post_delete], sender=ExerciseCategory)
+def invalidate_exercise_ladder(sender, **kwargs):
+    invalidate_ladder()
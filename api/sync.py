@@ -0,0 +1,155 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .context import invalidate_patient_context
+from .daily_stats import refresh_daily_stats_on_commit
+from .models import User, UserExercise, Report, ReportExercise, SyncEvent
+from .pain_window import record_pains
+from .recommendations import refresh_recommendations
+
+
+# Offline sync of exercise completions.
+# The app queues completions while offline and sends them as one batch of events, each
+# with the client time it happened and a client-chosen idempotency key. Keys already in
+# the SyncEvent index are skipped, so resending a batch (e.g. after a token refresh) does
+# no work twice. The rest of the batch is applied in one transaction with set-based
+# writes: each completion lands on the report of its local day, like a completion PUT.
+
+APPLIED = 'applied'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+# Largest batch accepted in one request (about a month of a full routine)
+MAX_SYNC_EVENTS = 500
+
+# How far ahead of the server's clock a completion time may be (client clock drift)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def apply_completion_events(user, events):
+    """
+    Apply a batch of validated completion events for a user.
+    Returns (results, recommendations): a status per event in the order sent, and the
+    pending recommendation action of each exercise the batch changed.
+    """
+    results = []
+    recommendations = {}
+    with transaction.atomic():
+        # Serialise the user's syncs, so a resent batch racing its original counts as a duplicate
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
+        seen = set(
+            SyncEvent.objects.filter(user=user, idempotency_key__in=[event['idempotency_key'] for event in events])
+            .values_list('idempotency_key', flat=True)
+        )
+        user_exercises = (
+            UserExercise.objects.filter(user=user).select_related('exercise')
+            .in_bulk({event['user_exercise'] for event in events})
+        )
+
+        accepted = []
+        for event in events:
+            key = event['idempotency_key']
+            if key in seen:
+                results.append({'idempotency_key': key, 'status': DUPLICATE})
+            elif event['user_exercise'] not in user_exercises:
+                results.append({'idempotency_key': key, 'status': REJECTED, 'error': "Exercise not found."})
+            else:
+                seen.add(key)
+                accepted.append(event)
+                results.append({'idempotency_key': key, 'status': APPLIED})
+
+        if accepted:
+            recommendations = apply_completions(user, user_exercises, accepted)
+            SyncEvent.objects.bulk_create([
+                SyncEvent(
+                    user=user,
+                    idempotency_key=event['idempotency_key'],
+                    user_exercise_id=event['user_exercise'],
+                    completed_at=event['completed_at']
+                )
+                for event in accepted
+            ])
+            transaction.on_commit(lambda: invalidate_patient_context(user.pk))
+    return results, recommendations
+
+def apply_completions(user, user_exercises, events):
+    """
+    Write completion events to the reports of their local days with a fixed number of queries.
+    The latest completion of an exercise on a day wins, as repeated PUTs would, including
+    over the row already on the report: an event older than that row's completion time is
+    recorded but not written. Completions from today also mark the exercise itself
+    completed with that pain level.
+    Returns {user exercise id: pending recommendation action} for the exercises written.
+    """
+    tzinfo = user.tzinfo
+    today = timezone.localdate(timezone=tzinfo)
+    latest = {}
+    for event in sorted(events, key=lambda event: event['completed_at']):
+        latest[(timezone.localdate(event['completed_at'], tzinfo), event['user_exercise'])] = event
+
+    # Reports for every day in the batch
+    days = {day for day, _ in latest}
+    reports = {report.date: report for report in Report.objects.filter(user=user, date__in=days)}
+    missing = [Report(user=user, date=day) for day in days if day not in reports]
+    if missing:
+        # A completion PUT may create one of these reports at the same time (the user lock
+        # only serialises syncs), so skip conflicts and read back the reports as stored
+        Report.objects.bulk_create(missing, ignore_conflicts=True)
+        reports = {report.date: report for report in Report.objects.filter(user=user, date__in=days)}
+    existing = {
+        (report_exercise.report_id, report_exercise.user_exercise_id): report_exercise
+        for report_exercise in ReportExercise.objects.filter(
+            report__in=reports.values(),
+            user_exercise_id__in={user_exercise_id for _, user_exercise_id in latest}
+        )
+    }
+
+    created = []
+    edited = []
+    deltas = {}
+    completed_today = []
+    for (day, user_exercise_id), event in latest.items():
+        report = reports[day]
+        user_exercise = user_exercises[user_exercise_id]
+        pain_level = event['pain_level']
+        report_exercise = existing.get((report.pk, user_exercise_id))
+        if report_exercise is not None and report_exercise.completed_at and report_exercise.completed_at > event['completed_at']:
+            # Completed again (e.g. online) after this event, so the newer row stands
+            continue
+        if report_exercise is None:
+            report_exercise = ReportExercise(report=report, user_exercise=user_exercise)
+            pain_delta, count_delta = pain_level, 1
+            created.append(report_exercise)
+        else:
+            pain_delta, count_delta = pain_level - report_exercise.pain_level, 0
+            edited.append(report_exercise)
+        report_exercise.pain_level = pain_level
+        report_exercise.completed_sets = event.get('sets', user_exercise.sets)
+        report_exercise.completed_reps = event.get('reps', user_exercise.reps)
+        report_exercise.completed_at = event['completed_at']
+
+        report_delta = deltas.setdefault(report.pk, [0, 0])
+        report_delta[0] += pain_delta
+        report_delta[1] += count_delta
+
+        if day == today:
+            user_exercise.completed = True
+            user_exercise.pain_level = pain_level
+            user_exercise.last_completed_on = today
+            completed_today.append(user_exercise)
+
+    # Bulk writes skip save() and send no signals, so keep the counters, daily stats, pain
+    # windows and recommendations in step here
+    ReportExercise.objects.bulk_create(created)
+    ReportExercise.objects.bulk_update(edited, ['pain_level', 'completed_sets', 'completed_reps', 'completed_at'])
+    Report.count_pains(deltas)
+    Report.objects.filter(pk__in=deltas, pain_count__gt=0).update(pain_level=F('pain_sum') / F('pain_count'))
+    UserExercise.objects.bulk_update(completed_today, ['completed', 'pain_level', 'last_completed_on'])
+    refresh_daily_stats_on_commit(user.pk, min(days), max(days))
+
+    windows = record_pains(created, edited)
+    actions = refresh_recommendations(windows, {
+        user_exercise_id: user_exercises[user_exercise_id].exercise.difficulty_level for user_exercise_id in windows
+    })
+    return {user_exercise_id: action for user_exercise_id, action in actions.items() if action}
@@ -1,14 +1,15 @@
-from datetime import timedelta
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
 from rest_framework import status
 from django.db import IntegrityError
 
 from .models import (
     User, InjuryType, Exercise, ExerciseCategory, UserExercise, 
-    Report, ReportExercise
+    Report, ReportExercise, ChatMessage, ResetRun, PainWindow, PendingRecommendation,
+    ProgressionJob, SyncEvent, DailyUserStats
 )
 
 class ModelTests(TestCase):
@@ -106,7 +107,97 @@ class ModelTests(TestCase):
         self.assertEqual(user_exercise.pain_level, 2)
         self.assertEqual(user_exercise.user, self.user)
         self.assertEqual(user_exercise.exercise, self.intermediate_exercise)
-    
+
+    def test_user_save_syncs_exercises_only_on_injury_change(self):
+        """Test that saving a user only assigns treatment exercises when the injury type changes"""
+        user = User.objects.get(pk=self.user.pk)
+
+        # Unrelated saves are a single UPDATE
+        user.last_reset = timezone.now()
+        with self.assertNumQueries(1):
+            user.save()
+
+        # Changing the injury type assigns its treatment exercises in one insert
+        other_injury = InjuryType.objects.create(name="ACL Tear")
+        other_injury.treatment.add(self.beginner_exercise, self.advanced_exercise)
+        user.injury_type = other_injury
+        with self.assertNumQueries(3):
+            user.save()
+        self.assertEqual(
+            set(UserExercise.objects.filter(user=user).values_list('exercise', flat=True)),
+            {self.beginner_exercise.id, self.advanced_exercise.id}
+        )
+
+    def test_user_exercise_deactivation_date(self):
+        """Test that deactivating exercises sets date_deactivated in save and bulk paths"""
+        today = timezone.now().date()
+        user_exercise = UserExercise.objects.get(user=self.user, exercise=self.beginner_exercise)
+
+        # Deactivating a loaded row does not re-read it
+        user_exercise.is_active = False
+        with self.assertNumQueries(1):
+            user_exercise.save()
+        self.assertEqual(user_exercise.date_deactivated, today)
+
+        # Saving an already inactive row leaves its date alone
+        UserExercise.objects.filter(pk=user_exercise.pk).update(date_deactivated=None)
+        user_exercise = UserExercise.objects.get(pk=user_exercise.pk)
+        user_exercise.save()
+        self.assertIsNone(user_exercise.date_deactivated)
+
+        # Queryset updates only date the rows that were active
+        active = UserExercise.objects.create(user=self.user, exercise=self.intermediate_exercise)
+        UserExercise.objects.filter(user=self.user).update(is_active=False)
+        self.assertEqual(
+            dict(UserExercise.objects.filter(user=self.user).values_list('id', 'date_deactivated')),
+            {user_exercise.id: None, active.id: today}
+        )
+
+        # bulk_update applies the same rule
+        active = UserExercise.objects.create(user=self.user, exercise=self.advanced_exercise)
+        rows = list(UserExercise.objects.filter(user=self.user))
+        for row in rows:
+            row.is_active = False
+        UserExercise.objects.bulk_update(rows, ['is_active'])
+        active.refresh_from_db()
+        self.assertEqual(active.date_deactivated, today)
+        self.assertEqual(UserExercise.objects.get(pk=user_exercise.pk).date_deactivated, None)
+
+    def test_user_serializer_syncs_exercises_by_diff(self):
+        """Test that updating a user's exercises deactivates removed ones and keeps their history"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .serializers import UserSerializer
+
+        beginner = UserExercise.objects.get(user=self.user, exercise=self.beginner_exercise)
+        report = Report.objects.create(user=self.user)
+        ReportExercise.objects.create(report=report, user_exercise=beginner, pain_level=2)
+
+        serializer = UserSerializer()
+        serializer.update(self.user, {'exercises': [self.intermediate_exercise, self.advanced_exercise]})
+
+        beginner.refresh_from_db()
+        self.assertFalse(beginner.is_active)
+        self.assertTrue(ReportExercise.objects.filter(user_exercise=beginner).exists())
+        self.assertEqual(
+            set(UserExercise.objects.filter(user=self.user, is_active=True).values_list('exercise', flat=True)),
+            {self.intermediate_exercise.id, self.advanced_exercise.id}
+        )
+
+        # Adding the beginner exercise back reactivates the same row
+        serializer.update(self.user, {'exercises': [self.beginner_exercise]})
+        beginner.refresh_from_db()
+        self.assertTrue(beginner.is_active)
+        self.assertIsNone(beginner.date_deactivated)
+
+        # Round trips do not grow with the number of exercises
+        extra = [Exercise.objects.create(category=self.category, name=f"Extra {i}") for i in range(20)]
+        with CaptureQueriesContext(connection) as small:
+            serializer.update(self.user, {'exercises': extra[:2]})
+        with CaptureQueriesContext(connection) as large:
+            serializer.update(self.user, {'exercises': extra[2:]})
+        self.assertEqual(len(small), len(large))
+
     def test_report_creation(self):
         """Test Report and ReportExercise creation"""
         # Get the user exercise
@@ -685,7 +776,7 @@ class APITests(APITestCase):
         self.assertFalse(inactive_exercise.is_active)
     
     def test_reset_user_exercise(self):
-        """Test resetting a user exercise"""
+        """Test that exercises completed on an earlier day read as reset without any writes"""
         # Delete any existing beginner exercise for this user
         UserExercise.objects.filter(user=self.user, exercise=self.beginner_exercise).delete()
         
@@ -700,30 +791,42 @@ class APITests(APITestCase):
             is_active=True
         )
         
-        # Set the user's last_reset to yesterday to trigger a reset
-        yesterday = timezone.now() - timezone.timedelta(days=1)
-        self.user.last_reset = yesterday
-        self.user.save()
+        # Flags recorded today are returned as they are
+        url = reverse('userexercise-detail', args=[user_exercise.id])
+        response = self.client.get(url)
+        self.assertTrue(response.data['completed'])
+        self.assertEqual(response.data['pain_level'], 2)
+        
+        # Move the flags to yesterday
+        yesterday = timezone.localdate() - timezone.timedelta(days=1)
+        UserExercise.objects.filter(pk=user_exercise.pk).update(last_completed_on=yesterday)
         
         # Get the URL for the user exercise list endpoint
         url = reverse('userexercise-list')  # Assuming you're using DRF's default router naming
         
-        # Make the request to the list endpoint, which will trigger get_queryset() and the reset
-        response = self.client.get(url)
+        # Reading the list must not write anything
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
         
         # Check response status
         self.assertEqual(response.status_code, 200)
         
-        # Refresh the user exercise from the database
-        user_exercise.refresh_from_db()
+        # Verify the user exercise reads as reset
+        data = next(item for item in response.data if item['id'] == user_exercise.id)
+        self.assertFalse(data['completed'])
+        self.assertEqual(data['pain_level'], 0)
         
-        # Verify the user exercise was reset
-        self.assertFalse(user_exercise.completed)
-        self.assertEqual(user_exercise.pain_level, 0)
+        # The stored row is left untouched
+        self.assertEqual(
+            UserExercise.objects.filter(pk=user_exercise.pk).values_list('completed', 'pain_level').get(),
+            (True, 2)
+        )
         
-        # Verify the user's last_reset was updated to today
-        self.user.refresh_from_db()
-        self.assertEqual(self.user.last_reset.date(), timezone.now().date())
+        # Completing it again records today's flags
+        response = self.client.patch(reverse('userexercise-detail', args=[user_exercise.id]), {'completed': True}, format='json')
+        user_exercise.refresh_from_db()
+        self.assertTrue(user_exercise.completed)
+        self.assertEqual(user_exercise.last_completed_on, timezone.localdate())
         
             
     
@@ -984,8 +1087,8 @@ class ChatbotTests(APITestCase):
                     })
                 ]
         
-        # Mock the OpenAI chat.completions.create method
-        with mock.patch('openai.chat.completions.create', return_value=MockResponse()):
+        # Mock the OpenAI chat.completions.create method used by the shared client
+        with mock.patch('openai.resources.chat.completions.Completions.create', return_value=MockResponse()):
             url = reverse('chatbot_api')
             data = {
                 'message': 'How am I doing with my exercises?',
@@ -999,6 +1102,155 @@ class ChatbotTests(APITestCase):
             self.assertIn('message', response.data)
             self.assertTrue(isinstance(response.data['message'], str))
     
+    @override_settings(LLM_CLIENT={'BREAKER_FAILURE_THRESHOLD': 2, 'BREAKER_RESET_TIMEOUT': 60})
+    def test_chatbot_fails_fast_when_upstream_degraded(self):
+        """Test that the circuit breaker opens after upstream failures and rejects without calling it"""
+        import unittest.mock as mock
+        from .llm import get_llm_client, LLMUnavailable
+
+        url = reverse('chatbot_api')
+        data = {'message': 'Hello', 'exerciseContext': '{}'}
+        with mock.patch('openai.resources.chat.completions.Completions.create', side_effect=TimeoutError) as create:
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, data, format='json').status_code, 500)
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['message'], LLMUnavailable.friendly_message)
+
+        metrics = get_llm_client().metrics()
+        self.assertEqual(metrics['breaker_state'], 'open')
+        self.assertEqual(metrics['rejected_circuit_open'], 1)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'api.llm.FakeLLMBackend', 'OPTIONS': {'reply_tokens': 5}})
+    def test_chatbot_with_fake_backend(self):
+        """Test the chatbot endpoint end-to-end against the local fake backend"""
+        url = reverse('chatbot_api')
+        response = self.client.post(url, {'message': 'Is this pain normal?', 'exerciseContext': '{}'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['message'].startswith("Stand-in reply"))
+        self.assertEqual(len(response.data['message'].split()), 5)
+        self.assertEqual(ChatMessage.objects.filter(user=self.user).count(), 2)
+
+    def test_profile_chatbot_command(self):
+        """Test the chatbot profiling command runs offline and cleans up its history"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('profile_chatbot', username=self.user.username, requests=3, latency='constant', latency_ms=0, stdout=out)
+
+        self.assertIn("Requests: 3", out.getvalue())
+        self.assertIn("Status codes: {200: 3}", out.getvalue())
+        self.assertFalse(ChatMessage.objects.filter(user=self.user).exists())
+
+    @override_settings(CHATBOT_RESPONSE_CACHE={'ENABLED': True, 'TTL': 60, 'MAX_ENTRIES': 10})
+    def test_chatbot_repeated_question_served_from_cache(self):
+        """Test that a repeated question is answered from the response cache"""
+        import unittest.mock as mock
+
+        class MockResponse:
+            def __init__(self):
+                self.choices = [
+                    type('obj', (object,), {
+                        'message': type('obj', (object,), {'content': "Mild soreness is normal."})
+                    })
+                ]
+
+        url = reverse('chatbot_api')
+        with mock.patch('openai.resources.chat.completions.Completions.create', return_value=MockResponse()) as create:
+            first = self.client.post(url, {'message': 'Is this pain normal?', 'exerciseContext': '{}'}, format='json')
+            second = self.client.post(url, {'message': 'is this pain normal', 'exerciseContext': '{}'}, format='json')
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(second.data['message'], first.data['message'])
+
+        from .chat_cache import get_response_cache
+        stats = get_response_cache().stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    async def test_chatbot_stream_with_fake_completion_stream(self):
+        """Test the streaming chatbot endpoint against a local fake completion stream"""
+        import unittest.mock as mock
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        async def fake_stream(messages):
+            # The system prompt and user message should be built the same way as the sync endpoint
+            self.assertEqual(messages[0]['role'], 'system')
+            self.assertIn('Meniscus Tear', messages[0]['content'])
+            self.assertEqual(messages[-1], {'role': 'user', 'content': 'How am I doing?'})
+            for delta in ["Great ", "job, ", "keep going!"]:
+                yield delta
+
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+
+        with mock.patch('api.views.stream_chat_completion', fake_stream):
+            response = await self.async_client.post(
+                reverse('chatbot_stream'),
+                {'message': 'How am I doing?', 'exerciseContext': '{}'},
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertIn('event: delta\ndata: {"delta": "Great "}', body)
+        self.assertIn('event: done\ndata: {"message": "Great job, keep going!", "status": "success"}', body)
+
+        # The finished turn should be stored in the chat memory
+        stored = await sync_to_async(lambda: list(
+            ChatMessage.objects.filter(user=self.user).values_list('role', 'content')
+        ))()
+        self.assertEqual(stored, [('user', 'How am I doing?'), ('assistant', 'Great job, keep going!')])
+
+    async def test_chatbot_stream_requires_authentication(self):
+        """Test the streaming chatbot endpoint rejects anonymous requests"""
+        response = await self.async_client.post(
+            reverse('chatbot_stream'),
+            {'message': 'Hello'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(LLM_BACKEND={'BACKEND': 'api.llm.FakeLLMBackend', 'OPTIONS': {'reply_tokens': 5}})
+    def test_chatbot_phase_timings_for_staff(self):
+        """Test that staff get per-phase timing headers and can read the chatbot metrics"""
+        from .instrumentation import chat_metrics
+        chat_metrics.reset()
+
+        url = reverse('chatbot_api')
+        data = {'message': 'Is this pain normal?', 'exerciseContext': '{}'}
+
+        # Regular users do not get the debug headers
+        response = self.client.post(url, data, format='json')
+        self.assertNotIn('Server-Timing', response)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for phase in ['cache_lookup', 'history_load', 'context', 'prompt', 'upstream', 'history_save', 'total']:
+            self.assertIn(f"{phase};dur=", response['Server-Timing'])
+        self.assertIn("completion=5", response['X-Chatbot-Tokens'])
+
+        metrics = self.client.get(reverse('chatbot_metrics')).data
+        self.assertEqual(metrics['outcomes'], {'success': 2})
+        self.assertEqual(metrics['phases']['upstream']['count'], 2)
+        self.assertEqual(metrics['tokens']['completion'], 10)
+        self.assertEqual(metrics['llm_client']['completed'], 2)
+        self.assertIn('hit_rate', metrics['response_cache'])
+
+    def test_chatbot_metrics_requires_staff(self):
+        """Test that the chatbot metrics are not available to regular users"""
+        response = self.client.get(reverse('chatbot_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_reset_chat_history(self):
         """Test resetting chat history"""
         url = reverse('reset_chat_history')
@@ -1008,6 +1260,1301 @@ class ChatbotTests(APITestCase):
         self.assertEqual(response.data['message'], 'Chat history reset.')
         
 
+class PatientContextTests(TestCase):
+    """Tests for the cached chatbot patient context snapshot"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.category = ExerciseCategory.objects.create(
+            name="Squats",
+            description="Exercises for Knee rehabilitation"
+        )
+        self.beginner_exercise = Exercise.objects.create(
+            category=self.category,
+            name="Beginner Squat",
+            difficulty_level="Beginner"
+        )
+        self.injury_type = InjuryType.objects.create(
+            name="Meniscus Tear",
+            description="Tear in the meniscus of the knee"
+        )
+        self.injury_type.treatment.add(self.beginner_exercise)
+
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="Password123!",
+            first_name="Test",
+            last_name="User",
+        )
+        self.user.injury_type = self.injury_type
+        self.user.save()
+
+    def test_context_is_served_from_cache(self):
+        """Test that building chatbot messages twice only reads the database once"""
+        from .views import build_chat_messages
+
+        build_chat_messages(self.user, "Hello", {}, [])
+        with self.assertNumQueries(0):
+            messages = build_chat_messages(self.user, "Hello", {}, [])
+
+        self.assertIn("Meniscus Tear", messages[0]['content'])
+        self.assertIn("Beginner Squat", messages[0]['content'])
+
+    def test_context_invalidated_by_writes(self):
+        """Test that exercise, report and injury type writes refresh the snapshot"""
+        from .context import get_patient_context
+
+        self.assertEqual(get_patient_context(self.user)['exercises'][0]['pain_level'], 0)
+
+        # Updating a user exercise should be reflected in the next snapshot
+        user_exercise = UserExercise.objects.get(user=self.user, exercise=self.beginner_exercise)
+        user_exercise.pain_level = 6
+        user_exercise.save()
+        self.assertEqual(get_patient_context(self.user)['exercises'][0]['pain_level'], 6)
+
+        # New reports should show up as well
+        Report.objects.create(user=self.user, pain_level=3, notes="Sore knee")
+        self.assertEqual(get_patient_context(self.user)['reports'][0]['notes'], "Sore knee")
+
+        # Changing the injury type should be reflected in the snapshot
+        new_injury = InjuryType.objects.create(name="ACL Tear")
+        self.user.injury_type = new_injury
+        self.user.save()
+        self.assertEqual(get_patient_context(self.user)['injury'], "ACL Tear")
+
+    def test_several_workers_need_a_shared_cache(self):
+        """Test that more than one worker with the per-process cache fails to start"""
+        from django.core.exceptions import ImproperlyConfigured
+        from .apps import check_shared_cache
+
+        check_shared_cache()
+        with override_settings(WEB_CONCURRENCY=4):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_cache()
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                                       'LOCATION': 'redis://localhost:6379/0'}}):
+                check_shared_cache()
+
+
+class LLMClientTests(TestCase):
+    """Tests for the shared LLM client limits"""
+
+    def test_circuit_breaker_half_open_trial(self):
+        """Test that the breaker lets one trial call through after the reset timeout"""
+        from .llm import CircuitBreaker
+
+        now = [0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        now[0] = 10
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_fake_backend_is_deterministic_and_injects_failures(self):
+        """Test that the fake backend gives repeatable replies and injects failures"""
+        from .llm import FakeLLMBackend, FakeUpstreamError, LLMClient
+
+        messages = [{'role': 'user', 'content': 'How many reps today?'}]
+        backend = FakeLLMBackend(reply_tokens=4)
+        self.assertEqual(backend.complete(messages), backend.complete(messages))
+        self.assertEqual(len(backend.complete(messages).content.split()), 4)
+
+        client = LLMClient(FakeLLMBackend(failure_rate=1.0))
+        with self.assertRaises(FakeUpstreamError):
+            client.complete(messages)
+        self.assertEqual(client.metrics()['failed'], 1)
+
+        # Latency draws repeat for the same seed
+        first = FakeLLMBackend(latency='lognormal', latency_ms=800, latency_spread_ms=300, seed=7)
+        second = FakeLLMBackend(latency='lognormal', latency_ms=800, latency_spread_ms=300, seed=7)
+        self.assertEqual([first._draw() for _ in range(5)], [second._draw() for _ in range(5)])
+
+    def test_concurrency_limit_rejects_when_busy(self):
+        """Test that completions beyond the in-flight limit are rejected after the queue timeout"""
+        from .llm import FakeLLMBackend, LLMClient, LLMUnavailable
+
+        client = LLMClient(FakeLLMBackend(), max_in_flight=1, queue_timeout=0.01)
+        client._acquire()
+        with self.assertRaises(LLMUnavailable):
+            client._acquire()
+        client._release(True)
+
+        metrics = client.metrics()
+        self.assertEqual(metrics['rejected_busy'], 1)
+        self.assertEqual(metrics['in_flight'], 0)
+        self.assertGreater(metrics['queue_wait_max'], 0)
+
+
+class ChatResponseCacheTests(TestCase):
+    """Tests for the chatbot response cache"""
+
+    def test_ttl_and_lru_eviction(self):
+        """Test that entries expire after the TTL and the least recently used entry is evicted"""
+        from .chat_cache import ChatResponseCache
+
+        now = [0]
+        cache = ChatResponseCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.set('a', 'answer a')
+        cache.set('b', 'answer b')
+        self.assertEqual(cache.get('a'), 'answer a')
+
+        # 'b' is now the least recently used entry
+        cache.set('c', 'answer c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'answer c')
+
+        now[0] = 11
+        self.assertIsNone(cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['expirations'], 1)
+
+    def test_key_depends_on_context_slice(self):
+        """Test that the key ignores phrasing noise but changes with the pain band"""
+        from .chat_cache import response_cache_key
+
+        context = {
+            'injury': 'Meniscus Tear',
+            'exercises': [{'name': 'Beginner Squat', 'difficulty': 'Beginner', 'pain_level': 1}],
+            'reports': [],
+        }
+        key = response_cache_key("How many reps today?", context, {})
+        self.assertEqual(key, response_cache_key("  how many REPS today ", context, {}))
+
+        high_pain = {**context, 'exercises': [{**context['exercises'][0], 'pain_level': 6}]}
+        self.assertNotEqual(key, response_cache_key("How many reps today?", high_pain, {}))
+
+
+class ChatMemoryTests(TestCase):
+    """Tests for the token-budgeted chat memory"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="Password123!",
+        )
+
+    def test_history_round_trip(self):
+        """Test that stored turns are loaded back in order"""
+        from .chat_memory import append_turn, load_history, clear_history
+
+        append_turn(self.user, "Is this pain normal?", "Mild soreness is common.")
+        self.assertEqual(load_history(self.user), [
+            {"role": "user", "content": "Is this pain normal?"},
+            {"role": "assistant", "content": "Mild soreness is common."},
+        ])
+
+        clear_history(self.user)
+        self.assertEqual(load_history(self.user), [])
+
+    @override_settings(CHAT_MEMORY_WINDOW_TOKENS=100, CHAT_MEMORY_SUMMARY_TOKENS=60)
+    def test_window_stays_bounded(self):
+        """Test that older turns are folded into a single summary message"""
+        from .chat_memory import append_turn, load_history, SUMMARY_PREFIX
+
+        for i in range(50):
+            append_turn(self.user, f"Question {i} " + "about my knee " * 5, f"Answer {i} " + "keep going " * 5)
+
+        # Storage stays flat: a bounded window of turns plus one summary row
+        self.assertEqual(ChatMessage.objects.filter(user=self.user, role=ChatMessage.SUMMARY).count(), 1)
+        turns = ChatMessage.objects.filter(user=self.user).exclude(role=ChatMessage.SUMMARY)
+        self.assertLessEqual(sum(turns.values_list('token_count', flat=True)), 100)
+
+        history = load_history(self.user)
+        self.assertEqual(history[0]['role'], 'system')
+        self.assertTrue(history[0]['content'].startswith(SUMMARY_PREFIX))
+        self.assertEqual(history[1]['role'], 'user')
+        self.assertTrue(history[-1]['content'].startswith("Answer 49"))
+
+
+class ResetExercisesCommandTests(TestCase):
+    """Tests for the chunked daily reset_exercises command"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        self.exercise = Exercise.objects.create(category=self.category, name="Beginner Squat")
+
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        self.users = []
+        for i in range(5):
+            user = User.objects.create_user(username=f"patient{i}", password="Password123!", last_reset=yesterday)
+            UserExercise.objects.create(user=user, exercise=self.exercise, pain_level=3, completed=True)
+            self.users.append(user)
+
+        # Reset recently, so not due yet
+        self.recent_user = self.users[-1]
+        User.objects.filter(pk=self.recent_user.pk).update(last_reset=timezone.now())
+        # The first two patients' flags are left over from yesterday
+        self.stale_users = self.users[:2]
+        UserExercise.objects.filter(user__in=self.stale_users).update(last_completed_on=timezone.localdate() - timedelta(days=1))
+
+    def run_command(self, **options):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('reset_exercises', stdout=out, **options)
+        return out.getvalue()
+
+    def test_reset_in_chunks(self):
+        """Test that due users are reset in chunks and reruns are no-ops"""
+        output = self.run_command(chunk_size=2)
+
+        self.assertIn("Reset 2/4 users", output)
+        self.assertIn("Reset exercises for 4 users", output)
+        for user in self.users[:4]:
+            user.refresh_from_db()
+            self.assertEqual(user.last_reset.date(), timezone.now().date())
+        self.assertEqual(User.objects.get(pk=self.recent_user.pk).last_reset.date(), timezone.now().date())
+
+        # Earlier days' flags are cleared, today's completions are left alone
+        self.assertEqual(
+            set(UserExercise.objects.filter(completed=False, pain_level=0).values_list('user_id', flat=True)),
+            {user.pk for user in self.stale_users}
+        )
+        self.assertEqual(UserExercise.objects.filter(completed=True, pain_level=3).count(), 3)
+
+        self.assertIn("Reset exercises for 0 users", self.run_command(chunk_size=2))
+
+    def test_dry_run_and_resume(self):
+        """Test that a dry run writes nothing and --start-after skips earlier users"""
+        output = self.run_command(dry_run=True)
+        self.assertIn("would reset 2 exercises for 4 users", output)
+        self.assertFalse(User.objects.filter(last_reset__date=timezone.now().date()).exclude(pk=self.recent_user.pk).exists())
+
+        self.run_command(start_after=self.users[1].pk)
+        reset_ids = set(User.objects.filter(last_reset__date=timezone.now().date()).values_list('id', flat=True))
+        self.assertEqual(reset_ids, {self.users[2].pk, self.users[3].pk, self.recent_user.pk})
+
+
+class TimezoneResetTests(APITestCase):
+    """Tests for the time zone aware daily reset"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        self.exercise = Exercise.objects.create(category=self.category, name="Beginner Squat")
+
+        self.last_reset = datetime(2026, 3, 10, 10, 0, tzinfo=dt_timezone.utc)
+        self.tokyo_user = User.objects.create_user(username="tokyo", password="Password123!",
+                                                   timezone='Asia/Tokyo', last_reset=self.last_reset)
+        self.new_york_user = User.objects.create_user(username="newyork", password="Password123!",
+                                                      timezone='America/New_York', last_reset=self.last_reset)
+        for user in [self.tokyo_user, self.new_york_user]:
+            UserExercise.objects.create(user=user, exercise=self.exercise, pain_level=3, completed=True)
+        UserExercise.objects.update(last_completed_on=date(2026, 3, 10))
+
+    def test_buckets_reset_after_local_midnight(self):
+        """Test that only buckets whose local midnight passed since the last reset are reset"""
+        import unittest.mock as mock
+        from io import StringIO
+        from django.core.management import call_command
+
+        # 01:00 on the 11th in Tokyo, noon on the 10th in New York
+        now = datetime(2026, 3, 10, 16, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('schedule_resets', stdout=StringIO())
+            out = StringIO()
+            call_command('schedule_resets', stdout=out)
+
+        tokyo_run = ResetRun.objects.get(bucket="Asia/Tokyo")
+        self.assertEqual(tokyo_run.local_date, date(2026, 3, 11))
+        self.assertEqual((tokyo_run.users_reset, tokyo_run.exercises_reset), (1, 1))
+        # The flag stored before the Tokyo midnight is cleared in the table, not just at read time
+        self.assertEqual(
+            UserExercise.objects.filter(user=self.tokyo_user).values_list('completed', 'pain_level').get(), (False, 0)
+        )
+        self.assertEqual(
+            UserExercise.objects.filter(user=self.new_york_user).values_list('completed', 'pain_level').get(), (True, 3)
+        )
+        self.assertEqual(ResetRun.objects.get(bucket="America/New_York").users_reset, 0)
+        self.assertIn("Reset 0 time zone buckets", out.getvalue())
+
+        self.tokyo_user.refresh_from_db()
+        self.new_york_user.refresh_from_db()
+        self.assertEqual(self.tokyo_user.last_reset, now)
+        self.assertEqual(self.new_york_user.last_reset, self.last_reset)
+
+    def test_reset_keeps_completions_after_local_midnight(self):
+        """Test that a reset running after a patient completed an exercise keeps that completion"""
+        import unittest.mock as mock
+        from io import StringIO
+        from django.core.management import call_command
+
+        # Completed at 00:10 on the 11th in Tokyo, reset runs at 00:30
+        user_exercise = UserExercise.objects.get(user=self.tokyo_user)
+        UserExercise.objects.filter(pk=user_exercise.pk).update(
+            completed=True, pain_level=4, last_completed_on=date(2026, 3, 11)
+        )
+        now = datetime(2026, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('schedule_resets', stdout=StringIO())
+
+        run = ResetRun.objects.get(bucket="Asia/Tokyo")
+        self.assertEqual((run.users_reset, run.exercises_reset), (1, 0))
+        self.assertEqual(
+            UserExercise.objects.filter(pk=user_exercise.pk).values_list('completed', 'pain_level', 'last_completed_on').get(),
+            (True, 4, date(2026, 3, 11))
+        )
+
+    def test_dst_change_does_not_reset_zone_twice(self):
+        """Test that a zone whose UTC offset changes during its local day is not due again"""
+        import unittest.mock as mock
+        from io import StringIO
+        from django.core.management import call_command
+
+        # New York switches from UTC-05:00 to UTC-04:00 at 02:00 local on March 8th 2026
+        before = datetime(2026, 3, 8, 6, 30, tzinfo=dt_timezone.utc)  # 01:30 EST
+        after = datetime(2026, 3, 8, 12, 0, tzinfo=dt_timezone.utc)  # 08:00 EDT
+        User.objects.filter(pk=self.new_york_user.pk).update(last_reset=None)
+        with mock.patch('django.utils.timezone.now', return_value=before):
+            call_command('schedule_resets', stdout=StringIO())
+        with mock.patch('django.utils.timezone.now', return_value=after):
+            out = StringIO()
+            call_command('schedule_resets', stdout=out)
+
+        self.assertEqual(ResetRun.objects.filter(bucket="America/New_York").count(), 1)
+        self.assertEqual(User.objects.get(pk=self.new_york_user.pk).last_reset, before)
+
+    def test_completed_flags_follow_user_timezone(self):
+        """Test that whether a completed flag is current depends on the patient's local day"""
+        from zoneinfo import ZoneInfo
+
+        # Kiritimati is always at least a day ahead of Pago Pago
+        kiritimati_today = timezone.localdate(timezone=ZoneInfo('Pacific/Kiritimati'))
+        user_exercise = UserExercise.objects.get(user=self.tokyo_user)
+        UserExercise.objects.filter(pk=user_exercise.pk).update(last_completed_on=kiritimati_today)
+        url = reverse('userexercise-detail', args=[user_exercise.id])
+        self.client.force_authenticate(user=self.tokyo_user)
+
+        User.objects.filter(pk=self.tokyo_user.pk).update(timezone='Pacific/Kiritimati')
+        self.tokyo_user.refresh_from_db()
+        self.assertTrue(self.client.get(url).data['completed'])
+
+        User.objects.filter(pk=self.tokyo_user.pk).update(timezone='Pacific/Pago_Pago')
+        self.tokyo_user.refresh_from_db()
+        self.assertFalse(self.client.get(url).data['completed'])
+
+
+class ExerciseLadderTests(TestCase):
+    """Tests for the in-process exercise difficulty ladder"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        self.beginner = Exercise.objects.create(category=self.category, name="Beginner Squat", difficulty_level="Beginner")
+        self.advanced = Exercise.objects.create(category=self.category, name="Advanced Squat", difficulty_level="Advanced")
+
+    def test_ladder_lookups(self):
+        """Test ladder lookups are served from memory once built"""
+        from .ladder import get_ladder
+
+        get_ladder()
+        with self.assertNumQueries(0):
+            ladder = get_ladder()
+            self.assertEqual(ladder.variant(self.category.id, "Advanced"), self.advanced)
+            self.assertIsNone(ladder.harder(self.beginner.id))
+            self.assertIsNone(ladder.easier(self.beginner.id))
+
+    def test_ladder_rebuilds_when_catalog_changes(self):
+        """Test that saving an exercise invalidates the ladder"""
+        from .ladder import get_ladder
+
+        self.assertIsNone(get_ladder().harder(self.beginner.id))
+        intermediate = Exercise.objects.create(
+            category=self.category,
+            name="Intermediate Squat",
+            difficulty_level="Intermediate"
+        )
+        self.assertEqual(get_ladder().harder(self.beginner.id), intermediate)
+        self.assertEqual(get_ladder().easier(self.advanced.id), intermediate)
+
+        intermediate.delete()
+        self.assertIsNone(get_ladder().harder(self.beginner.id))
+
+    def test_ladder_checks_version_once_per_interval(self):
+        """Test that lookups only read the version stamp once per check interval"""
+        import time
+        import unittest.mock as mock
+        import uuid
+        from django.core.cache import cache
+        from .ladder import LADDER_CHECK_INTERVAL, LADDER_VERSION_KEY, get_ladder
+
+        get_ladder()
+        with mock.patch('api.ladder.cache') as shared_cache:
+            for _ in range(10):
+                self.assertIsNone(get_ladder().harder(self.beginner.id))
+        self.assertFalse(shared_cache.get.called)
+
+        # Another process adds an exercise: this one sees it after the interval
+        with mock.patch('api.signals.invalidate_ladder'):
+            intermediate = Exercise.objects.create(category=self.category, name="Intermediate Squat",
+                                                   difficulty_level="Intermediate")
+        cache.set(LADDER_VERSION_KEY, uuid.uuid4().hex, None)
+        self.assertIsNone(get_ladder().harder(self.beginner.id))
+        later = time.monotonic() + LADDER_CHECK_INTERVAL
+        with mock.patch('api.ladder.time.monotonic', return_value=later):
+            self.assertEqual(get_ladder().harder(self.beginner.id), intermediate)
+
+
+class ProgressionServiceTests(APITestCase):
+    """Tests for the progression service behind the confirm endpoints"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        # Variants sharing a name are told apart by id
+        self.beginner = Exercise.objects.create(category=self.category, name="Squat", difficulty_level="Beginner")
+        self.intermediate = Exercise.objects.create(category=self.category, name="Squat", slug="squat-2",
+                                                    difficulty_level="Intermediate")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.user_exercise = UserExercise.objects.create(user=self.user, exercise=self.beginner, sets=3, reps=12)
+        self.client.force_authenticate(user=self.user)
+
+    def test_confirm_increase_swaps_exercises(self):
+        """Test that confirming an increase swaps to the harder variant in a bounded number of queries"""
+        from .progression import decrease_user_exercise
+
+        url = reverse('userexercise-confirm-increase', args=[self.user_exercise.id])
+        response = self.client.post(url, {'confirm': 'yes'}, format='json')
+
+        self.assertEqual(response.data['message'], "Exercise difficulty increased successfully")
+        new_user_exercise = UserExercise.objects.get(pk=response.data['user_exercise']['id'])
+        self.assertEqual(new_user_exercise.exercise, self.intermediate)
+        self.assertEqual((new_user_exercise.sets, new_user_exercise.reps), (3, 12))
+        self.user_exercise.refresh_from_db()
+        self.assertFalse(self.user_exercise.is_active)
+        self.assertEqual(self.user_exercise.date_deactivated, timezone.now().date())
+
+        # Already at the top: nothing changes and the exercise stays active
+        response = self.client.post(
+            reverse('userexercise-confirm-increase', args=[new_user_exercise.id]), {'confirm': 'yes'}, format='json'
+        )
+        self.assertEqual(response.data['message'], "Already at maximum difficulty level")
+        self.assertTrue(UserExercise.objects.get(pk=new_user_exercise.pk).is_active)
+
+        # Swapping back onto the earlier row: savepoint, select, find variant, reactivate, deactivate, release
+        UserExercise.objects.filter(pk=new_user_exercise.pk).update(pain_level=6, last_completed_on=timezone.localdate())
+        with self.assertNumQueries(6):
+            variant = decrease_user_exercise(self.user, new_user_exercise.pk)
+        self.assertEqual(variant.pk, self.user_exercise.pk)
+        self.assertTrue(variant.is_active)
+
+    def test_confirm_decrease_requires_high_pain(self):
+        """Test that a decrease only happens on high pain and never below beginner"""
+        self.user_exercise.exercise = self.intermediate
+        self.user_exercise.save()
+        url = reverse('userexercise-confirm-decrease', args=[self.user_exercise.id])
+
+        response = self.client.post(url, {'confirm': 'yes'}, format='json')
+        self.assertEqual(response.data['message'], "Already at minimum difficulty level")
+
+        self.user_exercise.pain_level = 6
+        self.user_exercise.save()
+        response = self.client.post(url, {'confirm': 'yes'}, format='json')
+        self.assertEqual(response.data['message'], "Exercise difficulty decreased successfully")
+        self.assertEqual(response.data['user_exercise']['exercise'], self.beginner.id)
+
+
+class PainWindowTests(TestCase):
+    """Tests for the rolling pain statistics kept on report writes"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        exercise = Exercise.objects.create(category=category, name="Squat", difficulty_level="Beginner")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.user_exercise = UserExercise.objects.create(user=self.user, exercise=exercise)
+        self.report = Report.objects.create(user=self.user)
+
+    def report_pain(self, pain_level):
+        return ReportExercise.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=pain_level)
+
+    def test_window_tracks_latest_reports(self):
+        """Test that new reports are appended and the oldest drop out of the window"""
+        with self.settings(PAIN_WINDOW_SIZE=3):
+            for pain_level in [7, 1, 2, 3]:
+                self.report_pain(pain_level)
+
+        window = PainWindow.objects.get(user_exercise=self.user_exercise)
+        self.assertEqual(window.pain_levels(), [1, 2, 3])
+        self.assertEqual(window.pain_levels(2), [2, 3])
+        self.assertEqual(window.count, 4)
+        self.assertEqual(window.max_pain, 3)
+        self.assertEqual(window.mean_pain, 2)
+
+    def test_window_follows_edits_and_deletes(self):
+        """Test that editing or deleting a report updates the window"""
+        first = self.report_pain(1)
+        second = self.report_pain(2)
+
+        second.pain_level = 6
+        second.save()
+        window = PainWindow.objects.get(user_exercise=self.user_exercise)
+        self.assertEqual(window.pain_levels(), [1, 6])
+        self.assertEqual(window.count, 2)
+
+        second.delete()
+        window.refresh_from_db()
+        self.assertEqual(window.pain_levels(), [1])
+        self.assertEqual(window.count, 1)
+        self.assertEqual(window.max_pain, first.pain_level)
+
+    def test_consistent_low_pain_reads_window(self):
+        """Test that the low pain check is a single read with a threshold chosen at call time"""
+        from .pain_window import has_consistent_low_pain
+
+        for pain_level in [3, 2, 3]:
+            self.report_pain(pain_level)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(has_consistent_low_pain(self.user_exercise))
+        self.assertFalse(has_consistent_low_pain(self.user_exercise, max_pain_level=3))
+        self.assertFalse(has_consistent_low_pain(self.user_exercise, num_reports=4))
+
+    def test_window_smaller_than_check_uses_history(self):
+        """Test that a check for more reports than the window holds reads the history"""
+        from .pain_window import has_consistent_low_pain
+
+        with self.settings(PAIN_WINDOW_SIZE=2):
+            for pain_level in [1, 2, 3]:
+                self.report_pain(pain_level)
+
+        self.assertEqual(PainWindow.objects.get(user_exercise=self.user_exercise).pain_levels(), [2, 3])
+        self.assertTrue(has_consistent_low_pain(self.user_exercise))
+
+
+class RecommendationTests(TestCase):
+    """Tests for the batch progression rules and pending recommendations"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        self.beginner = Exercise.objects.create(category=category, name="Beginner Squat", difficulty_level="Beginner")
+        self.advanced = Exercise.objects.create(category=category, name="Advanced Squat", difficulty_level="Advanced")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.user_exercise = UserExercise.objects.create(user=self.user, exercise=self.beginner)
+        self.report = Report.objects.create(user=self.user)
+
+    def report_pain(self, user_exercise, *pain_levels):
+        for pain_level in pain_levels:
+            ReportExercise.objects.create(report=self.report, user_exercise=user_exercise, pain_level=pain_level)
+
+    def test_evaluate_rules(self):
+        """Test the vectorised rules against one exercise per case"""
+        from .recommendations import pain_matrix, evaluate
+
+        recents = [
+            [[1, 5]],                   # beginner in pain
+            [[2, 5]],                   # intermediate in pain
+            [[3, 1], [4, 2], [5, 3]],   # three low reports
+            [[6, 1], [7, 2]],           # too few reports
+            [[8, 1], [9, 1], [10, 1]],  # already advanced
+            [],
+        ]
+        difficulty_levels = ["Beginner", "Intermediate", "Beginner", "Beginner", "Advanced", "Beginner"]
+
+        actions = evaluate(pain_matrix(recents), difficulty_levels)
+        self.assertEqual(list(actions), ["remove", "decrease", "increase", "", "", ""])
+        self.assertEqual(len(evaluate(pain_matrix([]), [])), 0)
+
+    def test_report_writes_refresh_recommendation(self):
+        """Test that saving and deleting reports keeps the recommendation current"""
+        self.report_pain(self.user_exercise, 1, 2)
+        self.assertFalse(PendingRecommendation.objects.exists())
+
+        self.report_pain(self.user_exercise, 3)
+        self.assertEqual(self.user_exercise.pending_recommendation.action, PendingRecommendation.INCREASE)
+
+        self.report_pain(self.user_exercise, 6)
+        self.user_exercise.pending_recommendation.refresh_from_db()
+        self.assertEqual(self.user_exercise.pending_recommendation.action, PendingRecommendation.REMOVE)
+
+        ReportExercise.objects.filter(pain_level=6).delete()
+        self.user_exercise.pending_recommendation.refresh_from_db()
+        self.assertEqual(self.user_exercise.pending_recommendation.action, PendingRecommendation.INCREASE)
+
+        ReportExercise.objects.filter(pain_level=3).delete()
+        self.assertFalse(PendingRecommendation.objects.exists())
+
+    def test_evaluate_progressions_command(self):
+        """Test that the batch job rebuilds recommendations for active exercises only"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        other = User.objects.create_user(username="other", password="Password123!")
+        advanced = UserExercise.objects.create(user=other, exercise=self.advanced)
+        inactive = UserExercise.objects.create(user=other, exercise=self.beginner)
+        self.report_pain(self.user_exercise, 1, 1, 1)
+        self.report_pain(advanced, 7)
+        self.report_pain(inactive, 8)
+        inactive.is_active = False
+        inactive.save()
+        PendingRecommendation.objects.all().delete()
+
+        out = StringIO()
+        call_command('evaluate_progressions', chunk_size=1, stdout=out)
+
+        self.assertEqual(
+            dict(PendingRecommendation.objects.values_list('user_exercise_id', 'action')),
+            {self.user_exercise.id: "increase", advanced.id: "decrease"}
+        )
+        self.assertIn("Wrote 2 pending recommendations for 2 exercises", out.getvalue())
+
+    def test_simulate_progression_command(self):
+        """Test the progression simulator reports outcomes and keeps nothing"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('simulate_progression', patients=5, days=4, stdout=out)
+
+        self.assertIn("Patients: 5 over 4 days", out.getvalue())
+        self.assertIn("Queries per decision:", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="simulated-").exists())
+        self.assertEqual(Exercise.objects.count(), 2)
+
+
+class ReportIngestionTests(APITestCase):
+    """Tests for the bulk report ingestion path"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        self.exercises = [
+            Exercise.objects.create(category=self.category, name=f"Squat {i}", difficulty_level="Intermediate")
+            for i in range(20)
+        ]
+        self.url = reverse('report-list')
+
+    def create_patient(self, username, num_exercises):
+        user = User.objects.create_user(username=username, password="Password123!")
+        user_exercises = [
+            UserExercise.objects.create(user=user, exercise=exercise, sets=3, reps=10, pain_level=2)
+            for exercise in self.exercises[:num_exercises]
+        ]
+        return user, user_exercises
+
+    def post_report(self, user, exercise_ids):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                'user': user.id,
+                'date': timezone.localdate().isoformat(),
+                'exercises_completed': exercise_ids
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(queries)
+
+    def test_report_costs_constant_queries(self):
+        """Test that a 20-exercise report costs as many queries as a 2-exercise one"""
+        small_user, small_exercises = self.create_patient("small", 2)
+        large_user, large_exercises = self.create_patient("large", 20)
+
+        small_queries = self.post_report(small_user, [user_exercise.id for user_exercise in small_exercises])
+        large_queries = self.post_report(large_user, [user_exercise.id for user_exercise in large_exercises])
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(ReportExercise.objects.filter(report__user=large_user).count(), 20)
+        self.assertEqual(PainWindow.objects.filter(user_exercise__user=large_user, count=1).count(), 20)
+
+    def test_report_update_costs_constant_queries(self):
+        """Test that updating a report with 20 exercises costs as many queries as with 2"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        query_counts = []
+        for username, num_exercises in [("small", 2), ("large", 20)]:
+            user, user_exercises = self.create_patient(username, num_exercises)
+            # Half the exercises are already on the report, so the update both edits and adds rows
+            self.post_report(user, [user_exercise.id for user_exercise in user_exercises[:num_exercises // 2]])
+            report = Report.objects.get(user=user)
+            UserExercise.objects.filter(user=user).update(pain_level=4)
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                response = self.client.put(
+                    reverse('report-detail', args=[report.id]),
+                    {'exercises_completed': [user_exercise.id for user_exercise in user_exercises]},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            query_counts.append(len(queries))
+
+            report.refresh_from_db()
+            self.assertEqual((report.pain_sum, report.pain_count, report.pain_level), (4 * num_exercises, num_exercises, 4))
+            self.assertEqual(PainWindow.objects.filter(user_exercise__user=user).count(), num_exercises)
+            self.assertEqual(DailyUserStats.objects.get(user=user, date=report.date).pain_count, num_exercises)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_report_rows_windows_and_recommendations(self):
+        """Test the rows written, the pain average and the skipped ids of a report"""
+        user, (user_exercise, fresh_exercise) = self.create_patient("patient", 2)
+        other_user, (other_exercise,) = self.create_patient("other", 1)
+        earlier = Report.objects.create(user=user)
+        Report.objects.filter(pk=earlier.pk).update(date=date(2020, 1, 1))
+        for pain_level in [1, 1]:
+            ReportExercise.objects.create(report=earlier, user_exercise=user_exercise, pain_level=pain_level)
+        ReportExercise.objects.create(report=earlier, user_exercise=user_exercise, pain_level=0)
+
+        self.post_report(user, [user_exercise.id, fresh_exercise.id, other_exercise.id])
+
+        report = Report.objects.get(user=user, date=timezone.localdate())
+        self.assertEqual(
+            sorted(report.report_exercises.values_list('user_exercise_id', 'pain_level', 'completed_sets', 'completed_reps')),
+            [(user_exercise.id, 2, 3, 10), (fresh_exercise.id, 2, 3, 10)]
+        )
+        # Latest earlier pain for the reported exercise, current pain for the fresh one
+        self.assertEqual(report.pain_level, 1)
+        self.assertEqual(report.average_pain, 2)
+        self.assertEqual(user_exercise.pain_window.pain_levels(), [1, 1, 0, 2])
+        self.assertEqual(user_exercise.pending_recommendation.action, PendingRecommendation.INCREASE)
+        self.assertFalse(PendingRecommendation.objects.filter(user_exercise=fresh_exercise).exists())
+        self.assertFalse(ReportExercise.objects.filter(user_exercise=other_exercise).exists())
+
+    def test_report_is_filed_under_today(self):
+        """Test that a report is dated the patient's today whatever date the client sends"""
+        user, user_exercises = self.create_patient("patient", 1)
+        self.client.force_authenticate(user=user)
+        for days in (-30, 30):
+            Report.objects.filter(user=user).delete()
+            response = self.client.post(self.url, {
+                'user': user.id,
+                'date': (timezone.localdate() + timedelta(days=days)).isoformat(),
+                'exercises_completed': [user_exercises[0].id]
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(Report.objects.get(user=user).date, timezone.localdate())
+
+    def test_report_update_averages_counters(self):
+        """Test that re-submitting an exercise sets the report pain from its counters and returns them"""
+        user, user_exercises = self.create_patient("patient", 2)
+        for user_exercise, pain_level in zip(user_exercises, [4, 5]):
+            UserExercise.objects.filter(pk=user_exercise.pk).update(pain_level=pain_level, last_completed_on=timezone.localdate())
+        self.client.force_authenticate(user=user)
+        response = self.client.post(self.url, {
+            'user': user.id,
+            'date': timezone.localdate().isoformat(),
+            'exercises_completed': [user_exercise.id for user_exercise in user_exercises]
+        }, format='json')
+        self.assertEqual(response.data['average_pain'], 4.5)
+
+        UserExercise.objects.filter(pk=user_exercises[0].pk).update(pain_level=7)
+        response = self.client.put(
+            reverse('report-detail', args=[response.data['id']]),
+            {'exercises_completed': [user_exercises[0].id]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['average_pain'], response.data['pain_level']), (6.0, 6))
+        report = Report.objects.get(user=user)
+        self.assertEqual((report.pain_sum, report.pain_count, report.pain_level), (12, 2, 6))
+
+
+class ReportPainCounterTests(TestCase):
+    """Tests for the running pain counters kept on reports"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        exercise = Exercise.objects.create(category=category, name="Squat", difficulty_level="Beginner")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.user_exercise = UserExercise.objects.create(user=self.user, exercise=exercise)
+        self.report = Report.objects.create(user=self.user)
+
+    def assertCounters(self, report, pain_sum, pain_count):
+        report.refresh_from_db()
+        self.assertEqual((report.pain_sum, report.pain_count), (pain_sum, pain_count))
+
+    def test_counters_follow_report_exercise_writes(self):
+        """Test that inserts, edits, moves and deletes adjust the counters"""
+        first = ReportExercise.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=3)
+        ReportExercise.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=4)
+        self.assertCounters(self.report, 7, 2)
+        self.assertEqual(self.report.average_pain, 3.5)
+
+        first.pain_level = 1
+        first.save()
+        self.assertCounters(self.report, 5, 2)
+
+        other = Report.objects.create(user=User.objects.create_user(username="other", password="Password123!"))
+        first.report = other
+        first.save()
+        self.assertCounters(self.report, 4, 1)
+        self.assertCounters(other, 1, 1)
+
+        ReportExercise.objects.filter(report=self.report).delete()
+        self.assertCounters(self.report, 0, 0)
+        self.assertIsNone(self.report.average_pain)
+
+    def test_report_save_keeps_counters(self):
+        """Test that saving a stale report instance does not overwrite its counters"""
+        stale = Report.objects.get(pk=self.report.pk)
+        ReportExercise.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=5)
+
+        stale.notes = "Sore today"
+        stale.save()
+        self.assertCounters(self.report, 5, 1)
+        self.assertEqual(self.report.notes, "Sore today")
+
+    def test_completion_sets_report_average(self):
+        """Test that completing exercises averages the report's pain without truncating the average"""
+        other_exercise = UserExercise.objects.create(
+            user=self.user,
+            exercise=Exercise.objects.create(category=self.user_exercise.exercise.category, name="Lunge")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for user_exercise, pain_level in [(self.user_exercise, 2), (other_exercise, 3)]:
+            url = reverse('userexercise-detail', args=[user_exercise.id])
+            response = self.client.put(url, {'completed': True, 'pain_level': pain_level}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report = Report.objects.get(user=self.user, date=timezone.now().date())
+        self.assertEqual(report.average_pain, 2.5)
+        self.assertEqual(report.pain_level, 2)
+
+
+class ProgressionQueueTests(APITestCase):
+    """Tests for the deferred progression checks of report updates"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        self.beginner = Exercise.objects.create(category=category, name="Beginner Squat", difficulty_level="Beginner")
+        self.intermediate = Exercise.objects.create(category=category, name="Intermediate Squat",
+                                                    difficulty_level="Intermediate")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.user_exercise = UserExercise.objects.create(user=self.user, exercise=self.intermediate, pain_level=6)
+        self.report = Report.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def run_worker(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('process_progression_jobs', once=True, stdout=out)
+        return out.getvalue()
+
+    def test_report_update_queues_progression_after_commit(self):
+        """Test that a report update only queues the level checks and the worker runs them"""
+        url = reverse('report-detail', args=[self.report.id])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.put(url, {'exercises_completed': [self.user_exercise.id]}, format='json')
+            self.assertFalse(ProgressionJob.objects.exists())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The job insert and the daily stats refresh
+        self.assertEqual(len(callbacks), 2)
+
+        job = ProgressionJob.objects.get()
+        self.assertEqual((job.user_exercise, job.pain_level), (self.user_exercise, 6))
+        self.assertFalse(UserExercise.objects.filter(exercise=self.beginner).exists())
+
+        out = self.run_worker()
+        self.assertIn("jobs/s", out)
+        self.assertIn("lag avg=", out)
+        self.assertIn("Processed 1 progression jobs (0 failed)", out)
+        self.assertFalse(ProgressionJob.objects.exists())
+        easier = UserExercise.objects.get(user=self.user, exercise=self.beginner)
+        self.assertTrue(easier.is_active)
+        self.assertFalse(UserExercise.objects.get(pk=self.user_exercise.pk).is_active)
+        self.assertTrue(self.report.report_exercises.filter(user_exercise=easier).exists())
+
+    def test_failed_job_is_kept(self):
+        """Test that a failing job is marked failed without blocking the rest"""
+        import unittest.mock as mock
+
+        ProgressionJob.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=6)
+        ProgressionJob.objects.create(report=self.report, user_exercise=self.user_exercise, pain_level=1)
+        with mock.patch('api.progression_queue.run_progression_job', side_effect=[ValueError("boom"), None]):
+            out = self.run_worker()
+
+        failed = ProgressionJob.objects.get()
+        self.assertEqual(failed.status, ProgressionJob.FAILED)
+        self.assertIn("ValueError: boom", failed.error)
+        self.assertIn("Processed 1 progression jobs (1 failed)", out)
+
+
+class CompletionSyncTests(APITestCase):
+    """Tests for the idempotent offline sync endpoint"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        self.squat = Exercise.objects.create(category=category, name="Beginner Squat", difficulty_level="Beginner")
+        self.lunge = Exercise.objects.create(category=category, name="Beginner Lunge", difficulty_level="Beginner")
+        Exercise.objects.create(category=category, name="Intermediate Squat", difficulty_level="Intermediate")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.squats = UserExercise.objects.create(user=self.user, exercise=self.squat, sets=3, reps=10)
+        self.lunges = UserExercise.objects.create(user=self.user, exercise=self.lunge, sets=2, reps=8)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('userexercise-sync')
+
+    def event(self, key, user_exercise, days_ago, pain_level, **extra):
+        completed_at = timezone.now() - timedelta(days=days_ago)
+        return {'idempotency_key': key, 'user_exercise': user_exercise.id,
+                'completed_at': completed_at.isoformat(), 'pain_level': pain_level, **extra}
+
+    def test_week_of_completions_syncs_in_one_request(self):
+        """Test that a week offline syncs into daily reports, exercise flags and recommendations"""
+        other = User.objects.create_user(username="other", password="Password123!")
+        foreign = UserExercise.objects.create(user=other, exercise=self.squat)
+        events = [self.event(f"squat-{day}", self.squats, day, 1) for day in range(6, -1, -1)]
+        events += [self.event(f"lunge-{day}", self.lunges, day, 5, reps=6) for day in (1, 0)]
+        events += [self.event("squat-0", self.squats, 0, 9), self.event("foreign", foreign, 0, 2)]
+
+        response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ["applied"] * 9 + ["duplicate", "rejected"])
+        self.assertEqual(response.data['recommendations'], {
+            self.squats.id: PendingRecommendation.INCREASE,
+            self.lunges.id: PendingRecommendation.REMOVE,
+        })
+
+        reports = Report.objects.filter(user=self.user)
+        self.assertEqual(reports.count(), 7)
+        today = reports.get(date=timezone.localdate())
+        self.assertEqual((today.pain_sum, today.pain_count, today.pain_level), (6, 2, 3))
+        lunge_row = today.report_exercises.get(user_exercise=self.lunges)
+        self.assertEqual((lunge_row.completed_sets, lunge_row.completed_reps), (2, 6))
+        self.assertEqual(PainWindow.objects.get(user_exercise=self.squats).count, 7)
+        self.assertEqual(SyncEvent.objects.filter(user=self.user).count(), 9)
+
+        self.squats.refresh_from_db()
+        self.assertTrue(self.squats.completed)
+        self.assertEqual(self.squats.pain_level, 1)
+        self.assertFalse(ReportExercise.objects.filter(user_exercise=foreign).exists())
+
+    def test_resent_batch_is_skipped(self):
+        """Test that resending a batch does no work twice while new events still apply"""
+        events = [self.event("a", self.squats, 1, 2), self.event("b", self.squats, 0, 2)]
+        self.client.post(self.url, {'events': events}, format='json')
+
+        response = self.client.post(self.url, {'events': events + [self.event("c", self.squats, 0, 6)]}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ["duplicate", "duplicate", "applied"])
+        self.assertEqual(ReportExercise.objects.filter(user_exercise=self.squats).count(), 2)
+        today = Report.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual((today.pain_sum, today.pain_count, today.average_pain), (6, 1, 6))
+        self.assertEqual(PainWindow.objects.get(user_exercise=self.squats).pain_levels(), [2, 6])
+
+    def test_completion_put_and_sync_share_the_local_day(self):
+        """Test that an online and an offline completion file under the patient's local day"""
+        import unittest.mock as mock
+
+        User.objects.filter(pk=self.user.pk).update(timezone='Asia/Tokyo')
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        # 08:00 on March 11th in Tokyo, still March 10th in UTC
+        now = datetime(2026, 3, 10, 23, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.put(
+                reverse('userexercise-detail', args=[self.squats.id]), {'completed': True, 'pain_level': 2}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            event = {'idempotency_key': "lunge", 'user_exercise': self.lunges.id,
+                     'completed_at': now.isoformat(), 'pain_level': 3}
+            self.client.post(self.url, {'events': [event]}, format='json')
+
+            self.client.put(reverse('userexercise-remove-exercise', args=[self.lunges.id]))
+
+        report = Report.objects.get(user=self.user)
+        self.assertEqual(report.date, date(2026, 3, 11))
+        self.assertEqual(report.pain_count, 2)
+        self.assertEqual(UserExercise.objects.get(pk=self.lunges.pk).date_deactivated, date(2026, 3, 11))
+
+    def test_future_completion_is_rejected(self):
+        """Test that a completion time past the allowed clock skew fails validation"""
+        event = {'idempotency_key': "a", 'user_exercise': self.squats.id, 'pain_level': 2,
+                 'completed_at': (timezone.now() + timedelta(days=1)).isoformat()}
+        response = self.client.post(self.url, {'events': [event]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Report.objects.exists())
+
+        event['completed_at'] = (timezone.now() + timedelta(minutes=1)).isoformat()
+        response = self.client.post(self.url, {'events': [event]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_stale_event_does_not_replace_later_completion(self):
+        """Test that an offline event older than today's online completion leaves it in place"""
+        stale = self.event("stale", self.squats, 0, 8)
+        self.client.put(reverse('userexercise-detail', args=[self.squats.id]), {'completed': True, 'pain_level': 2}, format='json')
+
+        response = self.client.post(self.url, {'events': [stale, self.event("fresh", self.lunges, 0, 4)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        today = Report.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual(today.report_exercises.get(user_exercise=self.squats).pain_level, 2)
+        self.assertEqual((today.pain_sum, today.pain_count), (6, 2))
+        self.assertEqual(UserExercise.objects.get(pk=self.squats.pk).pain_level, 2)
+
+        self.client.post(self.url, {'events': [self.event("newer", self.squats, 0, 5)]}, format='json')
+        self.assertEqual(today.report_exercises.get(user_exercise=self.squats).pain_level, 5)
+        self.assertEqual(UserExercise.objects.get(pk=self.squats.pk).pain_level, 5)
+
+    def test_sync_racing_an_online_completion(self):
+        """Test that a sync still applies when a completion PUT creates the same day's report under it"""
+        import unittest.mock as mock
+
+        real_filter = Report.objects.filter
+        raced = {}
+
+        def racing_filter(*args, **kwargs):
+            if raced:
+                return real_filter(*args, **kwargs)
+            found = list(real_filter(*args, **kwargs))
+            # The PUT lands between the sync's lookup of its reports and their creation
+            raced['started'] = True
+            raced['response'] = self.client.put(
+                reverse('userexercise-detail', args=[self.squats.id]), {'completed': True, 'pain_level': 2}, format='json'
+            )
+            return found
+
+        with mock.patch.object(Report.objects, 'filter', side_effect=racing_filter):
+            response = self.client.post(self.url, {'events': [self.event("lunge", self.lunges, 0, 4)]}, format='json')
+        self.assertEqual(raced['response'].status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = Report.objects.get(user=self.user)
+        self.assertEqual((report.pain_sum, report.pain_count), (6, 2))
+
+    def test_invalid_batch_is_rejected(self):
+        """Test that malformed events fail validation without applying anything"""
+        response = self.client.post(self.url, {'events': [{'idempotency_key': "a", 'pain_level': 11}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Report.objects.exists())
+
+
+class DailyUserStatsTests(APITransactionTestCase):
+    """Tests for the per-user daily adherence and pain rollup (refreshed once writes commit)"""
+
+    def setUp(self):
+        category = ExerciseCategory.objects.create(name="Squats")
+        self.squat = Exercise.objects.create(category=category, name="Squat", difficulty_level="Beginner")
+        self.lunge = Exercise.objects.create(category=category, name="Lunge", difficulty_level="Beginner")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.today = timezone.localdate()
+        self.squats = UserExercise.objects.create(user=self.user, exercise=self.squat)
+        self.lunges = UserExercise.objects.create(user=self.user, exercise=self.lunge)
+        UserExercise.objects.filter(user=self.user).update(date_activated=self.today - timedelta(days=10))
+        self.client.force_authenticate(user=self.user)
+
+    def report(self, days_ago, *pain_levels):
+        report, _ = Report.objects.get_or_create(user=self.user, date=self.today - timedelta(days=days_ago))
+        for user_exercise, pain_level in zip([self.squats, self.lunges], pain_levels):
+            ReportExercise.objects.create(report=report, user_exercise=user_exercise, pain_level=pain_level)
+        return report
+
+    def stats(self):
+        return list(
+            DailyUserStats.objects.filter(user=self.user).order_by('date')
+            .values_list('date', 'active_count', 'completed_count', 'pain_sum', 'pain_count')
+        )
+
+    def test_rollup_follows_writes(self):
+        """Test that report and exercise writes keep the rollup equal to a rebuild from scratch"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.report(2, 6)
+        today = self.report(0, 2, 4)
+        self.assertEqual(self.stats(), [
+            (self.today - timedelta(days=10), 2, 0, 0, 0),
+            (self.today - timedelta(days=2), 2, 1, 6, 1),
+            (self.today, 2, 2, 6, 2),
+        ])
+
+        # Removing the lunges today: they no longer count as active or completed today
+        lunges = UserExercise.objects.get(pk=self.lunges.pk)
+        lunges.is_active = False
+        lunges.save()
+        edited = ReportExercise.objects.get(report=today, user_exercise=self.squats)
+        edited.pain_level = 5
+        edited.save()
+        ReportExercise.objects.filter(report__date=self.today - timedelta(days=2)).delete()
+        self.assertEqual(self.stats(), [
+            (self.today - timedelta(days=10), 2, 0, 0, 0),
+            (self.today, 1, 1, 9, 2),
+        ])
+
+        rows = self.stats()
+        DailyUserStats.objects.all().delete()
+        call_command('backfill_daily_stats', stdout=StringIO())
+        self.assertEqual(self.stats(), rows)
+
+        # Deleting the user's exercises leaves nothing to report
+        UserExercise.objects.filter(user=self.user).delete()
+        self.assertEqual(self.stats(), [])
+
+    def test_bulk_report_paths_update_rollup(self):
+        """Test that report ingestion and offline sync, which skip signals, update the rollup"""
+        response = self.client.post(reverse('report-list'), {
+            'user': self.user.id, 'date': self.today.isoformat(), 'exercises_completed': [self.squats.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stats()[-1], (self.today, 2, 1, 0, 1))
+
+        completed_at = timezone.now() - timedelta(days=3)
+        response = self.client.post(reverse('userexercise-sync'), {'events': [
+            {'idempotency_key': "lunge", 'user_exercise': self.lunges.id,
+             'completed_at': completed_at.isoformat(), 'pain_level': 3}
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn((timezone.localdate(completed_at), 2, 1, 3, 1), self.stats())
+
+    def test_analytics_read_one_row_per_day(self):
+        """Test that the adherence and pain stats come from the rollup with a fixed number of queries"""
+        self.report(2, 6)
+        report = self.report(0, 2, 4)
+        Report.objects.filter(pk=report.pk).update(pain_level=3)
+
+        with self.assertNumQueries(3):  # rollup rows, latest earlier row, report days
+            response = self.client.get(reverse('report-adherence-stats'))
+        self.assertEqual(response.data['chart_data']['datasets'][0]['data'], [0, 0, 0, 0, 50, 0, 100])
+        self.assertEqual(response.data['average_adherence'], 21.4)
+        self.assertEqual(
+            [(day['completed'], day['adherence']) for day in response.data['history']],
+            [("2/2", 100), ("1/2", 50)]
+        )
+
+        response = self.client.get(reverse('report-pain-stats'))
+        self.assertEqual(response.data['chart_data']['datasets'][0]['data'], [0, 0, 0, 0, 6.0, 0, 3.0])
+        self.assertEqual(response.data['average_pain'], 4.0)
+        self.assertEqual(
+            [(day['exercises'], day['pain_level']) for day in response.data['history']],
+            [(2, 3), (1, 0)]
+        )
+
+    def test_active_counts_sweep(self):
+        """Test that the interval sweep counts the same active exercises as checking every interval"""
+        import random
+        from .daily_stats import active_counts
+
+        rng = random.Random(0)
+        start = date(2025, 1, 1)
+        intervals = []
+        for _ in range(50):
+            activated = start + timedelta(days=rng.randrange(60))
+            deactivated = activated + timedelta(days=rng.randrange(-5, 40)) if rng.random() < 0.7 else None
+            intervals.append((activated, deactivated))
+        days = [start + timedelta(days=offset) for offset in range(-3, 100, 2)]
+        self.assertEqual(active_counts(intervals, days), [
+            sum(1 for activated, deactivated in intervals
+                if activated <= day and (deactivated is None or deactivated > day))
+            for day in days
+        ])
+
+    def test_adherence_stats_range_and_granularity(self):
+        """Test that adherence can be read over any range per day, week or month with a fixed number of queries"""
+        UserExercise.objects.filter(user=self.user).update(date_activated=date(2025, 1, 1))
+        for day, user_exercises in [(date(2025, 1, 6), [self.squats, self.lunges]), (date(2025, 1, 15), [self.squats])]:
+            report = Report.objects.create(user=self.user, date=day)
+            for user_exercise in user_exercises:
+                ReportExercise.objects.create(report=report, user_exercise=user_exercise, pain_level=1)
+        # The lunges are removed on the day of the last report, so they no longer count from then on
+        UserExercise.objects.filter(pk=self.lunges.pk).update(is_active=False, date_deactivated=date(2025, 2, 3))
+        report = Report.objects.create(user=self.user, date=date(2025, 2, 3))
+        for user_exercise in (self.squats, self.lunges):
+            ReportExercise.objects.create(report=report, user_exercise=user_exercise, pain_level=1)
+
+        url = reverse('report-adherence-stats')
+        params = {'start_date': '2025-01-01', 'end_date': '2025-02-09'}
+        response = self.client.get(url, {**params, 'granularity': 'month'})
+        self.assertEqual(response.data['chart_data']['labels'], ["Jan 2025", "Feb 2025"])
+        self.assertEqual(response.data['chart_data']['datasets'][0]['data'], [5, 9])
+        self.assertEqual(response.data['average_adherence'], 5.5)
+        self.assertEqual(
+            [(day['completed'], day['adherence']) for day in response.data['history']],
+            [("1/1", 100), ("1/2", 50), ("2/2", 100)]
+        )
+
+        response = self.client.get(url, {**params, 'granularity': 'week'})
+        self.assertEqual(
+            response.data['chart_data']['labels'],
+            ["Dec 30", "Jan 06", "Jan 13", "Jan 20", "Jan 27", "Feb 03"]
+        )
+        self.assertEqual(response.data['chart_data']['datasets'][0]['data'], [0, 14, 7, 0, 0, 14])
+
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'start_date': '2024-03-01', 'end_date': '2025-02-28'})
+        self.assertEqual(len(response.data['chart_data']['labels']), 365)
+
+        for invalid in [{'granularity': 'year'}, {'start_date': '2025-03-01', 'end_date': '2025-02-01'},
+                        {'start_date': '2020-01-01', 'end_date': '2025-01-01'}, {'start_date': 'soon'}, {'end_date': 'soon'}]:
+            response = self.client.get(url, invalid)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # pain_stats keeps falling back to today
+        response = self.client.get(reverse('report-pain-stats'), {'end_date': 'soon'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['chart_data']['labels']), 7)
+
+    def test_stats_end_on_the_patients_local_day(self):
+        """Test that the default end date is today in the patient's time zone, not in UTC"""
+        import unittest.mock as mock
+
+        User.objects.filter(pk=self.user.pk).update(timezone='Asia/Tokyo')
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        # 08:00 on March 11th in Tokyo, still March 10th in UTC
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2026, 3, 10, 23, 0, tzinfo=dt_timezone.utc)):
+            adherence = self.client.get(reverse('report-adherence-stats'))
+            pain = self.client.get(reverse('report-pain-stats'))
+        self.assertEqual(adherence.data['chart_data']['labels'][-1], "Wed")
+        self.assertEqual(pain.data['chart_data']['labels'][-1], "Wed")
+
+
+class AnalyticsQueryCountTests(APITestCase):
+    """Tests that the analytics endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.category = ExerciseCategory.objects.create(name="Squats")
+        self.user = User.objects.create_user(username="patient", password="Password123!")
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+
+    def add_history(self, num_exercises, num_days):
+        """Give the patient `num_exercises` more exercises and reports on the last `num_days` days"""
+        offset = UserExercise.objects.filter(user=self.user).count()
+        for i in range(offset, offset + num_exercises):
+            exercise = Exercise.objects.create(category=self.category, name=f"Exercise {i}")
+            UserExercise.objects.create(user=self.user, exercise=exercise)
+        UserExercise.objects.filter(user=self.user).update(date_activated=self.today - timedelta(days=30))
+        for days_ago in range(num_days):
+            report, _ = Report.objects.get_or_create(user=self.user, date=self.today - timedelta(days=days_ago))
+            for user_exercise in UserExercise.objects.filter(user=self.user).exclude(report=report):
+                ReportExercise.objects.create(report=report, user_exercise=user_exercise, pain_level=days_ago % 10)
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(captured)
+
+    def test_query_count_does_not_depend_on_days_or_exercises(self):
+        """Test that more days and exercises do not add queries to the analytics endpoints"""
+        urls = [reverse('report-adherence-stats'), reverse('report-pain-stats'), reverse('report-exercise-history')]
+        self.add_history(num_exercises=1, num_days=1)
+        small = [self.count_queries(url) for url in urls]
+        self.add_history(num_exercises=4, num_days=12)
+        large = [self.count_queries(url) for url in urls]
+        self.assertEqual(small, large)
+        self.assertEqual(large, [3, 3, 2])
+
+        response = self.client.get(reverse('report-exercise-history'))
+        history = response.data['history']
+        self.assertEqual(len(history), 10)
+        self.assertEqual(history[0]['date'], self.today.strftime('%Y-%m-%d'))
+        self.assertEqual([exercise['name'] for exercise in history[0]['exercises']],
+                         [f"Exercise {i}" for i in range(5)])
+
+
 class ExerciseLevelTests(TestCase):
     """Tests for exercise difficulty management"""
     
@@ -1061,92 +2608,53 @@ class ExerciseLevelTests(TestCase):
         self.user.injury_type = self.injury_type
         self.user.save()
     
-    def test_update_exercise_level_based_on_pain(self):
-        """Test function to update exercise level based on pain"""
-        from .views import update_exercise_level_based_on_pain
-        
-        # Create user exercise at advanced level
-        advanced_user_exercise = UserExercise.objects.get_or_create(
-            user=self.user,
-            exercise=self.advanced_exercise,
-            defaults={
-                'sets': 3,
-                'reps': 10,
-                'pain_level': 0,
-                'is_active': True
-            }
+    def test_decrease_for_pain(self):
+        """Test that high pain swaps an exercise for its easier variant, or suggests removing a beginner one"""
+        from .ladder import get_ladder
+        from .progression import CONSIDER_REMOVAL, decrease_for_pain
+
+        advanced_user_exercise = UserExercise.objects.create(
+            user=self.user, exercise=self.advanced_exercise, sets=3, reps=10, pain_level=0, is_active=True
         )
-        
-        # Test with high pain level (should decrease difficulty)
-        result = update_exercise_level_based_on_pain(self.user, 5, self.advanced_exercise.name)
-        
-        # Should return a new UserExercise with intermediate difficulty
-        self.assertIsNotNone(result)
+
+        # Low pain changes nothing
+        self.assertIsNone(decrease_for_pain(self.user, advanced_user_exercise.id, 2))
+
+        # High pain swaps to the intermediate variant and deactivates the advanced one, reading
+        # the exercise once: savepoint, locked select, find variant, create it, deactivate, release
+        get_ladder()
+        with self.assertNumQueries(6):
+            result = decrease_for_pain(self.user, advanced_user_exercise.id, 5)
         self.assertEqual(result.exercise.difficulty_level, "Intermediate")
-        
-        # Create user exercise at beginner level
-        beginner_user_exercise = UserExercise.objects.get_or_create(
-            user=self.user,
-            exercise=self.beginner_exercise,
-            defaults={
-                'sets': 3,
-                'reps': 10,
-                'pain_level': 0,
-                'is_active': True
-            }
+        self.assertTrue(result.is_active)
+        self.assertFalse(UserExercise.objects.get(pk=advanced_user_exercise.pk).is_active)
+
+        beginner_user_exercise, _ = UserExercise.objects.get_or_create(
+            user=self.user, exercise=self.beginner_exercise, defaults={'sets': 3, 'reps': 10, 'is_active': True}
         )
-        
-        # Test with high pain level on beginner exercise (should suggest removal)
-        result = update_exercise_level_based_on_pain(self.user, 5, self.beginner_exercise.name)
-        
-        # Should return "consider_removal"
-        self.assertEqual(result, "consider_removal")
-    
-    def test_increase_difficulty(self):
-        """Test function to increase exercise difficulty"""
-        from .views import increase_difficulty
-        
-        # Create user exercise at beginner level
-        beginner_user_exercise = UserExercise.objects.get_or_create(
-            user=self.user,
-            exercise=self.beginner_exercise,
-            defaults={
-                'sets': 3,
-                'reps': 10,
-                'pain_level': 0,
-                'is_active': True
-            }
+        self.assertEqual(decrease_for_pain(self.user, beginner_user_exercise.id, 5), CONSIDER_REMOVAL)
+        self.assertTrue(UserExercise.objects.get(pk=beginner_user_exercise.pk).is_active)
+
+    def test_increase_user_exercise(self):
+        """Test that an increase swaps an exercise for its harder variant, and stops at advanced"""
+        from .progression import increase_user_exercise
+
+        beginner_user_exercise, _ = UserExercise.objects.get_or_create(
+            user=self.user, exercise=self.beginner_exercise, defaults={'sets': 3, 'reps': 10, 'is_active': True}
         )
-        
-        # Test increasing difficulty
-        result = increase_difficulty(self.user, self.beginner_exercise.name)
-        
-        # Should return a new UserExercise with intermediate difficulty
-        self.assertIsNotNone(result)
+        result = increase_user_exercise(self.user, beginner_user_exercise.id)
         self.assertEqual(result.exercise.difficulty_level, "Intermediate")
-        
-        # Create user exercise at advanced level
-        advanced_user_exercise = UserExercise.objects.get_or_create(
-            user=self.user,
-            exercise=self.advanced_exercise,
-            defaults={
-                'sets': 3,
-                'reps': 10,
-                'pain_level': 0,
-                'is_active': True
-            }
+        self.assertFalse(UserExercise.objects.get(pk=beginner_user_exercise.pk).is_active)
+
+        advanced_user_exercise = UserExercise.objects.create(
+            user=self.user, exercise=self.advanced_exercise, sets=3, reps=10, is_active=True
         )
-        
-        # Test increasing difficulty when already at maximum
-        result = increase_difficulty(self.user, self.advanced_exercise.name)
-        
-        # Should return the same UserExercise (can't increase beyond Advanced)
-        self.assertIsNotNone(result)
-        self.assertEqual(result.exercise.difficulty_level, "Advanced")
+        self.assertIsNone(increase_user_exercise(self.user, advanced_user_exercise.id))
+        self.assertTrue(UserExercise.objects.get(pk=advanced_user_exercise.pk).is_active)
     
     def test_has_consistent_low_pain(self):
         """Test function to check for consistent low pain levels"""
-        from .views import has_consistent_low_pain
+        from .pain_window import has_consistent_low_pain
         
         # Create user exercise - unpack the tuple properly
         user_exercise, created = UserExercise.objects.get_or_create(
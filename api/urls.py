@@ -6,7 +6,8 @@ from rest_framework_simplejwt.views import (
 )
 from .views import (
     ReportExerciseViewSet, UserViewSet, ExerciseViewSet, ExerciseCategoryViewSet,
-    UserExerciseViewSet, ReportViewSet, InjuryTypeViewSet, chatbot, reset_chat_history
+    UserExerciseViewSet, ReportViewSet, InjuryTypeViewSet, chatbot, chatbot_stream, chatbot_metrics,
+    reset_chat_history
 )
 
 # This file contains the URL routing for the API endpoints.
@@ -20,11 +21,13 @@ router.register(r'reports', ReportViewSet)
 router.register(r'injury-types', InjuryTypeViewSet)
 router.register(r'report-exercises', ReportExerciseViewSet)
 
-# This uses custom URL patterns for the chatbot and reset chat history views.
+# This uses custom URL patterns for the chatbot (regular, streaming and metrics) and reset chat history views.
 # It also includes JWT token authentication endpoints for obtaining and refreshing tokens.
 urlpatterns = [
     path('', include(router.urls)),
     path('api/chatbot/', chatbot, name='chatbot_api'),
+    path('api/chatbot/stream/', chatbot_stream, name='chatbot_stream'),
+    path('api/chatbot/metrics/', chatbot_metrics, name='chatbot_metrics'),
     path('api/reset-chat/', reset_chat_history, name="reset_chat_history"),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
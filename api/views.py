@@ -1,70 +1,61 @@
 import json
-import os
-import openai
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import F
 from datetime import timedelta
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import viewsets, status
 from rest_framework.response import Response
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import APIException
 from rest_framework.decorators import action, api_view, permission_classes
-from .models import ReportExercise, User, Exercise, ExerciseCategory, UserExercise, Report, InjuryType
+from .chat_cache import get_response_cache, response_cache_enabled, response_cache_key
+from .chat_memory import estimate_tokens, load_history, append_turn, clear_history
+from .context import get_patient_context
+from .daily_stats import (
+    DAY, GRANULARITIES, MAX_RANGE_DAYS, PERIOD_LABEL_FORMATS, daily_stats, adherence_percentage, group_by_period
+)
+from .instrumentation import ChatTrace, chat_metrics
+from .llm import get_llm_client, estimate_prompt_tokens, LLMUnavailable
+from .models import ReportExercise, User, Exercise, ExerciseCategory, UserExercise, Report, InjuryType, PendingRecommendation, ProgressionJob
+from .progression import increase_user_exercise, decrease_user_exercise
+from .progression_queue import enqueue_progression_jobs
+from .recommendations import pending_action
+from .reports import parse_exercise_ids, add_report_exercises, update_report_exercises
 from .serializers import (
     ReportExerciseSerializer, UserSerializer, ExerciseSerializer, ExerciseCategorySerializer,
-    UserExerciseSerializer, ReportSerializer, InjuryTypeSerializer
+    UserExerciseSerializer, ReportSerializer, InjuryTypeSerializer, CompletionSyncSerializer
 )
+from .sync import apply_completion_events
 
 
-# Set up OpenAI API key
-openai.api_key = os.environ.get('OPENAI_API_KEY') 
-
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def chatbot(request):
+def build_chat_messages(user, user_message, exercise_context, chat_history, trace=None):
     """
-    Chatbot endpoint to interact with OpenAI's GPT-4 model.
-    It processes user messages, retrieves exercise and report data, and generates a response.
-    The response is based on the user's injury type, exercise history, and recent reports.
+    Build the message list sent to the model for a chatbot turn.
+    Combines the system prompt (built from the user's cached patient context) with the
+    stored chat history and the new user message.
+    Records the 'context' and 'prompt' phases on the trace if one is given.
     """
-    # Check if the OpenAI API key is set
-    if openai.api_key is None:
-        return Response({'message': 'OpenAI API key is not set.', 'status': 'error'}, status=500)
-    try:
-        user_message = request.data.get('message', '')
-        exercise_context_json = request.data.get('exerciseContext', '{}')
-        exercise_context = json.loads(exercise_context_json)
-
-        user = request.user
+    trace = trace or ChatTrace()
 
-        user_exercises = UserExercise.objects.filter(user=user, is_active=True)
-        recent_reports = Report.objects.filter(user=user).order_by('-date')[:5]
-
-        exercises_info = [
-            {
-                'name': ue.exercise.name,
-                'category': ue.exercise.category.name,
-                'difficulty': ue.exercise.difficulty_level,
-                'sets': ue.sets,
-                'reps': ue.reps,
-                'pain_level': ue.pain_level,
-                'completed': ue.completed
-            }
-            for ue in user_exercises
-        ]
+    # Cached snapshot of the injury type, active exercises and recent reports
+    with trace.span('context'):
+        patient_context = get_patient_context(user)
 
-        reports_info = [
-            {
-                'date': report.date.strftime('%Y-%m-%d'),
-                'pain_level': report.pain_level,
-                'notes': report.notes
-            }
-            for report in recent_reports
-        ]
+    with trace.span('prompt'):
+        messages = build_prompt(patient_context, user_message, exercise_context, chat_history)
+    return messages
 
-        system_prompt = f"""
+def build_prompt(patient_context, user_message, exercise_context, chat_history):
+    """
+    Serialize the patient context and chat history into the messages for the model.
+    """
+    system_prompt = f"""
         You are a physiotherapy assistant AI for a rehabilitation app. Keep all responses brief and focused.
 
         GUIDELINES:
@@ -76,39 +67,95 @@ def chatbot(request):
         6. If needed, briefly recommend seeking professional help
 
         USER PROFILE:
-        - Injury: {user.injury_type.name if user.injury_type else "Not specified"}
-        - Exercises: {json.dumps(exercises_info)}
-        - Reports: {json.dumps(reports_info)}
+        - Injury: {patient_context['injury'] or "Not specified"}
+        - Exercises: {patient_context['exercises_json']}
+        - Reports: {patient_context['reports_json']}
         - Exercise Context: {json.dumps(exercise_context)}
         """
 
-        # -- Chat Memory: Pull from session or init --
-        if 'chat_history' not in request.session:
-            request.session['chat_history'] = []
-
-        chat_history = request.session['chat_history']
+    # Build message history: system + chat memory + new user message
+    messages = [{"role": "system", "content": system_prompt}]
+    messages += chat_history
+    messages.append({"role": "user", "content": user_message})
+    return messages
 
-        # Build message history: system + chat memory + new user message
-        messages = [{"role": "system", "content": system_prompt}]
-        messages += chat_history
-        messages.append({"role": "user", "content": user_message})
+def finish_chat_trace(request, response, trace, outcome):
+    """
+    Record a finished chatbot request in the metrics.
+    Staff users also get the phase timings and token counts as debug headers.
+    """
+    chat_metrics.record(trace, outcome)
+    if request.user.is_staff:
+        response['Server-Timing'] = trace.server_timing()
+        response['X-Chatbot-Tokens'] = f"prompt={trace.prompt_tokens}, completion={trace.completion_tokens}"
+    return response
 
-        # Call OpenAI
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7
-        )
+def lookup_cached_response(user, user_message, exercise_context):
+    """
+    Look up a cached answer for the message when the response cache is enabled.
+    Returns (cache_key, answer); cache_key is None when caching is disabled
+    and answer is None on a cache miss.
+    """
+    if not response_cache_enabled():
+        return None, None
+    cache_key = response_cache_key(user_message, get_patient_context(user), exercise_context)
+    return cache_key, get_response_cache().get(cache_key)
 
-        ai_message = response.choices[0].message.content
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chatbot(request):
+    """
+    Chatbot endpoint to interact with OpenAI's GPT-4 model.
+    It processes user messages, retrieves exercise and report data, and generates a response.
+    The response is based on the user's injury type, exercise history, and recent reports.
+    """
+    # Check if the OpenAI API key is set
+    if not get_llm_client().is_configured():
+        return Response({'message': 'OpenAI API key is not set.', 'status': 'error'}, status=500)
 
-        # Update chat history in session
-        chat_history.append({"role": "user", "content": user_message})
-        chat_history.append({"role": "assistant", "content": ai_message})
-        request.session['chat_history'] = chat_history
+    # Timing spans for each phase of the request
+    trace = ChatTrace()
+    try:
+        user_message = request.data.get('message', '')
+        exercise_context_json = request.data.get('exerciseContext', '{}')
+        exercise_context = json.loads(exercise_context_json)
 
-        return Response({'message': ai_message, 'status': 'success'})
+        # -- Response cache: answer repeated questions without calling the model --
+        with trace.span('cache_lookup'):
+            cache_key, cached_message = lookup_cached_response(request.user, user_message, exercise_context)
+        if cached_message is not None:
+            with trace.span('history_save'):
+                append_turn(request.user, user_message, cached_message)
+            response = Response({'message': cached_message, 'status': 'success'})
+            return finish_chat_trace(request, response, trace, 'cached')
+
+        # -- Chat Memory: summary of older turns + recent window --
+        with trace.span('history_load'):
+            chat_history = load_history(request.user)
+
+        messages = build_chat_messages(request.user, user_message, exercise_context, chat_history, trace)
+
+        # Call OpenAI through the shared, rate-limited client
+        with trace.span('upstream'):
+            result = get_llm_client().complete(messages)
+        ai_message = result.content
+        trace.prompt_tokens = result.prompt_tokens
+        trace.completion_tokens = result.completion_tokens
+
+        # Store the new turn in the chat memory
+        with trace.span('history_save'):
+            append_turn(request.user, user_message, ai_message)
+        if cache_key:
+            get_response_cache().set(cache_key, ai_message)
+
+        response = Response({'message': ai_message, 'status': 'success'})
+        return finish_chat_trace(request, response, trace, 'success')
+
+    except LLMUnavailable as e:
+        # Upstream is degraded or overloaded - fail fast with a friendly message
+        print("Chatbot unavailable:", e.reason)
+        response = Response({'message': e.friendly_message, 'status': 'error'}, status=503)
+        return finish_chat_trace(request, response, trace, 'unavailable')
 
     except Exception as e:
         import traceback
@@ -116,168 +163,180 @@ def chatbot(request):
         traceback.print_exc()  
 
 
-        return Response({'message': f"Sorry, error: {str(e)}", 'status': 'error'}, status=500)
+        response = Response({'message': f"Sorry, error: {str(e)}", 'status': 'error'}, status=500)
+        return finish_chat_trace(request, response, trace, 'error')
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def reset_chat_history(request):
+async def stream_chat_completion(messages):
     """
-    Reset the chat history for the user, clearing the session data.
+    Stream the model's reply for the given messages, yielding text deltas as they arrive.
+    Tests replace this with a local fake stream so no real OpenAI calls are made.
     """
-    request.session['chat_history'] = []
-    return Response({'message': 'Chat history reset.'})
+    async for delta in get_llm_client().stream(messages):
+        yield delta
 
-def update_exercise_level_based_on_pain(user, pain_level, exercise_name):
+def sse_event(data, event=None):
     """
-    Update exercise level based on pain level.
-    Creates a new UserExercise instance with the updated exercise difficulty.
-    Returns special flag 'consider_removal' if a beginner exercise causes high pain.
+    Format a payload as a single Server-Sent Event.
     """
-    user_exercises = UserExercise.objects.filter(user=user, is_active=True)
-    for user_exercise in user_exercises:
-        if user_exercise.exercise.name == exercise_name:
-            current_exercise = user_exercise.exercise
-            current_category = current_exercise.category
-            new_exercise = None
-
-            try:
-                # Use match case to handle different difficulty levels
-                match current_exercise.difficulty_level:
-                    case "Advanced":
-                        if pain_level >= 4:
-                            print("Pain level is high - advanced")
-                            # If pain level is high, move to intermediate
-                            new_exercise = Exercise.objects.filter(
-                                category=current_category,
-                                difficulty_level="Intermediate"
-                            ).first()
-                    case "Intermediate":
-                        if pain_level >= 4:
-                            print("Pain level is high - intermediate")
-                            # If pain level is high, move to beginner
-                            new_exercise = Exercise.objects.filter(
-                                category=current_category,
-                                difficulty_level="Beginner"
-                            ).first()
-                    case "Beginner":
-                        if pain_level >= 4:
-                            print("Pain level is high - beginner")
-                            # If pain level is high on beginner exercise, consider removal
-                            return "consider_removal"
-
-            except Exercise.DoesNotExist as e:
-                print(e)
-                return None
-
-            # Create a new UserExercise instance with the updated exercise
-            if new_exercise:
-                user_exercises = UserExercise.objects.filter(user=user, exercise=new_exercise)
-                if user_exercises.exists():
-                    new_user_exercise = user_exercises.first()
-                    new_user_exercise.pain_level = 0
-                    new_user_exercise.completed = False
-                    new_user_exercise.is_active = True
-                    new_user_exercise.date_deactivated = None
-                    new_user_exercise.save()
-                else:
-                    new_user_exercise = UserExercise.objects.create(
-                        user=user,
-                        exercise=new_exercise,
-                        sets=user_exercise.sets,
-                        reps=user_exercise.reps,
-                        pain_level=0,
-                        is_active=True,  # Mark the new instance as active
-                    )
-                return new_user_exercise
-            return None
-    
-def has_consistent_low_pain(user_exercise, num_reports=3, max_pain_level=4):
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def _prepare_stream_request(request):
     """
-    Check if the user has consistent low pain levels in their recent reports.
+    Authenticate and parse a streaming chatbot request using the DRF settings
+    (JWT or session auth, JSON or form bodies) since the async view is a plain Django view.
+    Returns (user, data) or (None, None) if the request is not authenticated.
     """
-    # Retrieve all ReportExercise entries for the given report and user_exercise
-    all_reports = ReportExercise.objects.filter(
-        user_exercise=user_exercise,  
-    ).order_by('-id') 
-
-    # Retrieve the most recent `num_reports`
-    recent_reports = all_reports[:num_reports]
-
-    # Ensure there are enough reports
-    if len(recent_reports) < num_reports:
-        print(f"Not enough reports. Expected {num_reports}, found {len(recent_reports)}")
-        return False
-    
-    # Check if all recent reports have pain levels below or equal to the threshold
-    return all(report.pain_level < max_pain_level for report in recent_reports)
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = drf_request.user
+        if not user or not user.is_authenticated:
+            return None, None
+        data = drf_request.data
+    except APIException:
+        return None, None
+    return user, data
+
+async def chatbot_stream(request):
+    """
+    Async variant of the chatbot endpoint that streams the reply as Server-Sent Events.
+    Served natively through project/asgi.py so the worker is not held for the whole GPT call.
+    Emits 'delta' events with text chunks followed by a final 'done' event with the full message.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
 
-def increase_difficulty(user, exercise_name):
+    user, data = await sync_to_async(_prepare_stream_request)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    # Check if the OpenAI API key is set
+    if not get_llm_client().is_configured():
+        return JsonResponse({'message': 'OpenAI API key is not set.', 'status': 'error'}, status=500)
+
+    # Timing spans for each phase of the request
+    trace = ChatTrace()
+    try:
+        user_message = data.get('message', '')
+        exercise_context = json.loads(data.get('exerciseContext', '{}'))
+        with trace.span('cache_lookup'):
+            cache_key, cached_message = await sync_to_async(lookup_cached_response)(user, user_message, exercise_context)
+        if cached_message is None:
+            with trace.span('history_load'):
+                chat_history = await sync_to_async(load_history)(user)
+            messages = await sync_to_async(build_chat_messages)(user, user_message, exercise_context, chat_history, trace)
+    except Exception as e:
+        print("Chatbot error:", str(e))
+        chat_metrics.record(trace, 'error')
+        return JsonResponse({'message': f"Sorry, error: {str(e)}", 'status': 'error'}, status=500)
+
+    def done_event(message):
+        # Staff users also get the phase timings and token counts of the finished request
+        payload = {'message': message, 'status': 'success'}
+        if user.is_staff:
+            payload['trace'] = trace.as_dict()
+        return sse_event(payload, event='done')
+
+    async def cached_event_stream():
+        # Cache hits are sent as a single delta without calling the model
+        with trace.span('history_save'):
+            await sync_to_async(append_turn)(user, user_message, cached_message)
+        chat_metrics.record(trace, 'cached')
+        yield sse_event({'delta': cached_message}, event='delta')
+        yield done_event(cached_message)
+
+    async def event_stream():
+        chunks = []
+        try:
+            with trace.span('upstream'):
+                async for delta in stream_chat_completion(messages):
+                    chunks.append(delta)
+                    yield sse_event({'delta': delta}, event='delta')
+        except LLMUnavailable as e:
+            print("Chatbot unavailable:", e.reason)
+            chat_metrics.record(trace, 'unavailable')
+            yield sse_event({'message': e.friendly_message, 'status': 'error'}, event='error')
+            return
+        except Exception as e:
+            print("Chatbot stream error:", str(e))
+            chat_metrics.record(trace, 'error')
+            yield sse_event({'message': f"Sorry, error: {str(e)}", 'status': 'error'}, event='error')
+            return
+
+        ai_message = ''.join(chunks)
+        # Streams do not report usage, so the token counts are estimated
+        trace.prompt_tokens = estimate_prompt_tokens(messages)
+        trace.completion_tokens = estimate_tokens(ai_message)
+
+        # Store the new turn in the chat memory
+        with trace.span('history_save'):
+            await sync_to_async(append_turn)(user, user_message, ai_message)
+        if cache_key:
+            get_response_cache().set(cache_key, ai_message)
+
+        chat_metrics.record(trace, 'success')
+        yield done_event(ai_message)
+
+    stream = cached_event_stream() if cached_message is not None else event_stream()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (e.g. nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    if user.is_staff:
+        # Only the phases before the first byte are known when the headers are sent
+        response['Server-Timing'] = trace.server_timing()
+    return response
+
+# CSRF is enforced by DRF's SessionAuthentication when a session is used, as with the sync views.
+# Set the flag directly since csrf_exempt does not keep async views async on Django 4.2.
+chatbot_stream.csrf_exempt = True
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def chatbot_metrics(request):
     """
-    Increase the difficulty level of the exercise for the user.
+    Staff-only metrics for the chatbot.
+    Returns per-phase latency histograms, outcome and token totals, the LLM client's
+    pool and circuit breaker state and the response cache counters for this process.
     """
-    # Initialise new_user_exercise to None
-    new_user_exercise = None
-    
-    user_exercises = UserExercise.objects.filter(user=user, is_active=True)
-    for user_exercise in user_exercises:
-        if user_exercise.exercise.name == exercise_name:
-            current_exercise = user_exercise.exercise
-            current_category = current_exercise.category
-            new_exercise = None
-
-            try:
-                # Use match case to handle different difficulty levels
-                match current_exercise.difficulty_level:
-                    case "Advanced":
-                            print("Pain level is low - advanced")
-                            # If pain level is low, stay at advanced
-                            new_exercise = None
-                    case "Intermediate":
-                            print("Pain level is low - intermediate")
-                            # If pain level is low, move to advanced
-                            new_exercise = Exercise.objects.filter(
-                                category=current_category,
-                                difficulty_level="Advanced"
-                            ).first()
-                    case "Beginner":
-                            print("Pain level is low - beginner")
-                            # If pain level is low, move to intermediate
-                            new_exercise = Exercise.objects.filter(
-                                category=current_category,
-                                difficulty_level="Intermediate"
-                            ).first()
-            except Exercise.DoesNotExist as e:
-                print(e)
-
-            # Create a new UserExercise instance with the updated exercise
-            if new_exercise:
-                user_exercises = UserExercise.objects.filter(user=user, exercise=new_exercise)
-                if user_exercises.exists():
-                    new_user_exercise = user_exercises.first()
-                    new_user_exercise.pain_level = 0
-                    new_user_exercise.completed = False
-                    new_user_exercise.is_active = True
-                    new_user_exercise.date_deactivated = None
-                    new_user_exercise.save()
-                else:
-                    new_user_exercise = UserExercise.objects.create(
-                        user=user,
-                        exercise=new_exercise,
-                        sets=user_exercise.sets,
-                        reps=user_exercise.reps,
-                        pain_level=0,
-                        is_active=True,  # Mark the new instance as active
-                    )
-            else:
-                # If no new exercise (already at max difficulty), return the current one
-                new_user_exercise = user_exercise
+    metrics = chat_metrics.snapshot()
+    metrics['llm_client'] = get_llm_client().metrics()
+    metrics['response_cache'] = get_response_cache().stats()
+    return Response(metrics)
 
-            return new_user_exercise
-    
-    # Return None if the exercise was not found
-    return None
-    
-class UserViewSet(viewsets.ModelViewSet):
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reset_chat_history(request):
+    """
+    Reset the chat history for the user, clearing the stored turns and summary.
+    """
+    clear_history(request.user)
+    # Drop any history left in the session by older versions of the chatbot
+    request.session.pop('chat_history', None)
+    return Response({'message': 'Chat history reset.'})
+
+class UserTimezoneMixin:
+    """
+    Activate the authenticated user's time zone for the request, so "today"
+    (e.g. whether an exercise's completed flag is current) follows the patient's local day.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            timezone.activate(request.user.tzinfo)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timezone.deactivate()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class UserViewSet(UserTimezoneMixin, viewsets.ModelViewSet):
     """
     ViewSet for User model.
     Provides endpoints for user registration, profile retrieval, password update and active exercises.
@@ -458,7 +517,7 @@ class ExerciseCategoryViewSet(viewsets.ModelViewSet):
     queryset = ExerciseCategory.objects.all()
     serializer_class = ExerciseCategorySerializer
 
-class UserExerciseViewSet(viewsets.ModelViewSet):
+class UserExerciseViewSet(UserTimezoneMixin, viewsets.ModelViewSet):
     """
     ViewSet for UserExercise model.
     Provides endpoints for listing, creating, and updating user exercises.
@@ -467,9 +526,8 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
     serializer_class = UserExerciseSerializer
 
     def get_queryset(self):
-        base_qs = UserExercise.objects.filter(user=self.request.user)
-        self.reset_user_exercises()
-        return base_qs
+        # completed and pain_level from an earlier day read as reset (see UserExercise.clear_stale_flags)
+        return UserExercise.objects.filter(user=self.request.user)
     
     def create(self, request, *args, **kwargs):
         """
@@ -480,7 +538,7 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
 
         # Get the user and check their latest report
         user = request.user
-        today = timezone.now().date()
+        today = timezone.localdate()
         # Get the report for today or create one if it doesn't exist
         latest_report = Report.objects.filter(user=user, date=today).first()
         if not latest_report:
@@ -517,7 +575,7 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
         # If the exercise is marked as completed, create/update the Report
         if completed:
             # Get today's date
-            today = timezone.now().date()
+            today = timezone.localdate()
             
             # Get or create Report for today
             report, created = Report.objects.get_or_create(
@@ -536,26 +594,21 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
                 defaults={
                     'completed_sets': completed_sets,
                     'completed_reps': completed_reps,
-                    'pain_level': updated_pain_level
+                    'pain_level': updated_pain_level,
+                    'completed_at': timezone.now()
                 }
             )
             
-            # Check pain level and difficulty conditions but only set flags
-            if updated_pain_level >= 4:
-                if instance.exercise.difficulty_level == "Beginner":
-                    should_remove = True
-                else:
-                    should_decrease = True
-            elif has_consistent_low_pain(instance):
-                if instance.exercise.difficulty_level != "Advanced":
-                    should_increase = True
+            # Saving the report re-ran the progression rules (see api.recommendations),
+            # so only read the resulting flag
+            action = pending_action(instance)
+            should_remove = action == PendingRecommendation.REMOVE
+            should_decrease = action == PendingRecommendation.DECREASE
+            should_increase = action == PendingRecommendation.INCREASE
             
-            # Recalculate the report's overall pain level (average across all exercises)
-            report_exercises = report.report_exercises.all()
-            if report_exercises.exists():
-                avg_pain = sum(re.pain_level for re in report_exercises) / report_exercises.count()
-                report.pain_level = avg_pain
-                report.save()
+            # Set the report's overall pain level from its running counters (average across
+            # all exercises) in one statement, so concurrent completions can't overwrite each other
+            Report.objects.filter(pk=report.pk, pain_count__gt=0).update(pain_level=F('pain_sum') / F('pain_count'))
 
         # Return the serialized data with flags for potential actions
         return Response({
@@ -565,23 +618,31 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
             'should_remove': should_remove
         })
         
+    @action(detail=False, methods=['POST'])
+    def sync(self, request):
+        """
+        Apply a batch of exercise completions recorded offline (see api.sync).
+        Events whose idempotency key was already applied are skipped, so a batch can be
+        resent safely.
+        """
+        serializer = CompletionSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, recommendations = apply_completion_events(request.user, serializer.validated_data['events'])
+        return Response({
+            'results': results,
+            'recommendations': recommendations
+        })
+
     @action(detail=True, methods=['POST'])
     def confirm_increase(self, request, pk=None):
         user_exercise = self.get_object()
         
         # Check if user confirmed
         if request.data.get('confirm') == 'yes':
-            # Get the current exercise and increase difficulty
-            increased_exercise = increase_difficulty(
-                request.user,
-                user_exercise.exercise.name
-            )
+            # Swap the current exercise for its harder variant
+            increased_exercise = increase_user_exercise(request.user, user_exercise.pk)
             
             if increased_exercise:
-                # Mark the old exercise as inactive
-                user_exercise.is_active = False
-                user_exercise.save()
-                
                 serializer = self.get_serializer(increased_exercise)
                 return Response({
                     'message': "Exercise difficulty increased successfully",
@@ -604,18 +665,10 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
         
         # Check if user confirmed
         if request.data.get('confirm') == 'yes':
-            # Get the current exercise and decrease difficulty
-            decreased_exercise = update_exercise_level_based_on_pain(
-                request.user,
-                user_exercise.pain_level,
-                user_exercise.exercise.name
-            )
+            # Swap the current exercise for its easier variant
+            decreased_exercise = decrease_user_exercise(request.user, user_exercise.pk)
             
             if decreased_exercise:
-                # Mark the old exercise as inactive
-                user_exercise.is_active = False
-                user_exercise.save()
-                
                 serializer = self.get_serializer(decreased_exercise)
                 return Response({
                     'message': "Exercise difficulty decreased successfully",
@@ -667,7 +720,7 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
         
         # Mark the exercise as inactive
         user_exercise.is_active = False
-        user_exercise.date_deactivated = timezone.now()
+        user_exercise.date_deactivated = timezone.localdate()
         user_exercise.save()
         
         return Response({
@@ -706,23 +759,7 @@ class UserExerciseViewSet(viewsets.ModelViewSet):
             'added': True
         })
 
-    def reset_user_exercises(self):
-        """
-        Reset the UserExercise instances for the user if it's a new day (midnight has passed)
-        since the last reset.
-        """
-        now = timezone.now()
-        today = now.date()
-
-        user = self.request.user
-        
-        if user.last_reset is None or user.last_reset.date() < today:
-            # Reset completed and pain_level for the user's active exercises
-            UserExercise.objects.filter(user=user).update(completed=False, pain_level=0)
-            user.last_reset = now
-            user.save()
-
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(UserTimezoneMixin, viewsets.ModelViewSet):
     """
     ViewSet for Report model.
     Provides endpoints for listing, creating, and updating reports.
@@ -741,108 +778,27 @@ class ReportViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # Create the report
+        # Create the report, always for the patient's today: the submitted date is not
+        # trusted (offline completions go through the sync endpoint instead)
         report = Report.objects.create(
             user=request.user,
-            date=serializer.validated_data.get('date'),
+            date=timezone.localdate(),
             pain_level=serializer.validated_data.get('pain_level', 0),
             notes=serializer.validated_data.get('notes', ''),
         )
 
-        # Add exercises with completed reps/sets
-        exercises_completed_data = request.data.get('exercises_completed', [])
-        total_pain_level = 0
-        num_exercises = 0
-
-        # Handle both string and list formats
-        if isinstance(exercises_completed_data, str):
-            try:
-                # Try to parse as JSON if it's a string
-                import json
-                exercises_ids = json.loads(exercises_data)
-            except json.JSONDecodeError:
-                # If not valid JSON, try to evaluate it as a Python literal (list)
-                try:
-                    import ast
-                    exercises_ids = ast.literal_eval(exercises_completed_data)
-                except (ValueError, SyntaxError):
-                    # If that fails too, try to split it if it's a comma-separated string
-                    exercises_ids = [id.strip() for id in exercises_completed_data.split(',')]
-        else:
-            exercises_ids = exercises_completed_data
-        
-        
-        # Ensure we have a list of integers
-        if isinstance(exercises_ids, list):
-            processed_ids = []
-            for id_item in exercises_ids:
-                if isinstance(id_item, (int, str)):
-                    try:
-                        processed_ids.append(int(id_item))  # Convert to integer
-                    except ValueError:
-                        print(f"Could not convert {id_item} to integer")
-                elif isinstance(id_item, dict) and 'id' in id_item:
-                    try:
-                        processed_ids.append(int(id_item['id']))
-                    except ValueError:
-                        print(f"Could not convert {id_item['id']} to integer")
-        else:
-            # Handle single integer case
-            try:
-                processed_ids = [int(exercises_ids)]
-            except (ValueError, TypeError):
-                print(f"Could not process exercises_ids: {exercises_ids}")
-                processed_ids = []
-
-        # Handle both string and list formats
-        for exercise_id in processed_ids:
-            try:
-                # Get the UserExercise instance
-                user_exercise = UserExercise.objects.get(id=exercise_id, user=request.user)  # Ensure exercise belongs to current user
-                
-                # Check if the exercise belongs to the current user
-                latest_report_exercise = ReportExercise.objects.filter(
-                    user_exercise=user_exercise
-                ).order_by('-id').first()
-                
-                # Default exercise pain level
-                exercise_pain_level = user_exercise.pain_level
-                
-                # If report exercise exists, get its pain level
-                if latest_report_exercise:
-                    exercise_pain_level = latest_report_exercise.pain_level
-                    
-                    # Update the latest report exercise
-                    latest_report_exercise.pain_level = user_exercise.pain_level
-                    latest_report_exercise.save()
-                else:
-                    # Create a new report exercise
-                    ReportExercise.objects.create(
-                        report=report,  # ISSUE 4: Was using 'instance' instead of 'report'
-                        user_exercise=user_exercise,
-                        pain_level=user_exercise.pain_level,
-                        completed_sets=user_exercise.sets,  # ISSUE 5: Missing these fields
-                        completed_reps=user_exercise.reps
-                    )
-
-                # Add the UserExercise to the Report's exercises_completed
-                report.exercises_completed.add(user_exercise)  # ISSUE 6: Was using 'instance' in some places
-
-                # Accumulate pain level for average calculation
-                total_pain_level += exercise_pain_level
-                num_exercises += 1 
-                
-            except UserExercise.DoesNotExist:
-                continue  # Skip if exercise not found
-        
-        # Calculate average pain level for the report
-        if num_exercises > 0:
-            average_pain_level = total_pain_level / num_exercises
+        # Add exercises with completed reps/sets, with the report's pain level averaged over them
+        exercise_ids = parse_exercise_ids(request.data.get('exercises_completed', []))
+        average_pain_level = add_report_exercises(report, request.user, exercise_ids)
+        if average_pain_level is not None:
             report.pain_level = average_pain_level
             report.save()
 
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        # Serialize the report as stored, with the pain counters its exercises set
+        report.refresh_from_db()
+        data = self.get_serializer(report).data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
     def update(self, request, *args, **kwargs):
         """
@@ -857,247 +813,98 @@ class ReportViewSet(viewsets.ModelViewSet):
         instance.notes = serializer.validated_data.get('notes', instance.notes)
         instance.save()
         
-        # Get exercises_completed data with proper handling
-        exercises_data = request.data.get('exercises_completed', [])
-        
-        # Handle both string and list formats
-        if isinstance(exercises_data, str):
-            try:
-                # Try to parse as JSON if it's a string
-                import json
-                exercises_ids = json.loads(exercises_data)
-            except json.JSONDecodeError:
-                # If not valid JSON, try to evaluate it as a Python literal (list)
-                try:
-                    import ast
-                    exercises_ids = ast.literal_eval(exercises_data)
-                except (ValueError, SyntaxError):
-                    # If that fails too, try to split it if it's a comma-separated string
-                    exercises_ids = [id.strip() for id in exercises_data.split(',')]
-        else:
-            exercises_ids = exercises_data
-        
-        
-        # Ensure we have a list of integers
-        if isinstance(exercises_ids, list):
-            processed_ids = []
-            for id_item in exercises_ids:
-                if isinstance(id_item, (int, str)):
-                    try:
-                        processed_ids.append(int(id_item))  # Convert to integer
-                    except ValueError:
-                        print(f"Could not convert {id_item} to integer")
-                elif isinstance(id_item, dict) and 'id' in id_item:
-                    try:
-                        processed_ids.append(int(id_item['id']))
-                    except ValueError:
-                        print(f"Could not convert {id_item['id']} to integer")
-        else:
-            # Handle single integer case
-            try:
-                processed_ids = [int(exercises_ids)]
-            except (ValueError, TypeError):
-                print(f"Could not process exercises_ids: {exercises_ids}")
-                processed_ids = []
+        # Record the completed exercises in bulk, then leave the level checks to the
+        # progression worker (see api.progression_queue)
+        exercise_ids = parse_exercise_ids(request.data.get('exercises_completed', []))
+        user_exercises = update_report_exercises(instance, request.user, exercise_ids)
+        progression_jobs = [
+            ProgressionJob(report=instance, user_exercise=user_exercise, pain_level=user_exercise.pain_level)
+            for user_exercise in user_exercises
+        ]
 
-        
-        # Initialise pain calculation
-        total_pain_level = instance.pain_level * instance.exercises_completed.count()
-        num_exercises = instance.exercises_completed.count()
-        
-        # Now process each exercise with the properly processed IDs
-        for exercise_id in processed_ids:
-            try:
-                user_exercise = UserExercise.objects.get(
-                    id=exercise_id,
-                    user=request.user  # Ensure exercise belongs to current user
-                )
-                
-                
-                # Remove from report if present
-                if instance.exercises_completed.filter(id=user_exercise.id).exists():
-                    instance.exercises_completed.remove(user_exercise)
-                
-                # Get pain level from exercise
-                exercise_pain_level = user_exercise.pain_level
-                
-                # Handle report exercise record
-                report_exercise, created = ReportExercise.objects.update_or_create(
-                    report=instance,
-                    user_exercise=user_exercise,
-                    defaults={
-                        'pain_level': user_exercise.pain_level,
-                        'completed_sets': user_exercise.sets,
-                        'completed_reps': user_exercise.reps
-                    }
-                )
-                
-                # Accumulate pain level
-                total_pain_level += exercise_pain_level
-                
-                # Update exercise level based on pain
-                updated_exercise = update_exercise_level_based_on_pain(
-                    request.user,
-                    exercise_pain_level,
-                    user_exercise.exercise.name
-                )
-                
-                # Check for difficulty increase
-                if has_consistent_low_pain(user_exercise):
-                    increased_exercise = increase_difficulty(
-                        request.user,
-                        user_exercise.exercise.name
-                    )
-                    updated_exercise = increased_exercise or updated_exercise
-                
-                # Add the updated exercise to report if its updated
-                if updated_exercise:
-                    instance.exercises_completed.add(updated_exercise)
-                    updated_exercise.is_active = True
-                    updated_exercise.save()
-                    
-            except UserExercise.DoesNotExist:
-                print(f"UserExercise {exercise_id} not found or doesn't belong to user")
-                continue
-        
-        # Calculate average pain if we have exercises
-        if num_exercises > 0:
-            instance.pain_level = total_pain_level / num_exercises
-            instance.save()
+        # The report's pain level is the average over its exercises, from its running counters
+        Report.objects.filter(pk=instance.pk, pain_count__gt=0).update(pain_level=F('pain_sum') / F('pain_count'))
 
-        return Response(serializer.data)
+        enqueue_progression_jobs(progression_jobs)
+
+        # Serialize the report as stored, not as it was before its exercises changed
+        instance.refresh_from_db()
+        return Response(self.get_serializer(instance).data)
 
     @action(detail=False, methods=['GET'])
     def adherence_stats(self, request):
+        """
+        Adherence per day, week or month over a date range (the 7 days up to end_date by default).
+        Query params: end_date and start_date (YYYY-MM-DD), granularity (day, week or month).
+        """
         try:
             user = request.user
             
-            # Get end date from params or use today
+            # Get end date from params or use the patient's today
             end_date_str = request.query_params.get('end_date')
             if end_date_str:
                 try:
                     end_date = timezone.datetime.strptime(end_date_str, '%Y-%m-%d').date()
                 except ValueError:
-                    end_date = timezone.now().date()
+                    return Response({'error': 'end_date must be a YYYY-MM-DD date'}, status=status.HTTP_400_BAD_REQUEST)
             else:
-                end_date = timezone.now().date()
+                end_date = timezone.localdate()
             
-            # Get last 7 days from the end date
-            start_date = end_date - timedelta(days=6)
-            date_range = [(start_date + timedelta(days=i)) for i in range(7)]
-            
-            # Initialise data structure
-            daily_adherence = {date: {'completed': 0, 'total': 0} for date in date_range}
-            
-            # Get all reports in date range
-            reports = Report.objects.filter(
-                user=user,
-                date__gte=start_date,
-                date__lte=end_date
-            ).prefetch_related('exercises_completed', 'report_exercises')
+            # Get start date from params or use the last 7 days up to the end date
+            start_date_str = request.query_params.get('start_date')
+            if start_date_str:
+                try:
+                    start_date = timezone.datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                except ValueError:
+                    return Response({'error': 'start_date must be a YYYY-MM-DD date'}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                start_date = end_date - timedelta(days=6)
 
-            # Get all user exercises that were active at any point during the date range
-            all_user_exercises = UserExercise.objects.filter(
-                user=user,
-                date_activated__lte=end_date,
-            ).filter(
-                Q(date_deactivated__isnull=True) | 
-                Q(date_deactivated__gt=start_date)
-            ).select_related('exercise')
+            granularity = request.query_params.get('granularity', DAY)
+            if granularity not in GRANULARITIES:
+                return Response(
+                    {'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if start_date > end_date:
+                return Response({'error': 'start_date must not be after end_date'}, status=status.HTTP_400_BAD_REQUEST)
+            if (end_date - start_date).days >= MAX_RANGE_DAYS:
+                return Response(
+                    {'error': f"The date range can span at most {MAX_RANGE_DAYS} days"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-            # For each day in date range, determine which exercises were active
-            for date in date_range:
-                # Get exercises active on this date
-                active_exercises = [
-                    ue for ue in all_user_exercises 
-                    if ue.date_activated <= date and 
-                    (ue.date_deactivated is None or ue.date_deactivated > date)
-                ]
-                
-                daily_adherence[date]['total'] = len(active_exercises)
-                
-                # Get report for this date if exists
-                day_report = next((r for r in reports if r.date == date), None)
-                if day_report:
-                    # Only count completed exercises that were active on this date
-                    report_exercises = ReportExercise.objects.filter(report=day_report)
-                    completed_count = 0
-                    
-                    for report_exercise in report_exercises:
-                        user_exercise = report_exercise.user_exercise
-                        # Check if this exercise was active on this date
-                        if (user_exercise.date_activated <= date and 
-                            (user_exercise.date_deactivated is None or user_exercise.date_deactivated > date)):
-                            completed_count += 1
-                    
-                    daily_adherence[date]['completed'] = completed_count
+            days = daily_stats(user, start_date, end_date)
 
-            # Calculate percentages and format for chart
+            # Calculate percentages per period and format for chart
             labels = []
             data = []
             
-            for date in date_range:
-                day_name = date.strftime('%a')
-                labels.append(day_name)
-                
-                if daily_adherence[date]['total'] > 0:
-                    percentage = (daily_adherence[date]['completed'] / daily_adherence[date]['total']) * 100
-                    percentage = min(percentage, 100)  # Cap at 100%
-                else:
-                    percentage = 0
-                    
-                data.append(round(percentage))
+            for period, rows in group_by_period(days, granularity).items():
+                labels.append(period.strftime(PERIOD_LABEL_FORMATS[granularity]))
+                completed = sum(day.completed_count for day in rows)
+                total = sum(day.active_count for day in rows)
+                data.append(round(adherence_percentage(completed, total)))
 
             # Calculate overall average
-            completed_sum = sum(day['completed'] for day in daily_adherence.values())
-            total_sum = sum(day['total'] for day in daily_adherence.values() if day['total'] > 0)
+            completed_sum = sum(day.completed_count for day in days.values())
+            total_sum = sum(day.active_count for day in days.values())
+            average_adherence = adherence_percentage(completed_sum, total_sum)
             
-            if total_sum > 0:
-                average_adherence = (completed_sum / total_sum) * 100
-                average_adherence = min(average_adherence, 100)
-            else:
-                average_adherence = 0
-            
-            # Get exercise history for the week
+            # Get exercise history for the range
             history = []
-            week_reports = Report.objects.filter(
+            range_reports = Report.objects.filter(
                 user=user,
                 date__gte=start_date,
                 date__lte=end_date
-            ).order_by('-date')
+            ).order_by('-date').values_list('date', flat=True)
             
-            for report in week_reports:
-                report_date = report.date
-                
-                # Find active exercises for this date
-                active_exercises = [
-                    ue for ue in all_user_exercises 
-                    if ue.date_activated <= report_date and 
-                    (ue.date_deactivated is None or ue.date_deactivated > report_date)
-                ]
-                total_exercises = len(active_exercises)
-                
-                # Only count completed exercises that were active on this date
-                report_exercises = ReportExercise.objects.filter(report=report)
-                completed_count = 0
-                
-                for report_exercise in report_exercises:
-                    user_exercise = report_exercise.user_exercise
-                    # Check if this exercise was active on this date
-                    if (user_exercise.date_activated <= report_date and 
-                        (user_exercise.date_deactivated is None or user_exercise.date_deactivated > report_date)):
-                        completed_count += 1
-                
-                if total_exercises > 0:
-                    adherence = (completed_count / total_exercises) * 100
-                    adherence = min(adherence, 100)
-                else:
-                    adherence = 0
-                    
+            for report_date in range_reports:
+                day = days[report_date]
                 history.append({
                     'date': report_date.strftime('%A, %B %d'),
-                    'completed': f"{completed_count}/{total_exercises}",
-                    'adherence': round(adherence)
+                    'completed': f"{day.completed_count}/{day.active_count}",
+                    'adherence': round(adherence_percentage(day.completed_count, day.active_count))
                 })
             
             # Format response for chart
@@ -1123,76 +930,38 @@ class ReportViewSet(viewsets.ModelViewSet):
         try:
             user = request.user
             
-            # Get end date from params or use today
+            # Get end date from params or use the patient's today (also for an unparsable date)
             end_date_str = request.query_params.get('end_date')
             if end_date_str:
                 try:
                     end_date = timezone.datetime.strptime(end_date_str, '%Y-%m-%d').date()
                 except ValueError:
-                    end_date = timezone.now().date()
+                    end_date = timezone.localdate()
             else:
-                end_date = timezone.now().date()
+                end_date = timezone.localdate()
             
             # Get last 7 days from the end date
             start_date = end_date - timedelta(days=6)
-            date_range = [(start_date + timedelta(days=i)) for i in range(7)]
-            
-            # Initialise data structure
-            daily_pain = {date: {'total_pain': 0, 'count': 0, 'total_exercises': 0} for date in date_range}
-            
-            # Get all reports in date range
-            reports = Report.objects.filter(
-                user=user,
-                date__gte=start_date,
-                date__lte=end_date
-            ).prefetch_related('report_exercises')
-
-            # Get all user exercises regardless of active status
-            all_user_exercises = UserExercise.objects.filter(
-                user=user
-            ).select_related('exercise')
+            days = daily_stats(user, start_date, end_date)
 
-            # Calculate daily pain levels considering ALL completed exercises
-            for report in reports:
-                report_date = report.date
-                if report_date in daily_pain:
-                    # Get all exercises completed in this report
-                    report_exercises = ReportExercise.objects.filter(report=report)
-                    
-                    # Calculate total active exercises for context
-                    active_exercises = [
-                        ue.id for ue in all_user_exercises 
-                        if ue.date_activated <= report_date and 
-                        (ue.date_deactivated is None or ue.date_deactivated > report_date)
-                    ]
-                    daily_pain[report_date]['total_exercises'] = len(active_exercises)
-                    
-                    # Use all report exercises for pain calculation, not just active ones
-                    pain_sum = sum(re.pain_level for re in report_exercises)
-                    count = report_exercises.count()
-                    
-                    if count > 0:
-                        daily_pain[report_date]['total_pain'] = pain_sum
-                        daily_pain[report_date]['count'] = count
-            
-            # Calculate averages and format for chart
+            # Calculate averages over ALL completed exercises and format for chart
             labels = []
             data = []
             
-            for date in date_range:
+            for date, day in days.items():
                 day_name = date.strftime('%a')
                 labels.append(day_name)
                 
-                if daily_pain[date]['count'] > 0:
-                    avg_pain = daily_pain[date]['total_pain'] / daily_pain[date]['count']
+                if day.pain_count > 0:
+                    avg_pain = day.pain_sum / day.pain_count
                 else:
                     avg_pain = 0
                     
                 data.append(round(avg_pain, 1))
             
             # Calculate overall average pain
-            total_pain_sum = sum(day['total_pain'] for day in daily_pain.values())
-            total_count = sum(day['count'] for day in daily_pain.values())
+            total_pain_sum = sum(day.pain_sum for day in days.values())
+            total_count = sum(day.pain_count for day in days.values())
             
             if total_count > 0:
                 average_pain = total_pain_sum / total_count
@@ -1205,27 +974,14 @@ class ReportViewSet(viewsets.ModelViewSet):
                 user=user,
                 date__gte=start_date,
                 date__lte=end_date
-            ).order_by('-date')
-
-            for report in week_reports:
-                report_date = report.date
+            ).order_by('-date').values_list('date', 'pain_level')
 
-                # Get active exercises for report date (for context)
-                active_exercises = [
-                    ue.id for ue in all_user_exercises 
-                    if ue.date_activated <= report_date and 
-                    (ue.date_deactivated is None or ue.date_deactivated >= report_date)
-                ]
-                
-                # Get ALL report exercises regardless of active status
-                report_exercises = ReportExercise.objects.filter(report=report)
-                completed_all = report_exercises.count()
-
-                avg_pain = report.pain_level if report.pain_level is not None else 0
+            for report_date, pain_level in week_reports:
+                avg_pain = pain_level if pain_level is not None else 0
 
                 history.append({
                     'date': report_date.strftime('%A, %B %d'),
-                    'exercises': completed_all, 
+                    'exercises': days[report_date].pain_count,
                     'pain_level': round(avg_pain, 1)
                 })
             
@@ -1256,33 +1012,29 @@ class ReportViewSet(viewsets.ModelViewSet):
         try:
             user = request.user
                         
-            # Get all reports for this user
-            reports = Report.objects.filter(user=user).order_by('-date')[:10]
+            # Get the 10 latest reports for this user
+            reports = list(Report.objects.filter(user=user).order_by('-date').values_list('id', 'date', 'pain_level')[:10])
+
+            # Get all their exercises with names in one query
+            exercises_by_report = {report_id: [] for report_id, _, _ in reports}
+            report_exercises = ReportExercise.objects.filter(report_id__in=exercises_by_report).order_by('id').values_list(
+                'report_id', 'user_exercise__exercise__name', 'completed_sets', 'completed_reps', 'pain_level'
+            )
+            for report_id, exercise_name, completed_sets, completed_reps, pain_level in report_exercises:
+                exercises_by_report[report_id].append({
+                    'name': exercise_name,
+                    'sets': completed_sets,
+                    'reps': completed_reps,
+                    'pain': pain_level
+                })
             
             history = []
-            for report in reports:
-                report_date = report.date
-                report_exercises = ReportExercise.objects.filter(report=report)
-                
-                exercises_data = []
-                for re in report_exercises:
-                    exercise_name = re.user_exercise.exercise.name
-                    completed_sets = re.completed_sets
-                    completed_reps = re.completed_reps
-                    pain_level = re.pain_level
-                    
-                    exercises_data.append({
-                        'name': exercise_name,
-                        'sets': completed_sets,
-                        'reps': completed_reps,
-                        'pain': pain_level
-                    })
-                
+            for report_id, report_date, pain_level in reports:
                 history.append({
                     'date': report_date.strftime('%Y-%m-%d'),
                     'formatted_date': report_date.strftime('%A, %B %d'),
-                    'exercises': exercises_data,
-                    'pain_level': report.pain_level
+                    'exercises': exercises_by_report[report_id],
+                    'pain_level': pain_level
                 })
             
             return Response({'history': history})
@@ -3,6 +3,9 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI (e.g. ``uvicorn project.asgi:application``) lets the async
+streaming chatbot endpoint run natively without holding a worker per GPT call.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
 """
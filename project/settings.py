@@ -126,6 +126,61 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/stable/topics/cache/
+# The default in-memory cache is only seen by its own process. Running several worker
+# processes needs a shared backend (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# with CACHE_LOCATION=redis://...) so that chatbot context invalidations reach every
+# worker; the app refuses to start otherwise (see api.apps.check_shared_cache).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'physio-tracker'),
+    }
+}
+
+# Number of worker processes serving the app (gunicorn and uvicorn read WEB_CONCURRENCY)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# How long a chatbot patient context snapshot may live before it is rebuilt (seconds)
+CHATBOT_CONTEXT_TIMEOUT = 60 * 60 * 24
+
+# Chatbot memory budgets (estimated tokens): the rolling window of recent turns
+# and the condensed summary that older turns are folded into
+CHAT_MEMORY_WINDOW_TOKENS = 1500
+CHAT_MEMORY_SUMMARY_TOKENS = 300
+
+# Number of latest reports kept in each exercise's rolling pain window
+PAIN_WINDOW_SIZE = 10
+
+# Shared LLM client: per-request deadline and retry budget, cap on in-flight
+# completions per process and circuit breaker settings (times in seconds)
+LLM_CLIENT = {
+    'MODEL': 'gpt-4',
+    'TIMEOUT': 30,
+    'MAX_RETRIES': 1,
+    'MAX_IN_FLIGHT': 8,
+    'QUEUE_TIMEOUT': 5,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RESET_TIMEOUT': 30,
+}
+
+# Chatbot model backend. Set LLM_BACKEND=api.llm.FakeLLMBackend to use the local
+# stand-in (see FakeLLMBackend for its latency, token rate and failure options)
+LLM_BACKEND = {
+    'BACKEND': os.getenv('LLM_BACKEND', 'api.llm.OpenAIBackend'),
+    'OPTIONS': {},
+}
+
+# Opt-in cache of chatbot answers to repeated questions (TTL in seconds)
+CHATBOT_RESPONSE_CACHE = {
+    'ENABLED': os.getenv('CHATBOT_RESPONSE_CACHE_ENABLED', 'False') == 'True',
+    'TTL': 60 * 60,
+    'MAX_ENTRIES': 1000,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/stable/ref/settings/#auth-password-validators
 